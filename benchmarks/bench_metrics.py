@@ -0,0 +1,83 @@
+""" Бенчмарк накладных расходов MetricsMiddleware.
+
+Вызывает FastAPI-приложение напрямую через ASGI (без сети и БД) с маршрутами,
+похожими на маршруты сервиса, с MetricsMiddleware и без него, и замеряет:
+  - время запроса в микросекундах и добавку от middleware;
+  - время формирования ответа /metrics при заполненных рядах всех маршрутов.
+
+Запуск:
+    $> python -m benchmarks.bench_metrics --routes 30 --requests 20000
+"""
+import argparse
+import asyncio
+import time
+from fastapi import FastAPI
+from src.metrics.middleware import MetricsMiddleware, metrics_registry
+
+
+def make_app(routes: int, with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+    for number in range(routes):
+        async def endpoint(item_id: int):
+            return {"id": item_id}
+
+        app.add_api_route(f"/resource{number}/{{item_id}}", endpoint, methods=["GET"])
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def call(app: FastAPI, path: str):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+             "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app: FastAPI, routes: int, requests: int) -> float:
+    paths = [f"/resource{number % routes}/{number}" for number in range(requests)]
+    for path in paths[:routes]:
+        await call(app, path)
+    started = time.perf_counter()
+    for path in paths:
+        await call(app, path)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def run(routes: int, requests: int, rounds: int):
+    plain, instrumented = make_app(routes, False), make_app(routes, True)
+    without, with_ = [], []
+    for _ in range(rounds):
+        without.append(await measure(plain, routes, requests))
+        with_.append(await measure(instrumented, routes, requests))
+    best_without, best_with = min(without), min(with_)
+    print(f"routes={routes} requests={requests} rounds={rounds} (best round)")
+    print(f"{'variant':<24}{'us/request':>12}")
+    print(f"{'without middleware':<24}{best_without:>12.2f}")
+    print(f"{'MetricsMiddleware':<24}{best_with:>12.2f}")
+    print(f"{'overhead':<24}{best_with - best_without:>12.2f}")
+
+    started = time.perf_counter()
+    text = metrics_registry.render()
+    print(f"render /metrics: {(time.perf_counter() - started) * 1000:.2f} ms, "
+          f"{len(text.splitlines())} lines, {len(text.encode())} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.routes, args.requests, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+""" Бенчмарк создания команды при большом числе существующих команд.
+
+Заполняет тестовую базу (POSTGRES_DB_NAME_TEST) командами и сравнивает:
+  - прежний путь: EXISTS(lower(name) = lower(:name)) без индекса, затем INSERT;
+  - текущий путь: INSERT, уникальность которого проверяет индекс ix_Team_lower_name.
+Таблицы создаются заново и удаляются после прогона.
+
+Запуск:
+    $> python -m benchmarks.bench_team_create --teams 100000 --number 200
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import exists, func, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import src.main  # noqa: F401 - регистрирует все модели в метаданных
+from src.config import config
+from src.database.db import Base, get_engine_options
+from src.teams.crud import TeamsCrud
+from src.teams.models import Team
+from src.teams.shemas import TeamCreate
+from src.teams.utils import TeamNameTaken
+
+DATABASE_URL = "postgresql+asyncpg://{user_name}:{user_password}@{host}:{port}/{db_name}".format(
+    user_name=config.POSTGRES_USERNAME,
+    user_password=config.POSTGRES_PASSWORD.get_secret_value(),
+    host=config.POSTGRES_HOST,
+    port=config.POSTGRES_PORT,
+    db_name=config.POSTGRES_DB_NAME_TEST
+)
+
+
+async def create_with_check(session_factory, name: str):
+    async with session_factory() as db:
+        query = exists(1).select_from(Team).where(func.lower(Team.name) == func.lower(name)).select()
+        if (await db.execute(query)).scalar_one():
+            return
+        db.add(Team(name=name))
+        await db.commit()
+
+
+async def create_with_index(session_factory, name: str):
+    async with session_factory() as db:
+        teams_crud = TeamsCrud(db)
+        try:
+            await teams_crud.create_team(TeamCreate(name=name), owner_id=None)
+        except TeamNameTaken:
+            return
+        await teams_crud.commit()
+
+
+async def measure(session_factory, create, prefix: str, number: int) -> tuple[float, float]:
+    """ Возвращает среднее время создания новой команды и попытки создать занятое название (мс). """
+    started = time.perf_counter()
+    for number_ in range(number):
+        await create(session_factory, f"{prefix}-{number_}")
+    fresh = (time.perf_counter() - started) / number * 1000
+    started = time.perf_counter()
+    for number_ in range(number):
+        await create(session_factory, f"TEAM-{number_}")
+    taken = (time.perf_counter() - started) / number * 1000
+    return fresh, taken
+
+
+async def run(teams: int, number: int):
+    engine = create_async_engine(DATABASE_URL, **get_engine_options("prod"))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text('INSERT INTO "Team" (name, games_played, win_games) '
+                                "SELECT 'team-' || n, 0, 0 FROM generate_series(0, :teams - 1) AS n"),
+                           {"teams": teams})
+        await conn.execute(text('ANALYZE "Team"'))
+    print(f"teams={teams} creations={number}")
+    print(f"{'variant':<28}{'new ms':>10}{'taken ms':>10}")
+    try:
+        fresh, taken = await measure(session_factory, create_with_index, "indexed", number)
+        print(f"{'unique index':<28}{fresh:>10.3f}{taken:>10.3f}")
+        async with engine.begin() as conn:
+            await conn.execute(text('DROP INDEX "ix_Team_lower_name"'))
+        fresh, taken = await measure(session_factory, create_with_check, "checked", number)
+        print(f"{'EXISTS check, no index':<28}{fresh:>10.3f}{taken:>10.3f}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--teams", type=int, default=100_000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.teams, args.number))
+
+
+if __name__ == "__main__":
+    main()
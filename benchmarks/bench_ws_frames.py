@@ -0,0 +1,54 @@
+""" Микробенчмарк сериализации сообщений чата для рассылки по WebSocket.
+
+Сравнивает прежнюю сериализацию для каждого получателя (json.dumps с indent=4)
+с однократной сериализацией кадра через encode_frame.
+
+Запуск:
+    $> python -m benchmarks.bench_ws_frames --recipients 10 --number 2000
+"""
+import argparse
+import json
+import timeit
+from src.chat.shemas import MessageRead
+from src.config import config
+from src.websockets.frames import encode_frame
+
+
+def make_message() -> MessageRead:
+    return MessageRead(id=123456, chat_id=42, user_id=7, date=1689100000.123,
+                       content_type="text", text="Встречаемся у фонтана через 10 минут, код 4812",
+                       reply_to=123450)
+
+
+def per_recipient(message: MessageRead, recipients: int):
+    for _ in range(recipients):
+        json.dumps(message.dict(), indent=4, sort_keys=True)
+
+
+def encode_once(message: MessageRead, recipients: int):
+    frame = encode_frame(message.dict())
+    for _ in range(recipients):
+        _ = frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=10)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    message = make_message()
+    old_size = len(json.dumps(message.dict(), indent=4, sort_keys=True).encode())
+    print(f"recipients={args.recipients} broadcasts={args.number}")
+    print(f"{'variant':<24}{'us/recipient':>14}{'bytes':>8}")
+    seconds = timeit.timeit(lambda: per_recipient(message, args.recipients), number=args.number)
+    print(f"{'per-recipient indent=4':<24}{seconds / args.number / args.recipients * 1e6:>14.3f}{old_size:>8}")
+    for encoder in ("json", "orjson"):
+        config.WS_JSON_ENCODER = encoder
+        size = len(encode_frame(message.dict()).encode())
+        seconds = timeit.timeit(lambda: encode_once(message, args.recipients), number=args.number)
+        print(f"{'encode-once ' + encoder:<24}{seconds / args.number / args.recipients * 1e6:>14.3f}{size:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+""" Бенчмарк форматов кадров WebSocket: размер на проводе и стоимость кодирования.
+
+Для типичных кадров (сообщение чата, событие таблицы лидеров, событие решения задания) сравнивает:
+  - json: текущий компактный JSON (encode_frame);
+  - msgpack: подпротокол msgpack;
+  - варианты + deflate: сжатие permessage-deflate, которое согласует ASGI-сервер.
+    "no takeover" сжимает каждый кадр отдельно, "takeover" — общим контекстом на поток кадров,
+    как при client/server_context_takeover по умолчанию.
+
+Запуск:
+    $> python -m benchmarks.bench_ws_protocols --frames 200 --number 2000
+"""
+import argparse
+import timeit
+import zlib
+from src.chat.shemas import MessageRead
+from src.websockets.frames import encode_frame, pack_frame
+
+
+def make_payloads(frames: int) -> dict[str, list[dict]]:
+    messages, leaderboard, solved = [], [], []
+    for number in range(frames):
+        message = MessageRead(id=123456 + number, chat_id=42, user_id=7 + number % 5, date=1689100000.123 + number,
+                              content_type="text", text=f"Встречаемся у фонтана через {number % 15} минут, код 4812",
+                              reply_to=123450 if number % 3 == 0 else None)
+        messages.append({**message.dict(), "seq": number + 1})
+        leaderboard.append({"type": "leaderboard", "game_id": 3, "team_id": 100 + number % 40, "score": number // 4,
+                            "rank": 1 + number % 40, "previous_rank": 2 + number % 40, "seq": number + 1})
+        solved.append({"type": "task_solved", "chat_id": 42, "game_id": 3, "team_id": 100, "task_id": 500 + number,
+                       "user_id": 7, "solved_at": "2023-07-11T18:30:00+00:00", "seq": number + 1})
+    return {"message": messages, "leaderboard": leaderboard, "solved": solved}
+
+
+def deflate_each(frames: list[bytes]) -> int:
+    size = 0
+    for frame in frames:
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        size += len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return size
+
+
+def deflate_stream(frames: list[bytes]) -> int:
+    compressor, size = zlib.compressobj(wbits=-zlib.MAX_WBITS), 0
+    for frame in frames:
+        size += len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    encoders = {"json": lambda payload: encode_frame(payload).encode(), "msgpack": pack_frame}
+
+    print(f"frames={args.frames} encodes={args.number}")
+    print(f"{'payload':<12}{'format':<9}{'us/encode':>10}{'bytes':>8}{'deflate no takeover':>21}{'deflate takeover':>18}")
+    for name, payloads in make_payloads(args.frames).items():
+        for encoder_name, encoder in encoders.items():
+            frames = [encoder(payload) for payload in payloads]
+            payload = payloads[0]
+            seconds = timeit.timeit(lambda: encoder(payload), number=args.number)
+            print(f"{name:<12}{encoder_name:<9}{seconds / args.number * 1e6:>10.2f}"
+                  f"{sum(map(len, frames)) / len(frames):>8.1f}"
+                  f"{deflate_each(frames) / len(frames):>21.1f}"
+                  f"{deflate_stream(frames) / len(frames):>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+""" Бенчмарк реестра WebSocket-соединений на большом числе подключений.
+
+Сравнивает прежнее хранение (dict[chat_id, list[Connection]] с list.remove и Connection без __slots__)
+с ConnectionRegistry и Connection на __slots__:
+  - память на соединение вместе с индексами (tracemalloc);
+  - время отключения и повторного подключения случайных соединений (churn).
+Сокеты не открываются: соединения создаются с заглушкой вместо WebSocket.
+
+Запуск:
+    $> python -m benchmarks.bench_ws_registry --connections 50000 --chat-size 5 --churn 20000
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from fastapi import WebSocket
+from src.config import config
+from src.websockets.registry import Connection, ConnectionRegistry
+
+
+@dataclass(eq=False)
+class LegacyConnection:
+    user_id: int
+    websocket: WebSocket
+    game_id: int | None = None
+    queue: asyncio.Queue[str] = field(init=False)
+    writer: asyncio.Task | None = field(default=None, init=False)
+    dropped_frames: int = field(default=0, init=False)
+    last_seen: float = field(init=False)
+
+    def __post_init__(self):
+        self.queue = asyncio.Queue(maxsize=config.WS_SEND_QUEUE_SIZE)
+        self.last_seen = time.monotonic()
+
+
+class LegacyRegistry:
+    """ Прежнее хранение соединений в менеджере. """
+
+    def __init__(self):
+        self.active_connections: dict[int, list[LegacyConnection]] = {}
+        self.game_connections: dict[int, list[tuple[int, LegacyConnection]]] = {}
+
+    def add(self, chat_id: int, conn: LegacyConnection):
+        self.active_connections.setdefault(chat_id, []).append(conn)
+        if conn.game_id is not None:
+            self.game_connections.setdefault(conn.game_id, []).append((chat_id, conn))
+
+    def remove(self, chat_id: int, conn: LegacyConnection):
+        chat_connections = self.active_connections.get(chat_id, [])
+        if conn in chat_connections:
+            chat_connections.remove(conn)
+        game_connections = self.game_connections.get(conn.game_id, [])
+        if (chat_id, conn) in game_connections:
+            game_connections.remove((chat_id, conn))
+
+
+def make_legacy(connections: int, chat_size: int, chats_per_game: int) -> tuple[LegacyRegistry, list]:
+    registry, items = LegacyRegistry(), []
+    for number in range(connections):
+        chat_id = number // chat_size
+        conn = LegacyConnection(user_id=number, websocket=None, game_id=chat_id // chats_per_game)
+        registry.add(chat_id, conn)
+        items.append((chat_id, conn))
+    return registry, items
+
+
+def make_indexed(connections: int, chat_size: int, chats_per_game: int) -> tuple[ConnectionRegistry, list]:
+    registry, items = ConnectionRegistry(), []
+    for number in range(connections):
+        chat_id = number // chat_size
+        conn = Connection(user_id=number, websocket=None, chat_id=chat_id,
+                          team_id=chat_id, game_id=chat_id // chats_per_game)
+        registry.add(conn)
+        items.append(conn)
+    return registry, items
+
+
+def measure_memory(make, connections: int, chat_size: int, chats_per_game: int) -> float:
+    """ Возвращает число байт на соединение, включая объекты соединений, их очереди и индексы. """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    registry, items = make(connections, chat_size, chats_per_game)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / connections
+
+
+def churn_legacy(registry: LegacyRegistry, items: list, picks: list[int]) -> float:
+    started = time.perf_counter()
+    for index in picks:
+        chat_id, conn = items[index]
+        registry.remove(chat_id, conn)
+        registry.add(chat_id, conn)
+    return (time.perf_counter() - started) / len(picks) * 1e6
+
+
+def churn_indexed(registry: ConnectionRegistry, items: list, picks: list[int]) -> float:
+    started = time.perf_counter()
+    for index in picks:
+        conn = items[index]
+        registry.remove(conn)
+        registry.add(conn)
+    return (time.perf_counter() - started) / len(picks) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--chat-size", type=int, default=5)
+    parser.add_argument("--chats-per-game", type=int, default=200)
+    parser.add_argument("--churn", type=int, default=20000)
+    args = parser.parse_args()
+
+    shape = (args.connections, args.chat_size, args.chats_per_game)
+    picks = [random.randrange(args.connections) for _ in range(args.churn)]
+    print(f"connections={args.connections} chat_size={args.chat_size} "
+          f"chats_per_game={args.chats_per_game} churn={args.churn}")
+    print(f"{'variant':<12}{'bytes/conn':>12}{'us/reconnect':>14}")
+    legacy_memory = measure_memory(make_legacy, *shape)
+    legacy_churn = churn_legacy(*make_legacy(*shape), picks)
+    print(f"{'legacy':<12}{legacy_memory:>12.0f}{legacy_churn:>14.2f}")
+    indexed_memory = measure_memory(make_indexed, *shape)
+    indexed_churn = churn_indexed(*make_indexed(*shape), picks)
+    print(f"{'indexed':<12}{indexed_memory:>12.0f}{indexed_churn:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
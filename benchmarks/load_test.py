@@ -0,0 +1,394 @@
+""" Нагрузочный прогон сценариев игрового вечера против запущенного сервера.
+
+Сценарии:
+  - registration: всплеск регистраций и входов (POST /auth/register, POST /auth/jwt/login);
+  - tasks_polling: организатор опрашивает GET /games/{game_id}/tasks с If-None-Match;
+  - message_storm: игроки одновременно отправляют POST /message/send;
+  - ws_clients: тысячи клиентов /ws/chat — время рукопожатия и задержка доставки сообщений.
+
+Для каждого эндпоинта выводятся p50/p95/p99, среднее, максимум (мс) и число запросов в секунду.
+Результаты можно сохранить в JSON (--output) и сравнить с прошлым прогоном (--compare).
+
+Данные создаются в тестовой базе (POSTGRES_DB_NAME_TEST): таблицы пересоздаются перед прогоном
+и удаляются после него. Без --url сервер запускается через uvicorn с той же базой; при --url
+сервер должен быть настроен на POSTGRES_DB_NAME_TEST. С несколькими воркерами для доставки
+по WebSocket нужен брокер postgres или redis (WS_BROKER).
+
+Запуск:
+    $> python -m benchmarks.load_test --scenarios all --duration 20 --ws-clients 2000 --output load.json
+    $> python -m benchmarks.load_test --scenarios tasks_polling --compare load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import httpx
+import websockets
+from fastapi_users.jwt import generate_jwt
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+import src.main  # noqa: F401 - регистрирует все модели в метаданных
+from src.auth.models import User
+from src.chat.models import Chat
+from src.config import config
+from src.database.association_tables import AT_GamesTasks, AT_GamesTeams, AT_TeamUsers
+from src.database.db import Base, get_engine_options
+from src.games.models import Game
+from src.tasks.models import Task
+from src.teams.models import Team
+
+DATABASE_URL = "postgresql+asyncpg://{user_name}:{user_password}@{host}:{port}/{db_name}".format(
+    user_name=config.POSTGRES_USERNAME,
+    user_password=config.POSTGRES_PASSWORD.get_secret_value(),
+    host=config.POSTGRES_HOST,
+    port=config.POSTGRES_PORT,
+    db_name=config.POSTGRES_DB_NAME_TEST
+)
+PASSWORD = "load-test-password"
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    started: float = float("inf")
+    finished: float = 0.0
+
+
+class Recorder:
+    """ Собирает задержки по эндпоинтам. Эндпоинт называется шаблоном маршрута, а не конкретным URL. """
+
+    def __init__(self):
+        self.endpoints: dict[str, EndpointStats] = {}
+
+    def record(self, endpoint: str, started: float, ok: bool = True):
+        finished = time.perf_counter()
+        stats = self.endpoints.setdefault(endpoint, EndpointStats())
+        stats.started = min(stats.started, started)
+        stats.finished = max(stats.finished, finished)
+        if ok:
+            stats.latencies.append(finished - started)
+        else:
+            stats.errors += 1
+
+    async def request(self, endpoint: str, client: httpx.AsyncClient, method: str, url: str,
+                      expected: tuple[int, ...] = (200,), **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.record(endpoint, started, ok=False)
+            return None
+        self.record(endpoint, started, ok=response.status_code in expected)
+        return response
+
+    def summary(self) -> dict[str, dict]:
+        result = {}
+        for endpoint, stats in self.endpoints.items():
+            latencies = sorted(stats.latencies)
+            elapsed = stats.finished - stats.started
+            result[endpoint] = {
+                "count": len(latencies),
+                "errors": stats.errors,
+                "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+                "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            }
+        return result
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """ Процентиль по методу ближайшего ранга для отсортированного списка. """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+@dataclass
+class Fixture:
+    game_id: int
+    owner_token: str
+    # (токен игрока, id чата его команды), игроки одной команды идут подряд
+    players: list[tuple[str, int]]
+
+
+def make_token(user_id: int) -> str:
+    return generate_jwt({"sub": str(user_id), "aud": "fastapi-users:auth"},
+                        config.SECURITY_KEY.get_secret_value(), 24 * 3600)
+
+
+async def seed(engine, teams: int, team_size: int, tasks: int) -> Fixture:
+    """ Создаёт идущую игру с заданиями, командами, их игроками и активными чатами. """
+    hashed_password = PasswordHelper().hash(PASSWORD)
+    now = datetime.now(timezone.utc)
+    async with engine.begin() as conn:
+        def user_row(name: str) -> dict:
+            return dict(name=name, surname=name, patronymic=name, email=f"{name}@example.com",
+                        phone_number="89000000000", hashed_password=hashed_password, games_played=0,
+                        win_games=0, is_active=True, is_superuser=False, is_verified=True)
+
+        owner_id = (await conn.execute(insert(User).returning(User.id), [user_row("organizer")])).scalar_one()
+        game_id = (await conn.execute(insert(Game).returning(Game.id), [dict(
+            owner_id=owner_id, name="load", legend="load", datetime_start=now - timedelta(minutes=5),
+            datetime_end=now + timedelta(hours=6))])).scalar_one()
+        task_ids = (await conn.execute(insert(Task).returning(Task.id), [dict(
+            owner_id=owner_id, level=number % 3, mystery_of_place=f"mystery {number}", place=f"place {number}",
+            answer=f"answer {number}") for number in range(tasks)])).scalars().all()
+        await conn.execute(insert(AT_GamesTasks), [dict(game_id=game_id, task_id=task_id) for task_id in task_ids])
+        team_ids = (await conn.execute(insert(Team).returning(Team.id), [dict(
+            name=f"team-{number}", games_played=0, win_games=0) for number in range(teams)])).scalars().all()
+        await conn.execute(insert(AT_GamesTeams), [dict(game_id=game_id, team_id=team_id) for team_id in team_ids])
+        chat_by_team = dict((await conn.execute(insert(Chat).returning(Chat.team_id, Chat.id), [dict(
+            game_id=game_id, team_id=team_id, is_active=True) for team_id in team_ids])).all())
+        user_ids = (await conn.execute(insert(User).returning(User.id), [
+            user_row(f"player-{number}") for number in range(teams * team_size)])).scalars().all()
+        user_teams = [(user_id, team_ids[number // team_size]) for number, user_id in enumerate(user_ids)]
+        await conn.execute(insert(AT_TeamUsers), [dict(team_id=team_id, user_id=user_id)
+                                                  for user_id, team_id in user_teams])
+    players = [(make_token(user_id), chat_by_team[team_id]) for user_id, team_id in user_teams]
+    return Fixture(game_id=game_id, owner_token=make_token(owner_id), players=players)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_server(workers: int) -> tuple[subprocess.Popen, str]:
+    """ Запускает uvicorn с тестовой базой и ждёт, пока сервер начнёт отвечать. """
+    port = free_port()
+    env = dict(os.environ, POSTGRES_DB_NAME=config.POSTGRES_DB_NAME_TEST)
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1",
+                                "--port", str(port), "--workers", str(workers), "--log-level", "warning"], env=env)
+    url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=url) as client:
+        for _ in range(300):
+            try:
+                await client.get("/openapi.json")
+                return process, url
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Server did not start")
+
+
+async def run_for(duration: float, concurrency: int, action):
+    """ Выполняет action в concurrency параллельных циклах в течение duration секунд. """
+    deadline = time.perf_counter() + duration
+
+    async def loop(worker: int):
+        while time.perf_counter() < deadline:
+            await action(worker)
+
+    await asyncio.gather(*(loop(worker) for worker in range(concurrency)))
+
+
+async def registration(client: httpx.AsyncClient, recorder: Recorder, args, fixture: Fixture):
+    numbers = iter(range(args.registrations))
+
+    async def worker():
+        for number in numbers:
+            email = f"signup-{number}@example.com"
+            await recorder.request("POST /auth/register", client, "POST", "/auth/register", expected=(201,), json={
+                "email": email, "password": PASSWORD, "name": "load", "surname": "load", "patronymic": "load",
+                "phone_number": "89000000000"})
+            await recorder.request("POST /auth/jwt/login", client, "POST", "/auth/jwt/login",
+                                   data={"username": email, "password": PASSWORD})
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+
+async def tasks_polling(client: httpx.AsyncClient, recorder: Recorder, args, fixture: Fixture):
+    url = f"/games/{fixture.game_id}/tasks"
+    etags: dict[int, str] = {}
+
+    async def poll(worker: int):
+        headers = {"Authorization": f"Bearer {fixture.owner_token}"}
+        if worker in etags:
+            headers["If-None-Match"] = etags[worker]
+        response = await recorder.request("GET /games/{game_id}/tasks", client, "GET", url,
+                                          expected=(200, 304), headers=headers)
+        if response is not None and "ETag" in response.headers:
+            etags[worker] = response.headers["ETag"]
+
+    await run_for(args.duration, args.concurrency, poll)
+
+
+async def message_storm(client: httpx.AsyncClient, recorder: Recorder, args, fixture: Fixture):
+    async def send(worker: int):
+        token, chat_id = random.choice(fixture.players)
+        await recorder.request("POST /message/send", client, "POST", "/message/send",
+                               headers={"Authorization": f"Bearer {token}"},
+                               json={"chat_id": chat_id, "content_type": "text", "text": f"storm {worker}",
+                                     "reply_to": None})
+
+    await run_for(args.duration, args.concurrency, send)
+
+
+async def ws_clients(client: httpx.AsyncClient, recorder: Recorder, args, fixture: Fixture):
+    """ Подключает ws_clients сокетов к /ws/chat, затем рассылает ws_messages сообщений в чаты
+    и замеряет задержку от отправки до получения каждым участником чата. """
+    ws_url = str(client.base_url).replace("http", "ws", 1) + "/ws/chat"
+    clients = fixture.players[:args.ws_clients]
+    handshakes = asyncio.Semaphore(args.concurrency)
+    ready = asyncio.Event()
+    connected, delivered = 0, 0
+
+    async def listen(token: str):
+        nonlocal connected, delivered
+        async with handshakes:
+            started = time.perf_counter()
+            try:
+                websocket = await websockets.connect(ws_url, max_queue=None)
+                await websocket.send(token)
+                await websocket.recv()
+            except (OSError, websockets.WebSocketException):
+                recorder.record("WS /ws/chat handshake", started, ok=False)
+                return
+            recorder.record("WS /ws/chat handshake", started)
+        connected += 1
+        if connected == len(clients):
+            ready.set()
+        try:
+            async for data in websocket:
+                frame = json.loads(data)
+                if frame.get("type") == "ping":
+                    await websocket.send("pong")
+                elif str(frame.get("text", "")).startswith("load:"):
+                    recorder.record("WS /ws/chat delivery", float(frame["text"][5:]))
+                    delivered += 1
+        except websockets.WebSocketException:
+            pass
+        finally:
+            await websocket.close()
+
+    listeners = [asyncio.create_task(listen(token)) for token, _ in clients]
+    try:
+        await asyncio.wait_for(ready.wait(), timeout=max(30.0, len(clients) / 50))
+    except asyncio.TimeoutError:
+        print(f"only {connected} of {len(clients)} sockets connected")
+
+    # Сообщение получают все сокеты чата, кроме сокета отправителя.
+    chat_sizes: dict[int, int] = {}
+    for _, chat_id in clients:
+        chat_sizes[chat_id] = chat_sizes.get(chat_id, 0) + 1
+    expected = 0
+    for _ in range(args.ws_messages):
+        token, chat_id = random.choice(clients)
+        recipients = chat_sizes[chat_id] - 1
+        response = await recorder.request("POST /message/send (ws fan-out)", client, "POST", "/message/send",
+                                          headers={"Authorization": f"Bearer {token}"},
+                                          json={"chat_id": chat_id, "content_type": "text",
+                                                "text": f"load:{time.perf_counter()}", "reply_to": None})
+        if response is not None and response.status_code == 200:
+            expected += recipients
+    for _ in range(100):
+        if delivered >= expected:
+            break
+        await asyncio.sleep(0.05)
+    if delivered < expected:
+        print(f"delivered {delivered} of {expected} frames")
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+
+
+SCENARIOS = {"registration": registration, "tasks_polling": tasks_polling,
+             "message_storm": message_storm, "ws_clients": ws_clients}
+
+
+def print_summary(summary: dict[str, dict], baseline: dict[str, dict] | None):
+    print(f"{'endpoint':<36}{'count':>8}{'errors':>8}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for endpoint, stats in summary.items():
+        print(f"{endpoint:<36}{stats['count']:>8}{stats['errors']:>8}{stats['rps']:>10.1f}"
+              f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['max_ms']:>9.2f}")
+        previous = (baseline or {}).get(endpoint)
+        if previous:
+            print(f"{'  vs baseline':<36}{'':>16}{stats['rps'] - previous['rps']:>+10.1f}"
+                  f"{stats['p50_ms'] - previous['p50_ms']:>+9.2f}{stats['p95_ms'] - previous['p95_ms']:>+9.2f}"
+                  f"{stats['p99_ms'] - previous['p99_ms']:>+9.2f}")
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    scenarios = list(SCENARIOS) if "all" in args.scenarios else args.scenarios
+    engine = create_async_engine(DATABASE_URL, **get_engine_options("prod"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    server = None
+    try:
+        fixture = await seed(engine, args.teams, args.team_size, args.tasks)
+        url = args.url
+        if url is None:
+            server, url = await start_server(args.workers)
+        recorder = Recorder()
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+            for scenario in scenarios:
+                print(f"running {scenario}")
+                await SCENARIOS[scenario](client, recorder, args, fixture)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+    return recorder.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=("all", *SCENARIOS), default=["all"])
+    parser.add_argument("--url", help="адрес уже запущенного сервера; по умолчанию сервер запускается")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--registrations", type=int, default=200)
+    parser.add_argument("--teams", type=int, default=200)
+    parser.add_argument("--team-size", type=int, default=12)
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--ws-clients", type=int, default=2000)
+    parser.add_argument("--ws-messages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для сохранения результатов в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["endpoints"]
+    started_at = datetime.now(timezone.utc).isoformat()
+    summary = asyncio.run(run(args))
+    print_summary(summary, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"commit": current_commit(), "started_at": started_at,
+                       "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+                       "endpoints": summary}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
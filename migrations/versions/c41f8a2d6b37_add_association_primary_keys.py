@@ -0,0 +1,40 @@
+"""Add Association Primary Keys
+
+Revision ID: c41f8a2d6b37
+Revises: a7c2e5d90f14
+Create Date: 2026-10-18 16:02:44.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f8a2d6b37'
+down_revision = 'a7c2e5d90f14'
+branch_labels = None
+depends_on = None
+
+ASSOCIATION_TABLES = (
+    ('TeamUsers', 'team_id', 'user_id'),
+    ('GamesTasks', 'game_id', 'task_id'),
+    ('GamesTeams', 'game_id', 'team_id'),
+)
+
+
+def upgrade() -> None:
+    for table, first, second in ASSOCIATION_TABLES:
+        # Перед созданием ключа удаляем пустые ссылки и дубликаты, накопленные без ограничения уникальности
+        op.execute(f'DELETE FROM "{table}" WHERE {first} IS NULL OR {second} IS NULL')
+        op.execute(f'DELETE FROM "{table}" a USING "{table}" b '
+                   f'WHERE a.ctid < b.ctid AND a.{first} = b.{first} AND a.{second} = b.{second}')
+        op.alter_column(table, first, existing_type=sa.Integer(), nullable=False)
+        op.alter_column(table, second, existing_type=sa.Integer(), nullable=False)
+        op.create_primary_key(f'{table}_pkey', table, [first, second])
+
+
+def downgrade() -> None:
+    for table, first, second in reversed(ASSOCIATION_TABLES):
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.alter_column(table, second, existing_type=sa.Integer(), nullable=True)
+        op.alter_column(table, first, existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,46 @@
+"""Add Team lower(name) Unique Index
+
+Revision ID: e83b6f1c2d95
+Revises: c41f8a2d6b37
+Create Date: 2026-10-18 16:48:12.904175
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e83b6f1c2d95'
+down_revision = 'c41f8a2d6b37'
+branch_labels = None
+depends_on = None
+
+
+NAME_LENGTH = 32
+
+
+def upgrade() -> None:
+    # Дубликаты, проскочившие через прежнюю проверку, получают суффикс с id, иначе индекс не создать.
+    # Первая по id команда сохраняет название; суффикс подбирается так, чтобы не совпасть с уже занятым.
+    conn = op.get_bind()
+    teams = conn.execute(sa.text('SELECT id, name, lower(name) FROM "Team" ORDER BY id')).all()
+    taken = set()
+    duplicates = []
+    for team_id, name, lower_name in teams:
+        if lower_name in taken:
+            duplicates.append((team_id, name))
+        else:
+            taken.add(lower_name)
+    for team_id, name in duplicates:
+        suffix, attempt = f"-{team_id}", 1
+        while (name[:NAME_LENGTH - len(suffix)] + suffix).lower() in taken:
+            attempt += 1
+            suffix = f"-{team_id}-{attempt}"
+        new_name = name[:NAME_LENGTH - len(suffix)] + suffix
+        taken.add(new_name.lower())
+        conn.execute(sa.text('UPDATE "Team" SET name = :name WHERE id = :id'), {"name": new_name, "id": team_id})
+    op.create_index('ix_Team_lower_name', 'Team', [sa.text('lower(name)')], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_Team_lower_name', table_name='Team')
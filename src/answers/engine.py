@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.database.db import AsyncSessionLocal
+from src.database.association_tables import AT_GamesTasks, AT_GamesTeams, AT_TeamUsers
+from src.database.versions import entity_versions
+from src.answers.leaderboard import Leaderboard
+from src.answers.models import SolvedTask
+from src.answers.shemas import AnswerResult, LeaderboardRow
+from src.answers.utils import GameNotFound, GameNotRunning, NotInGame, SeveralTeamsInGame, TaskNotInGame
+from src.answers.writer import ProgressWriter, progress_writer
+from src.chat.models import Chat
+from src.games.models import Game
+from src.teams.models import Team
+from src.tasks.models import Task
+from src.websockets.brokers import BaseBroker, broker
+from src.websockets.frames import encode_frame, decode_frame
+from src.websockets.router import ws_events_manager
+from src.websockets.ws_manager import WSConnectionManager
+
+logger = logging.getLogger(__name__)
+
+SOLVED_CHANNEL = "answers"
+# Как часто искать чат команды, которого не было при загрузке игры
+CHAT_RECHECK_SECONDS = 30
+
+
+def normalize_answer(answer: str) -> str:
+    """ Приводит ответ к каноническому виду: не важны регистр, ё/е, знаки препинания и лишние пробелы. """
+    text = unicodedata.normalize("NFKC", answer).casefold().replace("ё", "е")
+    return " ".join("".join(char if char.isalnum() else " " for char in text).split())
+
+
+def as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class TeamProgress:
+    name: str
+    chat_id: int | None
+    solved: set[int] = field(default_factory=set)
+    last_solved_at: datetime | None = None
+    chat_checked_at: float = field(default_factory=time.monotonic)
+
+    def mark_solved(self, task_id: int, solved_at: datetime) -> bool:
+        if task_id in self.solved:
+            return False
+        self.solved.add(task_id)
+        if self.last_solved_at is None or solved_at > self.last_solved_at:
+            self.last_solved_at = solved_at
+        return True
+
+
+@dataclass
+class GameState:
+    """ Состояние идущей игры: нормализованные ответы, участники и прогресс команд. """
+    game_id: int
+    owner_id: int | None
+    datetime_start: datetime
+    datetime_end: datetime
+    versions: tuple[tuple[str, int], ...]
+    answers: dict[int, str]
+    teams: dict[int, TeamProgress]
+    # Команда каждого игрока; None — игрок состоит в нескольких командах игры
+    members: dict[int, int | None]
+    leaderboard: Leaderboard
+
+    def is_current(self) -> bool:
+        """ Не изменились ли с момента загрузки игра, её задания, команды и их составы. """
+        return all(entity_versions.get(key) == version for key, version in self.versions)
+
+    def is_running(self, now: datetime) -> bool:
+        return self.datetime_start <= now <= self.datetime_end
+
+    def mark_solved(self, team_id: int, task_id: int, solved_at: datetime) -> tuple[int, int] | None:
+        """ Отмечает решённое задание и возвращает прежнее и новое место команды,
+        если задание не было решено раньше. """
+        team = self.teams.get(team_id)
+        if team is None or task_id not in self.answers or not team.mark_solved(task_id, solved_at):
+            return None
+        return self.leaderboard.set_score(team_id, len(team.solved))
+
+    def can_view(self, user_id: int, is_superuser: bool) -> bool:
+        return is_superuser or user_id == self.owner_id or user_id in self.members
+
+
+class AnswerEngine:
+    """ Приём ответов во время игры.
+
+    Состояние игры загружается в память при первой отправке ответа после её начала,
+    поэтому проверка ответа — это несколько обращений к словарям без запросов к БД.
+    Решённые задания сохраняются в фоне через ProgressWriter и рассылаются остальным воркерам
+    через брокер, а результат каждой попытки отправляется команде в /ws/events. """
+
+    def __init__(self, session_factory: async_sessionmaker, writer: ProgressWriter,
+                 events_manager: WSConnectionManager, broker: BaseBroker):
+        self.session_factory = session_factory
+        self.writer = writer
+        self.events_manager = events_manager
+        self.broker = broker
+        self.broker.add_subscriber(SOLVED_CHANNEL, self._on_solved)
+        self.broker.add_reconnect_listener(self._on_reconnect)
+        self._games: dict[int, GameState] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._evictions: dict[int, asyncio.TimerHandle] = {}
+
+    async def submit(self, game_id: int, user_id: int, task_id: int, answer: str) -> AnswerResult:
+        state = await self.get_state(game_id)
+        if user_id in state.members:
+            team_id = state.members[user_id]
+        else:
+            team_id = await self._find_member_team(state, user_id)
+        if team_id is None:
+            raise SeveralTeamsInGame
+        expected = state.answers.get(task_id)
+        if expected is None:
+            raise TaskNotInGame
+        team = state.teams[team_id]
+        if task_id in team.solved:
+            return AnswerResult(task_id=task_id, correct=True, already_solved=True)
+        correct = normalize_answer(answer) == expected
+        solved_at = ranks = None
+        if correct:
+            solved_at = datetime.now(timezone.utc)
+            ranks = state.mark_solved(team_id, task_id, solved_at)
+            self.writer.enqueue(dict(game_id=game_id, team_id=team_id, task_id=task_id,
+                                     user_id=user_id, solved_at=solved_at))
+        # Попытка уже учтена, поэтому ошибка рассылки не должна превращаться в ошибку запроса
+        try:
+            await self._announce(state, team_id, team, task_id, user_id, solved_at, ranks)
+        except Exception:
+            logger.exception("Failed to announce an answer to task %s of game %s", task_id, game_id)
+        return AnswerResult(task_id=task_id, correct=correct, already_solved=False)
+
+    async def _announce(self, state: GameState, team_id: int, team: TeamProgress, task_id: int, user_id: int,
+                        solved_at: datetime | None, ranks: tuple[int, int] | None):
+        """ Рассылает решение остальным воркерам и в турнирную таблицу, а попытку — в чат команды. """
+        if solved_at is not None:
+            previous_rank, rank = ranks
+            await self.broker.publish(SOLVED_CHANNEL, encode_frame(
+                {"game_id": state.game_id, "team_id": team_id, "task_id": task_id,
+                 "solved_at": solved_at.timestamp()}
+            ))
+            # Клиент сам сдвигает на одно место вниз команды с местами [rank, previous_rank)
+            await self.events_manager.send_game_event(state.game_id, {
+                "type": "leaderboard", "game_id": state.game_id, "team_id": team_id,
+                "score": len(team.solved), "rank": rank, "previous_rank": previous_rank
+            })
+        chat_id = await self._team_chat(state, team_id, team)
+        if chat_id is not None:
+            await self.events_manager.send_event(chat_id, {
+                "type": "answer", "game_id": state.game_id, "team_id": team_id, "task_id": task_id,
+                "correct": solved_at is not None, "submitted_by": user_id
+            })
+
+    async def standings(self, game_id: int, user_id: int, is_superuser: bool) -> list[LeaderboardRow]:
+        """ Снимок турнирной таблицы для подключившихся позже: дальше таблица обновляется
+        событиями leaderboard в /ws/events. """
+        state = await self.get_state(game_id)
+        if not state.can_view(user_id, is_superuser):
+            await self._find_member_team(state, user_id)
+        return [LeaderboardRow(rank=rank, team_id=team_id, team_name=state.teams[team_id].name, score=score,
+                               last_solved_at=state.teams[team_id].last_solved_at)
+                for rank, team_id, score in state.leaderboard.standings()]
+
+    async def get_state(self, game_id: int) -> GameState:
+        """ Возвращает состояние идущей игры, загружая его при первом обращении
+        и перезагружая, если изменились игра, её задания или команды. """
+        now = datetime.now(timezone.utc)
+        state = self._games.get(game_id)
+        if state is None or not state.is_current():
+            lock = self._locks.setdefault(game_id, asyncio.Lock())
+            async with lock:
+                state = self._games.get(game_id)
+                if state is None or not state.is_current():
+                    try:
+                        state = await self._load(game_id, previous=state)
+                    except GameNotFound:
+                        # Не держим блокировки для несуществующих и удалённых игр
+                        self._evict(game_id)
+                        raise
+                    self._games[game_id] = state
+                    self._schedule_eviction(state)
+        if not state.is_running(now):
+            if now > state.datetime_end:
+                self._evict(game_id)
+            raise GameNotRunning
+        return state
+
+    def _schedule_eviction(self, state: GameState):
+        """ Выгружает игру из памяти в момент её окончания, даже если к ней больше не обратятся. """
+        previous = self._evictions.pop(state.game_id, None)
+        if previous is not None:
+            previous.cancel()
+        delay = (state.datetime_end - datetime.now(timezone.utc)).total_seconds()
+        self._evictions[state.game_id] = asyncio.get_running_loop().call_later(
+            max(delay, 0), self._evict, state.game_id)
+
+    def _evict(self, game_id: int):
+        handle = self._evictions.pop(game_id, None)
+        if handle is not None:
+            handle.cancel()
+        self._games.pop(game_id, None)
+        self._locks.pop(game_id, None)
+
+    async def _find_member_team(self, state: GameState, user_id: int) -> int | None:
+        """ Ищет команду пользователя, добавленного в неё уже после загрузки состояния игры.
+        Возвращает None, если пользователь играет за несколько команд. """
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(AT_TeamUsers.c.team_id)
+                .join(AT_GamesTeams, AT_GamesTeams.c.team_id == AT_TeamUsers.c.team_id)
+                .filter(AT_GamesTeams.c.game_id == state.game_id, AT_TeamUsers.c.user_id == user_id)
+            )
+            team_ids = [team_id for team_id in result.scalars().all() if team_id in state.teams]
+        if not team_ids:
+            raise NotInGame
+        team_id = state.members[user_id] = team_ids[0] if len(team_ids) == 1 else None
+        return team_id
+
+    async def _team_chat(self, state: GameState, team_id: int, team: TeamProgress) -> int | None:
+        """ Чаты создаются вне сервиса, поэтому чат, которого не было при загрузке игры,
+        ищется заново не чаще раза в CHAT_RECHECK_SECONDS. """
+        if team.chat_id is None and time.monotonic() - team.chat_checked_at >= CHAT_RECHECK_SECONDS:
+            team.chat_checked_at = time.monotonic()
+            async with self.session_factory() as db:
+                result = await db.execute(select(Chat.id).filter(Chat.game_id == state.game_id,
+                                                                 Chat.team_id == team_id,
+                                                                 Chat.is_active.is_(True)))
+                team.chat_id = result.scalars().first()
+        return team.chat_id
+
+    async def _load(self, game_id: int, previous: GameState | None) -> GameState:
+        generation = entity_versions.generation
+        async with self.session_factory() as db:
+            result = await db.execute(select(Game.owner_id, Game.datetime_start, Game.datetime_end)
+                                      .filter(Game.id == game_id))
+            game = result.first()
+            if game is None:
+                raise GameNotFound
+            result = await db.execute(
+                select(Task.id, Task.answer).join(AT_GamesTasks, AT_GamesTasks.c.task_id == Task.id)
+                .filter(AT_GamesTasks.c.game_id == game_id)
+            )
+            answers = {task_id: normalize_answer(answer) for task_id, answer in result.all()}
+            result = await db.execute(
+                select(AT_GamesTeams.c.team_id, Team.name, Chat.id)
+                .join(Team, Team.id == AT_GamesTeams.c.team_id)
+                .outerjoin(Chat, and_(Chat.game_id == AT_GamesTeams.c.game_id,
+                                      Chat.team_id == AT_GamesTeams.c.team_id,
+                                      Chat.is_active.is_(True)))
+                .filter(AT_GamesTeams.c.game_id == game_id)
+            )
+            teams = {team_id: TeamProgress(name=name, chat_id=chat_id) for team_id, name, chat_id in result.all()}
+            result = await db.execute(
+                select(AT_TeamUsers.c.user_id, AT_TeamUsers.c.team_id)
+                .join(AT_GamesTeams, AT_GamesTeams.c.team_id == AT_TeamUsers.c.team_id)
+                .filter(AT_GamesTeams.c.game_id == game_id)
+            )
+            members: dict[int, int | None] = {}
+            for user_id, team_id in result.all():
+                # Ответ игрока нескольких команд нельзя однозначно засчитать ни одной из них
+                members[user_id] = None if user_id in members else team_id
+            result = await db.execute(
+                select(SolvedTask.team_id, SolvedTask.task_id, SolvedTask.solved_at)
+                .filter(SolvedTask.game_id == game_id)
+            )
+            solved = list(result.all())
+        # Решения, ещё не записанные в БД или пришедшие от других воркеров, берём из прежнего состояния
+        solved = [(team_id, task_id, as_utc(solved_at)) for team_id, task_id, solved_at in solved]
+        solved += [(row["team_id"], row["task_id"], row["solved_at"]) for row in self.writer.pending(game_id)]
+        if previous is not None:
+            solved += [(team_id, task_id, progress.last_solved_at)
+                       for team_id, progress in previous.teams.items() for task_id in progress.solved]
+        for team_id, task_id, solved_at in solved:
+            if team_id in teams and task_id in answers:
+                teams[team_id].mark_solved(task_id, solved_at)
+        # Порядок команд с равным счётом определяется временем последнего решения
+        never = datetime.min.replace(tzinfo=timezone.utc)
+        ordered = sorted(teams.items(), key=lambda item: item[1].last_solved_at or never)
+        leaderboard = Leaderboard(((team_id, len(team.solved)) for team_id, team in ordered), max_score=len(answers))
+        keys = [f"game:{game_id}", f"game_tasks:{game_id}", f"game_teams:{game_id}"]
+        keys += [f"task:{task_id}" for task_id in answers] + [f"team_users:{team_id}" for team_id in teams]
+        # Если версии менялись во время загрузки, неизвестно, увидели ли запросы изменения:
+        # помечаем состояние устаревшим, и следующее обращение загрузит его заново.
+        versions = tuple((key, entity_versions.get(key) if entity_versions.generation == generation else -1)
+                         for key in keys)
+        return GameState(game_id=game_id, owner_id=game.owner_id, datetime_start=as_utc(game.datetime_start),
+                         datetime_end=as_utc(game.datetime_end), versions=versions,
+                         answers=answers, teams=teams, members=members, leaderboard=leaderboard)
+
+    def _on_reconnect(self):
+        """ Изменения игр, разосланные во время обрыва брокера, потеряны: при следующем обращении
+        состояния загружаются заново, решения из прежних состояний сохраняются. """
+        for state in self._games.values():
+            state.versions = tuple((key, -1) for key, _ in state.versions)
+
+    async def _on_solved(self, frame: str):
+        """ Отмечает задание, решённое на другом воркере. """
+        event = decode_frame(frame)
+        state = self._games.get(event["game_id"])
+        if state is None:
+            return
+        solved_at = datetime.fromtimestamp(event["solved_at"], timezone.utc)
+        state.mark_solved(event["team_id"], event["task_id"], solved_at)
+
+
+answer_engine = AnswerEngine(AsyncSessionLocal, progress_writer, ws_events_manager, broker)
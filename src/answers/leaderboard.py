@@ -0,0 +1,77 @@
+from typing import Iterable
+
+
+class FenwickTree:
+    """ Дерево Фенвика: добавление в позицию и сумма префикса за O(log n). """
+
+    def __init__(self, size: int):
+        self._tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int):
+        index += 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, end: int) -> int:
+        """ Сумма элементов с индексами [0, end). """
+        total = 0
+        while end > 0:
+            total += self._tree[end]
+            end -= end & -end
+        return total
+
+
+class Leaderboard:
+    """ Турнирная таблица игры. Команды упорядочены по числу решённых заданий,
+    при равенстве выше та, что набрала этот результат раньше.
+
+    Одно дерево Фенвика считает команды по очкам, а для каждого значения очков отдельное дерево
+    хранит порядок, в котором команды его достигли. Очки только растут, поэтому каждая команда
+    попадает на каждый уровень не больше одного раза, и место команды вычисляется за O(log n). """
+
+    def __init__(self, teams: Iterable[tuple[int, int]], max_score: int):
+        """ teams — пары (team_id, очки) в порядке достижения этих очков. """
+        teams = list(teams)
+        self.max_score = max_score
+        self._size = len(teams)
+        self._scores = FenwickTree(max_score + 1)
+        self._arrivals: dict[int, FenwickTree] = {}
+        self._next_arrival: dict[int, int] = {}
+        self._positions: dict[int, tuple[int, int]] = {}
+        for team_id, score in teams:
+            self._place(team_id, score)
+
+    def __contains__(self, team_id: int) -> bool:
+        return team_id in self._positions
+
+    def score(self, team_id: int) -> int:
+        return self._positions[team_id][0]
+
+    def rank(self, team_id: int) -> int:
+        score, arrival = self._positions[team_id]
+        higher = self._size - self._scores.prefix_sum(score + 1)
+        return higher + self._arrivals[score].prefix_sum(arrival) + 1
+
+    def set_score(self, team_id: int, score: int) -> tuple[int, int]:
+        """ Переносит команду на новый уровень и возвращает её прежнее и новое место. """
+        previous_rank = self.rank(team_id)
+        old_score, arrival = self._positions.pop(team_id)
+        self._scores.add(old_score, -1)
+        self._arrivals[old_score].add(arrival, -1)
+        self._place(team_id, score)
+        return previous_rank, self.rank(team_id)
+
+    def standings(self) -> list[tuple[int, int, int]]:
+        """ Полная таблица: (место, team_id, очки). """
+        ordered = sorted(self._positions.items(), key=lambda item: (-item[1][0], item[1][1]))
+        return [(rank, team_id, position[0]) for rank, (team_id, position) in enumerate(ordered, start=1)]
+
+    def _place(self, team_id: int, score: int):
+        arrival = self._next_arrival.get(score, 0)
+        self._next_arrival[score] = arrival + 1
+        if score not in self._arrivals:
+            self._arrivals[score] = FenwickTree(self._size)
+        self._arrivals[score].add(arrival, 1)
+        self._scores.add(score, 1)
+        self._positions[team_id] = (score, arrival)
@@ -0,0 +1,13 @@
+from datetime import datetime
+from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from src.database.db import Base
+
+
+class SolvedTask(Base):
+    __tablename__ = "SolvedTask"
+    game_id: Mapped[int] = mapped_column(ForeignKey("Game.id"), primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("Team.id"), primary_key=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("Task.id"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("User.id"), nullable=True)
+    solved_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,75 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Path, Body, status
+from src.answers.engine import answer_engine
+from src.answers.shemas import AnswerSubmit, AnswerResult, LeaderboardRow
+from src.answers.utils import GameNotFound, GameNotRunning, NotInGame, SeveralTeamsInGame, TaskNotInGame
+from src.auth.auth import current_user
+from src.auth.schemas import UserRead
+
+router = APIRouter()
+
+
+@router.post("/games/{game_id}/answers",
+             summary="Submit an answer",
+             response_model=AnswerResult,
+             responses={
+                 status.HTTP_200_OK: {
+                     "description": "Successful Response"},
+                 status.HTTP_403_FORBIDDEN: {
+                     "description": "The user's team does not play this game."},
+                 status.HTTP_404_NOT_FOUND: {
+                     "description": "The game or task was not found."},
+                 status.HTTP_409_CONFLICT: {
+                     "description": "The game is not running or the user plays it for several teams."}
+             })
+async def submit_answer(game_id: Annotated[int, Path()],
+                        answer_data: Annotated[AnswerSubmit, Body()],
+                        user_request_data: Annotated[UserRead, Depends(current_user)]):
+    """ Проверяет ответ команды пользователя на задание идущей игры.
+    Результат также отправляется всей команде через /ws/events. """
+    try:
+        return await answer_engine.submit(game_id, user_request_data.id, answer_data.task_id, answer_data.answer)
+    except GameNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Game with id={game_id} not found.")
+    except GameNotRunning:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"The game with id={game_id} is not running.")
+    except NotInGame:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail=f"Your team does not play the game with id={game_id}.")
+    except SeveralTeamsInGame:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"You play the game with id={game_id} for several teams.")
+    except TaskNotInGame:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Task with id={answer_data.task_id} not found in the game with id={game_id}.")
+
+
+@router.get("/games/{game_id}/leaderboard",
+            summary="Get the game's leaderboard",
+            response_model=list[LeaderboardRow],
+            responses={
+                status.HTTP_200_OK: {
+                    "description": "Successful Response"},
+                status.HTTP_403_FORBIDDEN: {
+                    "description": "The user neither plays nor owns this game."},
+                status.HTTP_404_NOT_FOUND: {
+                    "description": "The game was not found."},
+                status.HTTP_409_CONFLICT: {
+                    "description": "The game is not running."}
+            })
+async def get_leaderboard(game_id: Annotated[int, Path()],
+                          user_request_data: Annotated[UserRead, Depends(current_user)]):
+    """ Возвращает текущую турнирную таблицу идущей игры из памяти, без запросов к БД. """
+    try:
+        return await answer_engine.standings(game_id, user_request_data.id, user_request_data.is_superuser)
+    except GameNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Game with id={game_id} not found.")
+    except GameNotRunning:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"The game with id={game_id} is not running.")
+    except NotInGame:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail=f"You have no rights to the leaderboard of the game with id={game_id}.")
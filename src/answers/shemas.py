@@ -0,0 +1,21 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+
+class AnswerSubmit(BaseModel):
+    task_id: int
+    answer: str = Field(min_length=1, max_length=64)
+
+
+class AnswerResult(BaseModel):
+    task_id: int
+    correct: bool
+    already_solved: bool
+
+
+class LeaderboardRow(BaseModel):
+    rank: int
+    team_id: int
+    team_name: str
+    score: int
+    last_solved_at: datetime | None
@@ -0,0 +1,19 @@
+
+class GameNotFound(Exception):
+    pass
+
+
+class GameNotRunning(Exception):
+    pass
+
+
+class NotInGame(Exception):
+    pass
+
+
+class SeveralTeamsInGame(Exception):
+    pass
+
+
+class TaskNotInGame(Exception):
+    pass
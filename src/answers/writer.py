@@ -0,0 +1,21 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.config import config
+from src.database.batch_writer import BatchWriter
+from src.database.db import AsyncSessionLocal
+from src.answers.models import SolvedTask
+
+
+class ProgressWriter(BatchWriter):
+    """ Отложенная запись решённых заданий. Повторно решённое задание пропускается через ON CONFLICT DO NOTHING. """
+
+    def __init__(self, session_factory: async_sessionmaker, flush_interval_ms: int, batch_size: int):
+        super().__init__(session_factory, SolvedTask, flush_interval_ms, batch_size, ignore_conflicts=True)
+
+    def pending(self, game_id: int) -> list[dict]:
+        """ Ещё не сохранённые строки игры. """
+        return [row for row in self._buffer if row["game_id"] == game_id]
+
+
+progress_writer = ProgressWriter(AsyncSessionLocal,
+                                 flush_interval_ms=config.ANSWER_FLUSH_INTERVAL_MS,
+                                 batch_size=config.ANSWER_FLUSH_BATCH_SIZE)
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from src.config import config
+from src.auth.models import User
+from src.websockets.brokers import broker
+
+INVALIDATION_CHANNEL = "user_cache"
+
+
+class UserCache:
+    """ LRU-кэш пользователей с ограниченным временем жизни записей.
+    Хранит отсоединённые от сессий копии, которые подключаются к сессии запроса через merge. """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, User]] = OrderedDict()
+
+    def get(self, user_id: int) -> User | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def set(self, user: User):
+        if self.max_size <= 0:
+            return
+        self._entries[user.id] = (time.monotonic() + self.ttl, self._detached_copy(user))
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    async def invalidate(self, user_id: int):
+        """ Удаляет пользователя из кэша на всех воркерах. """
+        self.discard(user_id)
+        await broker.publish(INVALIDATION_CHANNEL, str(user_id))
+
+    async def _on_invalidate(self, data: str):
+        self.discard(int(data))
+
+    @staticmethod
+    def _detached_copy(user: User) -> User:
+        copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+        make_transient_to_detached(copy)
+        return copy
+
+
+user_cache = UserCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL_SECONDS)
+broker.add_subscriber(INVALIDATION_CHANNEL, user_cache._on_invalidate)
@@ -1,15 +1,26 @@
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, IntegerIDMixin, InvalidPasswordException
 
 from src.auth.utils import get_user_db
 from src.auth.models import User
 from src.auth.schemas import UserCreate
+from src.auth.cache import user_cache
+from src.database.versions import entity_versions
 
 
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     # TODO: Реализовать сброс пароля и верификацию
 
+    async def get(self, id: int) -> User:
+        """ Возвращает пользователя из кэша, а при промахе загружает его из БД. """
+        cached_user = user_cache.get(id)
+        if cached_user is not None:
+            return await self.user_db.session.merge(cached_user, load=False)
+        user = await super().get(id)
+        user_cache.set(user)
+        return user
+
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
 
@@ -18,6 +29,30 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
                              request: Optional[Request] = None):
         print(f"User {user.id} logged in.")
 
+    async def on_after_update(self,
+                              user: User,
+                              update_dict: Dict[str, Any],
+                              request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+        await entity_versions.bump([f"user:{user.id}"])
+
+    async def on_after_verify(self,
+                              user: User,
+                              request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+        await entity_versions.bump([f"user:{user.id}"])
+
+    async def on_after_reset_password(self,
+                                      user: User,
+                                      request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+
+    async def on_after_delete(self,
+                              user: User,
+                              request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+        await entity_versions.bump([f"user:{user.id}"])
+
     async def validate_password(self,
                                 password: str,
                                 user: Union[UserCreate, User]) -> None:
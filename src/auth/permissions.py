@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from typing import Any
+from fastapi import HTTPException, status
+from sqlalchemy import select, true, ColumnElement
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.orm.interfaces import LoaderOption
+from src.auth.models import User
+
+
+class ObjectNotFound(Exception):
+    pass
+
+
+class AccessDenied(Exception):
+    pass
+
+
+def can_access(model: Any, user: User) -> ColumnElement[bool]:
+    """ SQL-предикат доступа к записи: пользователь — её владелец или суперпользователь. """
+    if user.is_superuser:
+        return true()
+    return model.owner_id == user.id
+
+
+@contextmanager
+def access_errors(name: str, obj_id: int):
+    """ Преобразует ошибки доступа в HTTP-ответы 404 и 403. """
+    try:
+        yield
+    except ObjectNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"{name.capitalize()} with id={obj_id} not found.")
+    except AccessDenied:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail=f"You do not have access rights to the {name} with id={obj_id}")
+
+
+class OwnedCrudMixin:
+    """ Загрузка записей, принадлежащих пользователю, одним запросом вместе с проверкой прав. """
+    model: Any
+    db: AsyncSession
+
+    async def get_accessible(self, obj_id: int, user: User, *options: LoaderOption):
+        """ Возвращает запись, если она существует и доступна пользователю.
+        Загружаются только переданные в options связи. """
+        query = select(self.model, can_access(self.model, user).label("allowed")) \
+            .filter(self.model.id == obj_id).options(*options)
+        result = await self.db.execute(query)
+        row = result.first()
+        if row is None:
+            raise ObjectNotFound
+        if not row.allowed:
+            raise AccessDenied
+        return row[0]
+
+    async def get_accessible_related(self, relationship: InstrumentedAttribute, obj_id: int, user: User) -> list:
+        """ Возвращает связанные записи одним запросом с внешним соединением,
+        не загружая саму родительскую запись. """
+        _, related = await self.get_owner_and_related(relationship, obj_id, user)
+        return related
+
+    async def get_owner_and_related(self, relationship: InstrumentedAttribute, obj_id: int,
+                                    user: User) -> tuple[int | None, list]:
+        """ То же, что get_accessible_related, но дополнительно возвращает владельца родительской записи. """
+        related_model = relationship.property.mapper.class_
+        query = select(can_access(self.model, user).label("allowed"), self.model.owner_id, related_model) \
+            .select_from(self.model).outerjoin(relationship).filter(self.model.id == obj_id)
+        result = await self.db.execute(query)
+        rows = result.all()
+        if not rows:
+            raise ObjectNotFound
+        if not rows[0].allowed:
+            raise AccessDenied
+        return rows[0].owner_id, [row[2] for row in rows if row[2] is not None]
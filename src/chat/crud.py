@@ -1,9 +1,12 @@
 from datetime import datetime
-from sqlalchemy import select, and_
+from typing import Sequence
+from sqlalchemy import select, and_, exists
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from src.auth.models import User
 from src.chat.models import Chat, Message
+from src.chat.shemas import MessageCreate, MessageRead
+from src.database.association_tables import AT_TeamUsers
 
 
 class ChatCrud:
@@ -16,6 +19,13 @@ class ChatCrud:
         self.db.add(db_msg)
         return db_msg
 
+    async def save_message(self, message_data: MessageCreate, user_id: int) -> MessageRead:
+        """ Сохраняет сообщение сразу, без отложенной записи, и возвращает его для рассылки. """
+        db_msg = await self.create_message(message_data, user_id=user_id)
+        await self.commit()
+        await self.refresh(db_msg)
+        return MessageRead(**db_msg.as_dict(exclude=["date"]), date=db_msg.date.timestamp())
+
     async def get_user_data(self, user_id: int) -> User:
         """ Возвращает данные пользователя вместе с данными его команды. """
         query = select(User).filter(User.id == user_id).options(selectinload(User.team))
@@ -28,6 +38,29 @@ class ChatCrud:
         result = await self.db.execute(query)
         return result.scalars().first()
 
+    async def get_chat_data(self, chat_id: int) -> Chat:
+        """ Возвращает данные чата. """
+        query = select(Chat).filter(Chat.id == chat_id)
+        result = await self.db.execute(query)
+        return result.scalars().first()
+
+    async def check_user_in_chat(self, chat: Chat, user_id: int) -> bool:
+        """ Проверяет, состоит ли пользователь в команде, которой принадлежит чат. """
+        query = exists(1).select_from(AT_TeamUsers).where(and_(AT_TeamUsers.c.team_id == chat.team_id,
+                                                               AT_TeamUsers.c.user_id == user_id)).select()
+        result = await self.db.execute(query)
+        return result.scalar_one()
+
+    async def get_chat_messages(self, chat_id: int, before_id: int | None, limit: int) -> Sequence[Message]:
+        """ Возвращает страницу истории чата, начиная с самых новых сообщений.
+        Поиск идёт по индексу (chat_id, id), поэтому не зависит от размера чата. """
+        query = select(Message).filter(Message.chat_id == chat_id)
+        if before_id is not None:
+            query = query.filter(Message.id < before_id)
+        query = query.order_by(Message.id.desc()).limit(limit)
+        result = await self.db.execute(query)
+        return result.scalars().all()
+
     async def get_active_chats(self) -> list[Chat]:
         """ Возвращает все активные чаты. """
         query = select(Chat).filter(Chat.is_active.is_(True)).options(selectinload(Chat.team))
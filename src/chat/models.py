@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import BigInteger, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import BigInteger, String, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from src.database.db import Base
 
@@ -20,6 +20,9 @@ class Chat(Base):
 
 class Message(Base):
     __tablename__ = "Message"
+    __table_args__ = (
+        Index("ix_Message_chat_id_id", "chat_id", "id"),
+    )
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, index=True)
     chat_id: Mapped[int] = mapped_column(ForeignKey("Chat.id"), nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("User.id"), nullable=False)
@@ -1,10 +1,14 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, Body, status
+from fastapi import APIRouter, Depends, Body, HTTPException, Path, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import config
+from src.database.batch_writer import BufferFull
 from src.database.db import get_db_session
 from src.auth.auth import current_user, current_seperuser
 from src.auth.schemas import UserRead
 from src.chat.crud import ChatCrud
+from src.chat.writer import message_writer
+from src.chat.utils import ChatNotFound
 from src.websockets.router import ws_chat_manager
 from src.chat.shemas import MessageCreate, MessageRead, ChatRead
 
@@ -17,18 +21,26 @@ router = APIRouter()
              responses={
                  status.HTTP_201_CREATED: {
                      "description": "Successful Response"},
+                 status.HTTP_404_NOT_FOUND: {
+                     "description": "The chat was not found."},
+                 status.HTTP_503_SERVICE_UNAVAILABLE: {
+                     "description": "Too many messages are waiting to be saved."}
              })
 async def send_message(message: Annotated[MessageCreate, Body()],
                        db: Annotated[AsyncSession, Depends(get_db_session)],
                        user_request_data: Annotated[UserRead, Depends(current_user)]):
-    chat_crud = ChatCrud(db)
-    db_msg = await chat_crud.create_message(message, user_id=user_request_data.id)
-    await chat_crud.commit()
-    await chat_crud.refresh(db_msg)
-
-    msg = MessageRead(**db_msg.as_dict(exclude=["date"]),
-                      date=db_msg.date.timestamp()
-                      )
+    if config.CHAT_WRITE_BEHIND:
+        try:
+            msg = await message_writer.submit(message, user_id=user_request_data.id)
+        except ChatNotFound:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"Chat with id={message.chat_id} not found.")
+        except BufferFull:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=f"Messages can not be saved now, try again later.")
+    else:
+        chat_crud = ChatCrud(db)
+        msg = await chat_crud.save_message(message, user_id=user_request_data.id)
     await ws_chat_manager.send_message(msg)
     return msg
 
@@ -48,3 +60,34 @@ async def iter_active_chats(db: Annotated[AsyncSession, Depends(get_db_session)]
     for chat in chats:
         result.append(ChatRead(**chat.as_dict(), team_name=chat.team.name))
     return result
+
+
+@router.get("/chats/{chat_id}/messages",
+            summary="Get chat history",
+            response_model=list[MessageRead],
+            responses={
+                status.HTTP_200_OK: {
+                    "description": "Successful Response"},
+                status.HTTP_403_FORBIDDEN: {
+                    "description": "Access rights error."},
+                status.HTTP_404_NOT_FOUND: {
+                    "description": "The chat was not found."}
+            })
+async def get_chat_messages(chat_id: Annotated[int, Path()],
+                            db: Annotated[AsyncSession, Depends(get_db_session)],
+                            user_request_data: Annotated[UserRead, Depends(current_user)],
+                            before_id: Annotated[int | None, Query()] = None,
+                            limit: Annotated[int, Query(ge=1, le=100)] = 50):
+    """ Возвращает сообщения чата от новых к старым. Для следующей страницы
+    нужно передать в before_id идентификатор последнего полученного сообщения. """
+    chat_crud = ChatCrud(db)
+    chat = await chat_crud.get_chat_data(chat_id)
+    if not chat:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Chat with id={chat_id} not found.")
+    if user_request_data.is_superuser is False \
+            and not await chat_crud.check_user_in_chat(chat, user_request_data.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail=f"You do not have access rights to the chat with id={chat_id}")
+    messages = await chat_crud.get_chat_messages(chat_id, before_id, limit)
+    return [MessageRead(**msg.as_dict(exclude=["date"]), date=msg.date.timestamp()) for msg in messages]
@@ -0,0 +1,2 @@
+class ChatNotFound(Exception):
+    pass
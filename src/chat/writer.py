@@ -0,0 +1,68 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.config import config
+from src.database.batch_writer import BatchWriter
+from src.database.db import AsyncSessionLocal
+from src.chat.models import Chat, Message
+from src.chat.shemas import MessageCreate, MessageRead
+from src.chat.utils import ChatNotFound
+
+
+class MessageWriter(BatchWriter):
+    """ Отложенная запись сообщений чата.
+
+    Идентификаторы сообщений заранее выбираются блоками из последовательности таблицы Message,
+    поэтому сообщение можно разослать сразу, а в БД оно попадёт пачкой многострочного INSERT
+    каждые flush_interval_ms миллисекунд или при накоплении batch_size сообщений.
+    Пока в очереди max_buffered несохранённых сообщений, новые отклоняются (BufferFull). """
+
+    def __init__(self, session_factory: async_sessionmaker,
+                 flush_interval_ms: int, batch_size: int, id_block_size: int, max_buffered: int | None = None):
+        super().__init__(session_factory, Message, flush_interval_ms, batch_size, max_buffered=max_buffered)
+        self.id_block_size = id_block_size
+        self._ids: deque[int] = deque()
+        self._ids_lock = asyncio.Lock()
+        self._chats: set[int] = set()
+
+    async def submit(self, message_data: MessageCreate, user_id: int) -> MessageRead:
+        """ Ставит сообщение в очередь на запись и сразу возвращает его с присвоенным id.
+        Чат проверяется до постановки в очередь: сообщение в несуществующий чат иначе было бы
+        разослано и потом молча отброшено при записи. """
+        await self._check_chat(message_data.chat_id)
+        row = dict(**message_data.dict(), id=await self._next_id(), user_id=user_id, date=datetime.utcnow())
+        self.enqueue(row)
+        return MessageRead(**{key: value for key, value in row.items() if key != "date"},
+                           date=row["date"].timestamp())
+
+    async def _check_chat(self, chat_id: int):
+        """ Чаты не удаляются, поэтому найденные идентификаторы запоминаются без срока. """
+        if chat_id in self._chats:
+            return
+        async with self.session_factory() as db:
+            result = await db.execute(select(Chat.id).filter(Chat.id == chat_id))
+            if result.scalar_one_or_none() is None:
+                raise ChatNotFound
+        self._chats.add(chat_id)
+
+    async def _next_id(self) -> int:
+        while not self._ids:
+            async with self._ids_lock:
+                if not self._ids:
+                    async with self.session_factory() as db:
+                        result = await db.execute(
+                            text("SELECT nextval(pg_get_serial_sequence('\"Message\"', 'id')) "
+                                 "FROM generate_series(1, :count)"),
+                            {"count": self.id_block_size}
+                        )
+                        self._ids.extend(result.scalars().all())
+        return self._ids.popleft()
+
+
+message_writer = MessageWriter(AsyncSessionLocal,
+                               flush_interval_ms=config.CHAT_FLUSH_INTERVAL_MS,
+                               batch_size=config.CHAT_FLUSH_BATCH_SIZE,
+                               id_block_size=config.CHAT_ID_BLOCK_SIZE,
+                               max_buffered=config.CHAT_MAX_BUFFERED_MESSAGES)
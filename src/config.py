@@ -1,9 +1,12 @@
+from typing import Literal
 from pydantic import BaseSettings, SecretStr
 
 
 class Settings(BaseSettings):
     SECURITY_KEY: SecretStr
     ACCESS_TOKEN_EXPIRE_SECONDS: int
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60
 
     POSTGRES_USERNAME: str
     POSTGRES_PASSWORD: SecretStr
@@ -11,6 +14,45 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str
     POSTGRES_DB_NAME: str
     POSTGRES_DB_NAME_TEST: str
+    POSTGRES_REPLICA_HOST: str | None = None
+    POSTGRES_REPLICA_PORT: str | None = None
+    READ_YOUR_WRITES_SECONDS: float = 5
+    DB_PROFILE: Literal["dev", "prod", "test"] = "dev"
+    DB_ECHO: bool | None = None
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int | None = None
+    DB_POOL_PRE_PING: bool | None = None
+    DB_POOL_RECYCLE: int | None = None
+    DB_STATEMENT_CACHE_SIZE: int | None = None
+    DB_QUERY_STATS_HEADER: bool = False
+
+    CHAT_WRITE_BEHIND: bool = False
+    CHAT_FLUSH_INTERVAL_MS: int = 50
+    CHAT_FLUSH_BATCH_SIZE: int = 500
+    CHAT_ID_BLOCK_SIZE: int = 100
+    CHAT_MAX_BUFFERED_MESSAGES: int = 50000
+
+    TASK_IMPORT_BATCH_SIZE: int = 500
+    BATCH_MAX_ITEMS: int = 1000
+
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: float = 300
+
+    ANSWER_FLUSH_INTERVAL_MS: int = 200
+    ANSWER_FLUSH_BATCH_SIZE: int = 500
+
+    WS_BROKER: Literal["memory", "postgres", "redis"] = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    WS_SEND_QUEUE_SIZE: int = 64
+    WS_SLOW_CONSUMER_POLICY: Literal["drop", "disconnect"] = "drop"
+    WS_MAX_DROPPED_FRAMES: int = 32
+    WS_JSON_ENCODER: Literal["json", "orjson"] = "orjson"
+    WS_REPLAY_BUFFER_SIZE: int = 256
+    WS_REPLAY_MAX_STREAMS: int = 10000
+    WS_HEARTBEAT_INTERVAL: float = 20
+    WS_HEARTBEAT_TIMEOUT: float = 60
+
+    METRICS_TOKEN: SecretStr | None = None
 
     class Config:
         env_file = '.env'
@@ -1,24 +1,72 @@
-from sqlalchemy import ForeignKey, Table, Column
+from enum import Enum
+from typing import Sequence
+from sqlalchemy import ForeignKey, Table, Column, Integer, select, delete, literal, any_
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.db import Base
 
 
 AT_TeamUsers = Table(
     "TeamUsers",
     Base.metadata,
-    Column("team_id", ForeignKey("Team.id")),
-    Column("user_id", ForeignKey("User.id")),
+    Column("team_id", ForeignKey("Team.id"), primary_key=True),
+    Column("user_id", ForeignKey("User.id"), primary_key=True),
 )
 
 AT_GamesTasks = Table(
     "GamesTasks",
     Base.metadata,
-    Column("game_id", ForeignKey("Game.id")),
-    Column("task_id", ForeignKey("Task.id")),
+    Column("game_id", ForeignKey("Game.id"), primary_key=True),
+    Column("task_id", ForeignKey("Task.id"), primary_key=True),
 )
 
 AT_GamesTeams = Table(
     "GamesTeams",
     Base.metadata,
-    Column("game_id", ForeignKey("Game.id")),
-    Column("team_id", ForeignKey("Team.id")),
+    Column("game_id", ForeignKey("Game.id"), primary_key=True),
+    Column("team_id", ForeignKey("Team.id"), primary_key=True),
 )
+
+
+class LinkStatus(str, Enum):
+    added = "added"
+    exists = "exists"
+    not_found = "not_found"
+
+
+async def add_links(db: AsyncSession, table: Table, parent_column: str, parent_id: int,
+                    member_column: str, member_model, member_ids: Sequence[int]) -> dict[int, LinkStatus]:
+    """ Добавляет связи parent_id с member_ids одним INSERT ... ON CONFLICT DO NOTHING.
+    Несуществующие записи отсекаются через INSERT ... SELECT, поэтому ошибок внешнего ключа не бывает,
+    а стоимость не зависит от числа уже существующих связей. """
+    ids = literal(list(member_ids), ARRAY(Integer))
+    query = insert(table).from_select(
+        [parent_column, member_column],
+        select(literal(parent_id), member_model.id).where(member_model.id == any_(ids))
+    ).on_conflict_do_nothing().returning(table.c[member_column])
+    result = await db.execute(query)
+    added = set(result.scalars().all())
+    existing = set()
+    rest = [member_id for member_id in member_ids if member_id not in added]
+    if rest:
+        query = select(member_model.id).where(member_model.id == any_(literal(rest, ARRAY(Integer))))
+        result = await db.execute(query)
+        existing = set(result.scalars().all())
+    statuses = {}
+    for member_id in member_ids:
+        if member_id in added:
+            statuses[member_id] = LinkStatus.added
+        elif member_id in existing:
+            statuses[member_id] = LinkStatus.exists
+        else:
+            statuses[member_id] = LinkStatus.not_found
+    return statuses
+
+
+async def remove_link(db: AsyncSession, table: Table, parent_column: str, parent_id: int,
+                      member_column: str, member_id: int) -> bool:
+    """ Удаляет связь через DELETE ... RETURNING. Возвращает False, если связи не было. """
+    query = delete(table).where(table.c[parent_column] == parent_id, table.c[member_column] == member_id) \
+        .returning(table.c[member_column])
+    result = await db.execute(query)
+    return result.first() is not None
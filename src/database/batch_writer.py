@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.database.db import Base
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY_SECONDS = 5
+
+
+class BufferFull(Exception):
+    pass
+
+
+class BatchWriter:
+    """ Отложенная пакетная запись строк в таблицу модели.
+
+    Строки копятся в памяти и сохраняются многострочным INSERT каждые flush_interval_ms миллисекунд
+    или при накоплении batch_size строк; с ignore_conflicts — INSERT ... ON CONFLICT DO NOTHING.
+    Строки уже подтверждены клиентам, поэтому при недоступности БД пачка возвращается в начало буфера
+    и записывается при следующей попытке; отбрасываются только строки, которые БД отвергла
+    (IntegrityError, DataError). Если задан max_buffered, то при долгой недоступности БД
+    новые строки не принимаются, как только в буфере их накопится столько (BufferFull). """
+
+    def __init__(self, session_factory: async_sessionmaker, model: type[Base],
+                 flush_interval_ms: int, batch_size: int, ignore_conflicts: bool = False,
+                 max_buffered: int | None = None):
+        self.session_factory = session_factory
+        self.model = model
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.ignore_conflicts = ignore_conflicts
+        self.max_buffered = max_buffered
+        self._buffer: list[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """ Останавливает фоновую запись и сохраняет всё накопленное. """
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("%d rows of %s were not saved on shutdown", len(self._buffer), self.model.__name__)
+
+    def enqueue(self, row: dict):
+        if self.max_buffered is not None and len(self._buffer) >= self.max_buffered:
+            raise BufferFull
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                try:
+                    await self._insert(batch)
+                except (IntegrityError, DataError):
+                    logger.exception("Batch insert of %d rows of %s failed, retrying row by row",
+                                     len(batch), self.model.__name__)
+                    await self._insert_row_by_row(batch)
+                except BaseException:
+                    self._buffer[:0] = batch
+                    raise
+
+    async def _insert(self, rows: list[dict]):
+        statement = insert(self.model).values(rows)
+        if self.ignore_conflicts:
+            statement = statement.on_conflict_do_nothing()
+        async with self.session_factory() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    async def _insert_row_by_row(self, rows: list[dict]):
+        for number, row in enumerate(rows):
+            try:
+                await self._insert([row])
+            except (IntegrityError, DataError):
+                logger.exception("Row %s of %s was dropped", row, self.model.__name__)
+            except BaseException:
+                self._buffer[:0] = rows[number:]
+                raise
+
+    async def _run(self):
+        retry_delay = self.flush_interval
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                retry_delay = self.flush_interval
+            except Exception:
+                logger.exception("Flush of %s failed, retrying in %.1f s", self.model.__name__, retry_delay)
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY_SECONDS)
@@ -1,6 +1,35 @@
+from typing import Any
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from src.config import config
+from src.database.query_stats import attach_query_stats
+from src.database.telemetry import TimedAsyncAdaptedQueuePool, pool_telemetry
+
+ENGINE_PROFILES: dict[str, dict[str, Any]] = {
+    "dev": dict(echo=True, pool_size=5, max_overflow=10, pool_pre_ping=False,
+                pool_recycle=-1, statement_cache_size=100),
+    "prod": dict(echo=False, pool_size=20, max_overflow=10, pool_pre_ping=True,
+                 pool_recycle=1800, statement_cache_size=500),
+    "test": dict(echo=False, pool_size=5, max_overflow=0, pool_pre_ping=False,
+                 pool_recycle=-1, statement_cache_size=0),
+}
+
+
+def get_engine_options(profile: str) -> dict[str, Any]:
+    """ Возвращает параметры движка для профиля с учётом переопределений из настроек. """
+    options = dict(ENGINE_PROFILES[profile])
+    overrides = dict(echo=config.DB_ECHO,
+                     pool_size=config.DB_POOL_SIZE,
+                     max_overflow=config.DB_MAX_OVERFLOW,
+                     pool_pre_ping=config.DB_POOL_PRE_PING,
+                     pool_recycle=config.DB_POOL_RECYCLE,
+                     statement_cache_size=config.DB_STATEMENT_CACHE_SIZE)
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    statement_cache_size = options.pop("statement_cache_size")
+    return dict(**options,
+                poolclass=TimedAsyncAdaptedQueuePool,
+                connect_args={"prepared_statement_cache_size": statement_cache_size})
+
 
 SQLALCHEMY_DATABASE_URL = "postgresql+asyncpg://{user_name}:{user_password}@{host}:{port}/{db_name}".format(
     user_name=config.POSTGRES_USERNAME,
@@ -9,9 +38,26 @@ SQLALCHEMY_DATABASE_URL = "postgresql+asyncpg://{user_name}:{user_password}@{hos
     port=config.POSTGRES_PORT,
     db_name=config.POSTGRES_DB_NAME
 )
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, **get_engine_options(config.DB_PROFILE))
+pool_telemetry.attach(engine.sync_engine)
+attach_query_stats(engine.sync_engine)
 AsyncSessionLocal = async_sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
 
+if config.POSTGRES_REPLICA_HOST:
+    SQLALCHEMY_REPLICA_URL = "postgresql+asyncpg://{user_name}:{user_password}@{host}:{port}/{db_name}".format(
+        user_name=config.POSTGRES_USERNAME,
+        user_password=config.POSTGRES_PASSWORD.get_secret_value(),
+        host=config.POSTGRES_REPLICA_HOST,
+        port=config.POSTGRES_REPLICA_PORT or config.POSTGRES_PORT,
+        db_name=config.POSTGRES_DB_NAME
+    )
+    replica_engine = create_async_engine(SQLALCHEMY_REPLICA_URL, **get_engine_options(config.DB_PROFILE))
+    attach_query_stats(replica_engine.sync_engine)
+else:
+    replica_engine = engine
+ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, autocommit=False, autoflush=False,
+                                         expire_on_commit=False)
+
 
 class Base(DeclarativeBase):
     pass
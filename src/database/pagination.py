@@ -0,0 +1,27 @@
+import base64
+import json
+from typing import Any, Literal
+
+Order = Literal["asc", "desc"]
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(*values: Any) -> str:
+    """ Кодирует значения ключа сортировки последней записи страницы в непрозрачную строку. """
+    data = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except ValueError:
+        raise InvalidCursor
+    if not isinstance(values, list):
+        raise InvalidCursor
+    return values
@@ -0,0 +1,81 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+from sqlalchemy import event, Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    duration: float = 0.0
+    statements: list[str] = field(default_factory=list)
+
+
+# Все активные замеры текущего контекста: замер теста охватывает замеры отдельных запросов внутри него.
+_active: ContextVar[tuple[QueryStats, ...]] = ContextVar("active_query_stats", default=())
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """ Считает SQL-запросы, выполненные в текущем контексте (запросе или задаче) внутри блока. """
+    stats = QueryStats()
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active.get()
+    if not active:
+        return
+    # Запрос учитывается до выполнения: упавшие запросы (например, нарушение уникальности) тоже считаются.
+    for stats in active:
+        stats.count += 1
+        stats.statements.append(statement)
+    context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    for stats in _active.get():
+        stats.duration += duration
+
+
+def attach_query_stats(engine: Engine):
+    """ Подключает подсчёт запросов к движку. Вне track_queries обработчики ничего не делают. """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """ Добавляет к ответу число SQL-запросов обработчика и их суммарное время:
+    X-DB-Query-Count и Server-Timing (db;dur=мс), который показывают инструменты разработчика браузера.
+    Учитываются запросы, выполненные до начала отправки ответа. """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_queries() as stats:
+            async def send_with_stats(message: Message):
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append(QUERY_COUNT_HEADER, str(stats.count))
+                    headers.append("Server-Timing", f"db;dur={stats.duration * 1000:.2f}")
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
@@ -0,0 +1,110 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import parse_obj_as
+from src.config import config
+from src.auth.models import User
+from src.auth.permissions import AccessDenied, access_errors
+from src.database.versions import entity_versions
+from src.websockets.brokers import broker
+
+
+@dataclass
+class CachedResponse:
+    versions: tuple[tuple[str, int], ...]
+    owner_id: int | None
+    etag: str
+    body: bytes
+    expires_at: float
+
+    def is_current(self) -> bool:
+        return all(entity_versions.get(key) == version for key, version in self.versions)
+
+
+class ResponseCache:
+    """ LRU-кэш готовых тел ответов. Запись действительна, пока не изменилась версия
+    ни одной из сущностей, от которых зависит ответ, но не дольше ttl секунд:
+    рассылка версий может потеряться при обрыве соединения брокера. """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+
+    def get(self, key: str) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_current() or entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+response_cache = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL_SECONDS)
+broker.add_reconnect_listener(response_cache.clear)
+
+
+def make_etag(versions: tuple[tuple[str, int], ...], body: bytes) -> str:
+    # Тело входит в ETag, чтобы ответ, перечитанный после потерянной рассылки версий, получил новый ETag
+    digest = hashlib.blake2b(repr(versions).encode() + body, digest_size=8).hexdigest()
+    return f'"{entity_versions.epoch}-{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+async def cached_read(request: Request, key: str, user: User, name: str, obj_id: int, schema: Any,
+                      load: Callable[[], Awaitable[tuple[int | None, Any]]],
+                      item_prefix: str | None = None) -> Response:
+    """ Отдаёт ответ из кэша или загружает его через load, который проверяет права
+    и возвращает (owner_id, данные). Для списков item_prefix задаёт ключи версий элементов
+    (например, "task"), чтобы изменение любого элемента делало ответ устаревшим.
+    Права на закэшированный ответ проверяются по сохранённому owner_id.
+    Если клиент прислал актуальный ETag в If-None-Match, возвращается 304 без тела. """
+    entry = response_cache.get(key)
+    with access_errors(name, obj_id):
+        if entry is None:
+            generation = entity_versions.generation
+            owner_id, data = await load()
+            versions = [(key, entity_versions.get(key))]
+            if item_prefix is not None:
+                versions += [(f"{item_prefix}:{item.id}", entity_versions.get(f"{item_prefix}:{item.id}"))
+                             for item in data]
+            versions = tuple(versions)
+            body = JSONResponse(jsonable_encoder(parse_obj_as(schema, data))).body
+            settled = all(entity_versions.is_settled(version_key) for version_key, _ in versions)
+            if generation != entity_versions.generation or not settled:
+                # Данные могли устареть во время загрузки или ещё не дойти до реплики,
+                # поэтому ответ отдаётся без ETag и не кэшируется
+                return Response(body, media_type="application/json")
+            entry = CachedResponse(versions, owner_id, make_etag(versions, body), body,
+                                   time.monotonic() + response_cache.ttl)
+            response_cache.set(key, entry)
+        elif not user.is_superuser and entry.owner_id != user.id:
+            raise AccessDenied
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(entry.body, media_type="application/json", headers={"ETag": entry.etag})
@@ -0,0 +1,17 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, status
+from src.auth.auth import current_seperuser
+from src.auth.schemas import UserRead
+from src.database.telemetry import pool_telemetry
+
+router = APIRouter()
+
+
+@router.get("/database/pool",
+            summary="Get database pool statistics",
+            responses={
+                status.HTTP_200_OK: {
+                    "description": "Successful Response"},
+            })
+async def get_pool_stats(user_request_data: Annotated[UserRead, Depends(current_seperuser)]):
+    return pool_telemetry.snapshot()
@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+from typing import Annotated
+from fastapi import Depends, Request
+from src.config import config
+from src.auth.auth import current_user
+from src.auth.models import User
+from src.database.db import engine, replica_engine, AsyncSessionLocal, ReplicaSessionLocal
+from src.websockets.brokers import broker
+
+RECENT_WRITERS_CHANNEL = "recent_writers"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RecentWriters:
+    """ Пользователи, недавно выполнявшие запись. Пока не истекло окно,
+    их чтения идут на основную БД, чтобы они видели собственные изменения. """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._expires: OrderedDict[int, float] = OrderedDict()
+
+    def mark(self, user_id: int):
+        now = time.monotonic()
+        self._expires[user_id] = now + self.window
+        self._expires.move_to_end(user_id)
+        while self._expires:
+            oldest_id, expires_at = next(iter(self._expires.items()))
+            if expires_at >= now:
+                break
+            del self._expires[oldest_id]
+
+    def is_recent(self, user_id: int) -> bool:
+        expires_at = self._expires.get(user_id)
+        return expires_at is not None and expires_at >= time.monotonic()
+
+    async def publish(self, user_id: int):
+        """ Отмечает пользователя на всех воркерах. """
+        self.mark(user_id)
+        await broker.publish(RECENT_WRITERS_CHANNEL, str(user_id))
+
+    async def _on_mark(self, data: str):
+        self.mark(int(data))
+
+
+recent_writers = RecentWriters(config.READ_YOUR_WRITES_SECONDS)
+broker.add_subscriber(RECENT_WRITERS_CHANNEL, recent_writers._on_mark)
+
+
+async def track_writes(request: Request, user: Annotated[User, Depends(current_user)]):
+    """ Зависимость роутера: отмечает пользователя до и после запроса на запись. """
+    if request.method in READ_METHODS or replica_engine is engine:
+        yield
+        return
+    await recent_writers.publish(user.id)
+    yield
+    await recent_writers.publish(user.id)
+
+
+async def get_db_read_session(user: Annotated[User, Depends(current_user)]):
+    """ Сессия для чтения: реплика, если она настроена и пользователь недавно ничего не записывал. """
+    session_factory = ReplicaSessionLocal
+    if replica_engine is engine or recent_writers.is_recent(user.id):
+        session_factory = AsyncSessionLocal
+    async with session_factory() as async_session:
+        yield async_session
@@ -0,0 +1,74 @@
+import time
+from dataclasses import dataclass, asdict
+from sqlalchemy import event, Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass
+class PoolStats:
+    connects: int = 0
+    checkouts: int = 0
+    checkins: int = 0
+    invalidations: int = 0
+    acquire_count: int = 0
+    acquire_time_total: float = 0.0
+    acquire_time_max: float = 0.0
+
+
+class PoolTelemetry:
+    """ Собирает статистику пула соединений по событиям SQLAlchemy. """
+
+    def __init__(self):
+        self.stats = PoolStats()
+        self.engine: Engine | None = None
+
+    def attach(self, engine: Engine):
+        self.engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def record_acquire(self, seconds: float):
+        self.stats.acquire_count += 1
+        self.stats.acquire_time_total += seconds
+        self.stats.acquire_time_max = max(self.stats.acquire_time_max, seconds)
+
+    def snapshot(self) -> dict:
+        """ Возвращает текущее состояние пула и накопленные счётчики. """
+        result = asdict(self.stats)
+        pool = self.engine.pool if self.engine is not None else None
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            result.update(size=pool.size(),
+                          checked_in=pool.checkedin(),
+                          checked_out=pool.checkedout(),
+                          overflow=pool.overflow())
+        return result
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.stats.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.stats.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.stats.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.stats.invalidations += 1
+
+
+pool_telemetry = PoolTelemetry()
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """ Пул, замеряющий время получения соединения, включая ожидание свободного слота.
+    В SQLAlchemy нет события, срабатывающего до начала ожидания, поэтому замер сделан здесь. """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if pool_telemetry.engine is not None and pool_telemetry.engine.pool is self:
+                pool_telemetry.record_acquire(time.perf_counter() - started)
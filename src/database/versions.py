@@ -0,0 +1,75 @@
+import logging
+import secrets
+import time
+from typing import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import config
+from src.websockets.brokers import broker
+
+logger = logging.getLogger(__name__)
+VERSIONS_CHANNEL = "entity_versions"
+PENDING_VERSIONS_KEY = "pending_versions"
+
+
+class EntityVersions:
+    """ Счётчики версий сущностей (ключи вида "game:1", "game_tasks:1", "game_teams:1", "task:5").
+    Увеличиваются после фиксации изменений и рассылаются остальным воркерам через брокер.
+    Счётчики живут в памяти процесса, поэтому ETag дополнительно содержит эпоху воркера. """
+
+    def __init__(self, settle_seconds: float):
+        self.epoch = secrets.token_hex(4)
+        self.settle_seconds = settle_seconds
+        self.generation = 0
+        self._versions: dict[str, tuple[int, float]] = {}
+
+    def get(self, key: str) -> int:
+        entry = self._versions.get(key)
+        return entry[0] if entry is not None else 0
+
+    def is_settled(self, key: str) -> bool:
+        """ Прошло ли после последнего изменения достаточно времени, чтобы реплика его догнала. """
+        entry = self._versions.get(key)
+        return entry is None or time.monotonic() - entry[1] >= self.settle_seconds
+
+    def increment(self, keys: Iterable[str]):
+        now = time.monotonic()
+        for key in keys:
+            self._versions[key] = (self.get(key) + 1, now)
+        self.generation += 1
+
+    async def bump(self, keys: Iterable[str]):
+        """ Увеличивает версии на всех воркерах. Изменения к этому моменту уже зафиксированы,
+        поэтому ошибка брокера только записывается в лог: запрос не должен из-за неё падать. """
+        keys = list(keys)
+        self.increment(keys)
+        try:
+            await broker.publish(VERSIONS_CHANNEL, ",".join(keys))
+        except Exception:
+            logger.exception("Failed to publish entity versions %s", keys)
+
+    def resync(self):
+        """ Вызывается после восстановления подписки: версии, разосланные во время обрыва, потеряны,
+        поэтому загрузки, начатые до этого момента, не должны попасть в кэши. """
+        self.generation += 1
+
+    async def _on_bump(self, data: str):
+        self.increment(data.split(","))
+
+
+entity_versions = EntityVersions(config.READ_YOUR_WRITES_SECONDS if config.POSTGRES_REPLICA_HOST else 0)
+broker.add_subscriber(VERSIONS_CHANNEL, entity_versions._on_bump)
+broker.add_reconnect_listener(entity_versions.resync)
+
+
+class VersionedCrudMixin:
+    """ Копит ключи изменённых сущностей в сессии и увеличивает их версии после commit. """
+    db: AsyncSession
+
+    def touch(self, *keys: str):
+        self.db.info.setdefault(PENDING_VERSIONS_KEY, set()).update(keys)
+
+    async def commit(self):
+        await self.db.commit()
+        keys = self.db.info.pop(PENDING_VERSIONS_KEY, None)
+        if keys:
+            await entity_versions.bump(keys)
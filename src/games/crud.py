@@ -1,86 +1,100 @@
 from datetime import datetime
 from typing import Sequence
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
+from sqlalchemy.sql import Select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from src.database.association_tables import AT_GamesTasks, AT_GamesTeams, LinkStatus, add_links, remove_link
+from src.database.pagination import Order, InvalidCursor, decode_cursor
 from src.games.models import Game
-from src.games.utils import GamesTaskNotFound, GamesTeamNotFound, TeamNotFound, TaskNotFound
-from src.auth.models import User
+from src.auth.permissions import OwnedCrudMixin
+from src.database.versions import VersionedCrudMixin
+from src.games.utils import GamesTaskNotFound, GamesTeamNotFound, TeamNotFound, TaskNotFound, \
+    GamesTaskAlreadyAdded, GamesTeamAlreadyAdded
 from src.tasks.models import Task
 from src.teams.models import Team
 
 
-class GamesCrud:
+class GamesCrud(OwnedCrudMixin, VersionedCrudMixin):
+    model = Game
+
     def __init__(self, db_session: AsyncSession):
         self.db = db_session
 
-    async def get_available_games(self) -> Sequence[Game]:
-        """ Возвращает данные актуальных игр.  """
+    async def get_available_games(self, limit: int, cursor: str | None = None, order: Order = "asc",
+                                  date_from: datetime | None = None,
+                                  date_to: datetime | None = None) -> Sequence[Game]:
+        """ Возвращает страницу актуальных игр.  """
         query = select(Game).filter(Game.datetime_end >= datetime.utcnow())
-        result = await self.db.execute(query)
+        return await self._get_games_page(query, limit, cursor, order, date_from, date_to)
+
+    async def get_user_games(self, user_id: int, limit: int, cursor: str | None = None, order: Order = "asc",
+                             date_from: datetime | None = None,
+                             date_to: datetime | None = None) -> Sequence[Game]:
+        """ Возвращает страницу игр, созданных пользователем.  """
+        query = select(Game).filter(Game.owner_id == user_id)
+        return await self._get_games_page(query, limit, cursor, order, date_from, date_to)
+
+    async def _get_games_page(self, query: Select, limit: int, cursor: str | None, order: Order,
+                              date_from: datetime | None, date_to: datetime | None) -> Sequence[Game]:
+        """ Применяет фильтры по дате начала и keyset-пагинацию по (datetime_start, id). """
+        if date_from is not None:
+            query = query.filter(Game.datetime_start >= date_from)
+        if date_to is not None:
+            query = query.filter(Game.datetime_start <= date_to)
+        if cursor is not None:
+            try:
+                datetime_start, game_id = decode_cursor(cursor)
+                cursor_key = tuple_(datetime.fromisoformat(datetime_start), int(game_id))
+            except (ValueError, TypeError):
+                raise InvalidCursor
+            sort_key = tuple_(Game.datetime_start, Game.id)
+            query = query.filter(sort_key > cursor_key if order == "asc" else sort_key < cursor_key)
+        if order == "asc":
+            query = query.order_by(Game.datetime_start.asc(), Game.id.asc())
+        else:
+            query = query.order_by(Game.datetime_start.desc(), Game.id.desc())
+        result = await self.db.execute(query.limit(limit))
         return result.scalars().all()
 
-    async def get_game_data(self, game_id: int) -> Game:
-        """ Возвращает данные игры.  """
-        query = select(Game).filter(Game.id == game_id).options(selectinload(Game.user))
-        result = await self.db.execute(query)
-        return result.scalars().first()
-
-    async def get_game_data_with_tasks(self, game_id: int) -> Game:
-        """ Возвращает данные игры.  """
-        query = select(Game).filter(Game.id == game_id).options(selectinload(Game.user), selectinload(Game.tasks))
-        result = await self.db.execute(query)
-        return result.scalars().first()
-
-    async def add_task_to_game(self, game: Game, task_id: int):
+    async def add_task_to_game(self, game_id: int, task_id: int):
         """ Добавляет загадку в игру. """
-        query = select(Task).filter(Task.id == task_id)
-        result = await self.db.execute(query)
-        task = result.scalars().first()
-        if task is not None:
-            game.tasks.append(task)
-        else:
+        statuses = await add_links(self.db, AT_GamesTasks, "game_id", game_id, "task_id", Task, [task_id])
+        self.touch(f"game_tasks:{game_id}")
+        if statuses[task_id] == LinkStatus.not_found:
             raise TaskNotFound
-        return
+        if statuses[task_id] == LinkStatus.exists:
+            raise GamesTaskAlreadyAdded
+
+    async def add_tasks_to_game(self, game_id: int, task_ids: list[int]) -> dict[int, LinkStatus]:
+        """ Добавляет в игру несколько загадок одним запросом. """
+        self.touch(f"game_tasks:{game_id}")
+        return await add_links(self.db, AT_GamesTasks, "game_id", game_id, "task_id", Task, task_ids)
 
-    async def remove_task_from_game(self, game: Game, task_id: int):
+    async def remove_task_from_game(self, game_id: int, task_id: int):
         """ Удаляет загадку из игры. """
-        flag = False
-        for games_task in game.tasks:
-            if games_task.id == task_id:
-                game.tasks.remove(games_task)
-                flag = True
-        if not flag:
+        if not await remove_link(self.db, AT_GamesTasks, "game_id", game_id, "task_id", task_id):
             raise GamesTaskNotFound
-        return
+        self.touch(f"game_tasks:{game_id}")
 
-    async def get_game_data_with_teams(self, game_id: int) -> Game:
-        """ Возвращает данные игры.  """
-        query = select(Game).filter(Game.id == game_id).options(selectinload(Game.user), selectinload(Game.teams))
-        result = await self.db.execute(query)
-        return result.scalars().first()
-
-    async def add_team_to_game(self, game: Game, team_id: int):
+    async def add_team_to_game(self, game_id: int, team_id: int):
         """ Добавляет команду в игру. """
-        query = select(Team).filter(Team.id == team_id)
-        result = await self.db.execute(query)
-        team = result.scalars().first()
-        if team is not None:
-            game.teams.append(team)
-        else:
+        statuses = await add_links(self.db, AT_GamesTeams, "game_id", game_id, "team_id", Team, [team_id])
+        self.touch(f"game_teams:{game_id}")
+        if statuses[team_id] == LinkStatus.not_found:
             raise TeamNotFound
-        return
+        if statuses[team_id] == LinkStatus.exists:
+            raise GamesTeamAlreadyAdded
+
+    async def add_teams_to_game(self, game_id: int, team_ids: list[int]) -> dict[int, LinkStatus]:
+        """ Добавляет в игру несколько команд одним запросом. """
+        self.touch(f"game_teams:{game_id}")
+        return await add_links(self.db, AT_GamesTeams, "game_id", game_id, "team_id", Team, team_ids)
 
-    async def remove_team_from_game(self, game: Game, team_id: int):
+    async def remove_team_from_game(self, game_id: int, team_id: int):
         """ Удаляет команду из игры. """
-        flag = False
-        for games_team in game.teams:
-            if games_team.id == team_id:
-                game.teams.remove(games_team)
-                flag = True
-        if not flag:
+        if not await remove_link(self.db, AT_GamesTeams, "game_id", game_id, "team_id", team_id):
             raise GamesTeamNotFound
-        return
+        self.touch(f"game_teams:{game_id}")
 
     async def create_game(self, game_data, owner_id):
         """ Создаёт запись игры в БД.  """
@@ -91,24 +105,17 @@ class GamesCrud:
     async def delete_game(self, game: Game):
         """ Удаляет запись игры из БД.  """
         await self.db.delete(game)
-        await self.db.commit()
+        self.touch(f"game:{game.id}", f"game_tasks:{game.id}", f"game_teams:{game.id}")
+        await self.commit()
         return game
 
     async def update_game(self, game: Game, update_data: dict):
         """ Обновляет информация об игре. """
         for key, value in update_data.items():
             setattr(game, key, value)
-        await self.db.commit()
+        self.touch(f"game:{game.id}")
+        await self.commit()
         return game
 
-    async def get_user_data(self, user_id: int) -> User:
-        """ Возвращает данные пользователя вместе с созданными им играми.  """
-        query = select(User).filter(User.id == user_id).options(selectinload(User.games))  # TODO: .limit(10)
-        result = await self.db.execute(query)
-        return result.scalars().first()
-
-    async def commit(self):
-        await self.db.commit()
-
     async def refresh(self, instance: object):
         await self.db.refresh(instance)
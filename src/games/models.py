@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, ForeignKey, DateTime
+from sqlalchemy import Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from src.database.db import Base
 from src.database.association_tables import AT_GamesTasks, AT_GamesTeams
@@ -7,6 +7,10 @@ from src.database.association_tables import AT_GamesTasks, AT_GamesTeams
 
 class Game(Base):
     __tablename__ = "Game"
+    __table_args__ = (
+        Index("ix_Game_owner_id_datetime_start_id", "owner_id", "datetime_start", "id"),
+        Index("ix_Game_datetime_start_id", "datetime_start", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     owner_id: Mapped[int] = mapped_column(ForeignKey("User.id"), nullable=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
@@ -1,17 +1,24 @@
+from datetime import datetime
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Path, Body, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Body, status, Query, Response, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.db import get_db_session
-from src.games.shemas import GameCreate, GameRead, GameUpdate
+from src.database.routing import get_db_read_session, track_writes
+from src.database.pagination import Order, InvalidCursor, NEXT_CURSOR_HEADER, encode_cursor
+from src.database.response_cache import cached_read
+from src.config import config
+from src.games.shemas import GameCreate, GameRead, GameUpdate, BatchItemResult
 from src.games.models import Game as GameModel
-from src.games.utils import GamesTaskNotFound, GamesTeamNotFound, TeamNotFound, TaskNotFound
+from src.games.utils import GamesTaskNotFound, GamesTeamNotFound, TeamNotFound, TaskNotFound, \
+    GamesTaskAlreadyAdded, GamesTeamAlreadyAdded
 from src.games.crud import GamesCrud
 from src.auth.auth import current_user
+from src.auth.permissions import access_errors
 from src.auth.schemas import UserRead
 from src.tasks.shemas import TaskRead
 from src.teams.shemas import TeamRead
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(track_writes)])
 
 
 @router.get("/games/available",
@@ -20,21 +27,32 @@ router = APIRouter()
             responses={
                 status.HTTP_200_OK: {
                     "description": "Successful Response"},
+                status.HTTP_400_BAD_REQUEST: {
+                    "description": "Invalid cursor."},
                 status.HTTP_403_FORBIDDEN: {
-                    "description": "Access rights error."},
-                status.HTTP_404_NOT_FOUND: {
-                    "description": "The games was not found."}
+                    "description": "Access rights error."}
             })
-async def get_available_games(db: Annotated[AsyncSession, Depends(get_db_session)],
-                              user_request_data: Annotated[UserRead, Depends(current_user)]):
-    game_crud = GamesCrud(db)
-    games = await game_crud.get_available_games()
+async def get_available_games(response: Response,
+                              db: Annotated[AsyncSession, Depends(get_db_read_session)],
+                              user_request_data: Annotated[UserRead, Depends(current_user)],
+                              cursor: Annotated[str | None, Query()] = None,
+                              limit: Annotated[int, Query(ge=1, le=100)] = 20,
+                              order: Annotated[Order, Query()] = "asc",
+                              date_from: Annotated[datetime | None, Query()] = None,
+                              date_to: Annotated[datetime | None, Query()] = None):
+    """ Возвращает страницу игр, упорядоченных по дате начала. Курсор следующей
+    страницы передаётся в заголовке X-Next-Cursor. """
     if user_request_data.is_superuser is False:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail=f"You have no rights to this information.")
-    if games is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"The games were not found.")
+    game_crud = GamesCrud(db)
+    try:
+        games = await game_crud.get_available_games(limit, cursor, order, date_from, date_to)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid cursor.")
+    if len(games) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(games[-1].datetime_start, games[-1].id)
     return games
 
 
@@ -61,23 +79,24 @@ async def create_game(game_data: Annotated[GameCreate, Body()],
             responses={
                 status.HTTP_200_OK: {
                     "description": "Successful Response"},
+                status.HTTP_304_NOT_MODIFIED: {
+                    "description": "The game has not changed since the ETag in If-None-Match."},
                 status.HTTP_403_FORBIDDEN: {
                     "description": "Access rights error."},
                 status.HTTP_404_NOT_FOUND: {
                     "description": "The game was not found."}
             })
 async def get_game(game_id: Annotated[int, Path()],
-                   db: Annotated[AsyncSession, Depends(get_db_session)],
+                   request: Request,
+                   db: Annotated[AsyncSession, Depends(get_db_read_session)],
                    user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game = await game_crud.get_game_data(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
-    return game
+
+    async def load():
+        game = await game_crud.get_accessible(game_id, user_request_data)
+        return game.owner_id, game
+
+    return await cached_read(request, f"game:{game_id}", user_request_data, "game", game_id, GameRead, load)
 
 
 @router.get("/games",
@@ -86,23 +105,39 @@ async def get_game(game_id: Annotated[int, Path()],
             responses={
                 status.HTTP_200_OK: {
                     "description": "Successful Response"},
+                status.HTTP_400_BAD_REQUEST: {
+                    "description": "Invalid cursor."},
                 status.HTTP_403_FORBIDDEN: {
                     "description": "Access rights error."},
                 status.HTTP_404_NOT_FOUND: {
                     "description": "The game or user was not found."}
             })
 async def get_games(user_id: Annotated[int, Query()],
-                    db: Annotated[AsyncSession, Depends(get_db_session)],
-                    user_request_data: Annotated[UserRead, Depends(current_user)]):
-    game_crud = GamesCrud(db)
-    ans_user = await game_crud.get_user_data(user_id)
+                    response: Response,
+                    db: Annotated[AsyncSession, Depends(get_db_read_session)],
+                    user_request_data: Annotated[UserRead, Depends(current_user)],
+                    cursor: Annotated[str | None, Query()] = None,
+                    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+                    order: Annotated[Order, Query()] = "asc",
+                    date_from: Annotated[datetime | None, Query()] = None,
+                    date_to: Annotated[datetime | None, Query()] = None):
+    """ Возвращает страницу игр пользователя, упорядоченных по дате начала. Курсор следующей
+    страницы передаётся в заголовке X-Next-Cursor. """
     if user_request_data.is_superuser is False and user_id != user_request_data.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail=f"You have no rights to this information.")
-    if ans_user is None or len(ans_user.games) == 0:
+    game_crud = GamesCrud(db)
+    try:
+        games = await game_crud.get_user_games(user_id, limit, cursor, order, date_from, date_to)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid cursor.")
+    if cursor is None and len(games) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"The user or the user's games were not found.")
-    return ans_user.games
+    if len(games) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(games[-1].datetime_start, games[-1].id)
+    return games
 
 
 @router.delete("/games/{game_id}",
@@ -120,13 +155,8 @@ async def delete_game(game_id: Annotated[int, Path()],
                       db: Annotated[AsyncSession, Depends(get_db_session)],
                       user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game = await game_crud.get_game_data(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
+    with access_errors("game", game_id):
+        game = await game_crud.get_accessible(game_id, user_request_data)
     await game_crud.delete_game(game)
     await game_crud.commit()
     return
@@ -148,13 +178,8 @@ async def update_game(game_id: Annotated[int, Path()],
                       user_request_data: Annotated[UserRead, Depends(current_user)],
                       new_game_data: Annotated[GameUpdate, Body()]):
     game_crud = GamesCrud(db)
-    game: GameModel = await game_crud.get_game_data(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
+    with access_errors("game", game_id):
+        game: GameModel = await game_crud.get_accessible(game_id, user_request_data)
     update_data = new_game_data.dict(exclude_unset=True)
     game = await game_crud.update_game(game, update_data)
     await game_crud.commit()
@@ -173,17 +198,12 @@ async def update_game(game_id: Annotated[int, Path()],
                     "description": "The game was not found."}
             })
 async def get_games_user(game_id: Annotated[int, Path()],
-                         db: Annotated[AsyncSession, Depends(get_db_session)],
+                         db: Annotated[AsyncSession, Depends(get_db_read_session)],
                          user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game: GameModel = await game_crud.get_game_data(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
-    return game.user
+    with access_errors("game", game_id):
+        owners = await game_crud.get_accessible_related(GameModel.user, game_id, user_request_data)
+    return owners[0] if owners else None
 
 
 @router.get("/games/{game_id}/tasks",
@@ -192,23 +212,24 @@ async def get_games_user(game_id: Annotated[int, Path()],
             responses={
                 status.HTTP_200_OK: {
                     "description": "Successful Response"},
+                status.HTTP_304_NOT_MODIFIED: {
+                    "description": "The tasks have not changed since the ETag in If-None-Match."},
                 status.HTTP_403_FORBIDDEN: {
                     "description": "Access rights error."},
                 status.HTTP_404_NOT_FOUND: {
                     "description": "The game was not found."}
             })
 async def get_games_tasks(game_id: Annotated[int, Path()],
-                          db: Annotated[AsyncSession, Depends(get_db_session)],
+                          request: Request,
+                          db: Annotated[AsyncSession, Depends(get_db_read_session)],
                           user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game: GameModel = await game_crud.get_game_data_with_tasks(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
-    return game.tasks
+
+    async def load():
+        return await game_crud.get_owner_and_related(GameModel.tasks, game_id, user_request_data)
+
+    return await cached_read(request, f"game_tasks:{game_id}", user_request_data, "game", game_id,
+                             list[TaskRead], load, item_prefix="task")
 
 
 @router.post("/games/{game_id}/tasks",
@@ -229,26 +250,46 @@ async def add_task_to_game(game_id: Annotated[int, Path()],
                            db: Annotated[AsyncSession, Depends(get_db_session)],
                            user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game: GameModel = await game_crud.get_game_data_with_tasks(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}.")
-    for games_task in game.tasks:
-        if games_task.id == task_id:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
-                                detail=f"The task with ID={task_id} has already been "
-                                       f"added to the game with ID={game_id}.")
+    with access_errors("game", game_id):
+        await game_crud.get_accessible(game_id, user_request_data)
     try:
-        await game_crud.add_task_to_game(game, task_id)
+        await game_crud.add_task_to_game(game_id, task_id)
     except TaskNotFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Task with id={task_id} not found.")
-    else:
-        await game_crud.commit()
-    return game.tasks
+    except GamesTaskAlreadyAdded:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"The task with ID={task_id} has already been "
+                                   f"added to the game with ID={game_id}.")
+    await game_crud.commit()
+    return await game_crud.get_accessible_related(GameModel.tasks, game_id, user_request_data)
+
+
+@router.post("/games/{game_id}/tasks:batch",
+             summary="Add several tasks to a game",
+             response_model=list[BatchItemResult],
+             responses={
+                 status.HTTP_200_OK: {
+                     "description": "Successful Response"},
+                 status.HTTP_403_FORBIDDEN: {
+                     "description": "Access rights error."},
+                 status.HTTP_404_NOT_FOUND: {
+                     "description": "The game was not found."}
+             })
+async def add_tasks_to_game(game_id: Annotated[int, Path()],
+                            task_ids: Annotated[list[int], Body(embed=True, min_items=1,
+                                                               max_items=config.BATCH_MAX_ITEMS)],
+                            db: Annotated[AsyncSession, Depends(get_db_session)],
+                            user_request_data: Annotated[UserRead, Depends(current_user)]):
+    """ Добавляет загадки в игру в одной транзакции. Для каждого id возвращается статус:
+    added, exists (уже в игре) или not_found. """
+    game_crud = GamesCrud(db)
+    with access_errors("game", game_id):
+        await game_crud.get_accessible(game_id, user_request_data)
+    task_ids = list(dict.fromkeys(task_ids))
+    statuses = await game_crud.add_tasks_to_game(game_id, task_ids)
+    await game_crud.commit()
+    return [BatchItemResult(id=task_id, status=statuses[task_id]) for task_id in task_ids]
 
 
 @router.delete("/games/{game_id}/tasks/{task_id}",
@@ -267,15 +308,10 @@ async def remove_task_from_game(game_id: Annotated[int, Path()],
                                 db: Annotated[AsyncSession, Depends(get_db_session)],
                                 user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game: GameModel = await game_crud.get_game_data_with_tasks(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
+    with access_errors("game", game_id):
+        await game_crud.get_accessible(game_id, user_request_data)
     try:
-        await game_crud.remove_task_from_game(game, task_id)
+        await game_crud.remove_task_from_game(game_id, task_id)
     except GamesTaskNotFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"The task with ID={task_id} was not found in the game with ID={game_id}")
@@ -296,17 +332,12 @@ async def remove_task_from_game(game_id: Annotated[int, Path()],
                     "description": "The game was not found."}
             })
 async def get_games_teams(game_id: Annotated[int, Path()],
-                          db: Annotated[AsyncSession, Depends(get_db_session)],
+                          db: Annotated[AsyncSession, Depends(get_db_read_session)],
                           user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game: GameModel = await game_crud.get_game_data_with_teams(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
-    return game.teams
+    with access_errors("game", game_id):
+        teams = await game_crud.get_accessible_related(GameModel.teams, game_id, user_request_data)
+    return teams
 
 
 @router.post("/games/{game_id}/teams",
@@ -327,26 +358,46 @@ async def add_team_to_game(game_id: Annotated[int, Path()],
                            db: Annotated[AsyncSession, Depends(get_db_session)],
                            user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game = await game_crud.get_game_data_with_teams(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}.")
-    for games_team in game.teams:
-        if games_team.id == team_id:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
-                                detail=f"The task with ID={team_id} has already been "
-                                       f"added to the game with ID={game_id}.")
+    with access_errors("game", game_id):
+        await game_crud.get_accessible(game_id, user_request_data)
     try:
-        await game_crud.add_team_to_game(game, team_id)
+        await game_crud.add_team_to_game(game_id, team_id)
     except TeamNotFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Team with id={team_id} not found.")
-    else:
-        await game_crud.commit()
-    return game.teams
+    except GamesTeamAlreadyAdded:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"The team with ID={team_id} has already been "
+                                   f"added to the game with ID={game_id}.")
+    await game_crud.commit()
+    return await game_crud.get_accessible_related(GameModel.teams, game_id, user_request_data)
+
+
+@router.post("/games/{game_id}/teams:batch",
+             summary="Add several teams to a game",
+             response_model=list[BatchItemResult],
+             responses={
+                 status.HTTP_200_OK: {
+                     "description": "Successful Response"},
+                 status.HTTP_403_FORBIDDEN: {
+                     "description": "Access rights error."},
+                 status.HTTP_404_NOT_FOUND: {
+                     "description": "The game was not found."}
+             })
+async def add_teams_to_game(game_id: Annotated[int, Path()],
+                            team_ids: Annotated[list[int], Body(embed=True, min_items=1,
+                                                               max_items=config.BATCH_MAX_ITEMS)],
+                            db: Annotated[AsyncSession, Depends(get_db_session)],
+                            user_request_data: Annotated[UserRead, Depends(current_user)]):
+    """ Добавляет команды в игру в одной транзакции. Для каждого id возвращается статус:
+    added, exists (уже в игре) или not_found. """
+    game_crud = GamesCrud(db)
+    with access_errors("game", game_id):
+        await game_crud.get_accessible(game_id, user_request_data)
+    team_ids = list(dict.fromkeys(team_ids))
+    statuses = await game_crud.add_teams_to_game(game_id, team_ids)
+    await game_crud.commit()
+    return [BatchItemResult(id=team_id, status=statuses[team_id]) for team_id in team_ids]
 
 
 @router.delete("/games/{game_id}/teams/{team_id}",
@@ -365,15 +416,10 @@ async def remove_team_from_game(game_id: Annotated[int, Path()],
                                 db: Annotated[AsyncSession, Depends(get_db_session)],
                                 user_request_data: Annotated[UserRead, Depends(current_user)]):
     game_crud = GamesCrud(db)
-    game = await game_crud.get_game_data_with_teams(game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Game with id={game_id} not found.")
-    if user_request_data.is_superuser is False and game.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the game with id={game_id}")
+    with access_errors("game", game_id):
+        await game_crud.get_accessible(game_id, user_request_data)
     try:
-        await game_crud.remove_team_from_game(game, team_id)
+        await game_crud.remove_team_from_game(game_id, team_id)
     except GamesTeamNotFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"The team with ID={team_id} was not found in the game with ID={game_id}")
@@ -1,5 +1,6 @@
 from datetime import datetime
 from pydantic import BaseModel, Field
+from src.database.association_tables import LinkStatus
 
 
 class GameBase(BaseModel):
@@ -26,3 +27,8 @@ class GameUpdate(GameBase):
     legend: str | None = Field(min_length=1, max_length=512)
     datetime_start: datetime | None
     datetime_end: datetime | None
+
+
+class BatchItemResult(BaseModel):
+    id: int
+    status: LinkStatus
@@ -13,3 +13,11 @@ class TeamNotFound(Exception):
 
 class TaskNotFound(Exception):
     pass
+
+
+class GamesTaskAlreadyAdded(Exception):
+    pass
+
+
+class GamesTeamAlreadyAdded(Exception):
+    pass
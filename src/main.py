@@ -1,21 +1,45 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from src.database.db import engine
+from src.config import config
+from src.database.db import engine, replica_engine
 from src.auth.auth import auth_backend, fastapi_users
 from src.auth.schemas import UserRead, UserCreate, UserUpdate
 from src.teams.router import router as teams_router
 from src.tasks.router import router as tasks_router
 from src.games.router import router as games_router
 from src.chat.router import router as chat_router
+from src.answers.router import router as answers_router
+from src.answers.writer import progress_writer
+from src.database.router import router as database_router
+from src.metrics.middleware import MetricsMiddleware
+from src.metrics.router import router as metrics_router
+from src.database.pagination import NEXT_CURSOR_HEADER
+from src.database.query_stats import QUERY_COUNT_HEADER, QueryStatsMiddleware
+from src.chat.writer import message_writer
 from src.websockets.ws_manager import WSConnectionManager
-from src.websockets.router import router as ws_router
+from src.websockets.router import router as ws_router, ws_chat_manager, ws_events_manager
+from src.websockets.brokers import broker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await broker.start()
+    if config.CHAT_WRITE_BEHIND:
+        await message_writer.start()
+    await progress_writer.start()
+    await ws_chat_manager.start()
+    await ws_events_manager.start()
     yield
+    await ws_events_manager.stop()
+    await ws_chat_manager.stop()
+    await progress_writer.stop()
+    if config.CHAT_WRITE_BEHIND:
+        await message_writer.stop()
+    await broker.stop()
     await engine.dispose()
+    if replica_engine is not engine:
+        await replica_engine.dispose()
 
 
 app = FastAPI(
@@ -32,7 +56,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", QUERY_COUNT_HEADER],
 )
+if config.DB_QUERY_STATS_HEADER:
+    app.add_middleware(QueryStatsMiddleware)
+# Добавлен последним, поэтому внешний: замер включает все остальные middleware.
+app.add_middleware(MetricsMiddleware)
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
     prefix="/auth/jwt",
@@ -64,7 +93,19 @@ app.include_router(
     chat_router,
     tags=["chat"],
 )
+app.include_router(
+    answers_router,
+    tags=["answers"],
+)
 app.include_router(
     ws_router,
     tags=["ws"],
 )
+app.include_router(
+    database_router,
+    tags=["database"],
+)
+app.include_router(
+    metrics_router,
+    tags=["metrics"],
+)
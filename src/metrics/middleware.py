@@ -0,0 +1,60 @@
+import time
+from typing import Any
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.metrics.collectors import Counter, Gauge, Histogram, MetricsRegistry
+
+metrics_registry = MetricsRegistry()
+REQUEST_DURATION = metrics_registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")))
+REQUESTS_TOTAL = metrics_registry.register(Counter(
+    "http_requests_total", "HTTP responses by route template and status.", ("method", "route", "status")))
+REQUESTS_IN_FLIGHT = metrics_registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being processed."))
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """ Замеряет HTTP-запросы по шаблону маршрута.
+
+    Маршрутизатор Starlette записывает найденный обработчик в общий scope["endpoint"], поэтому после
+    обработки запроса шаблон находится по словарю обработчик -> путь. Число рядов метрик ограничено
+    числом маршрутов, а не числом разных URL; запросы без маршрута попадают в "unmatched".
+    Сделан на чистом ASGI, без BaseHTTPMiddleware, чтобы не добавлять задачу и очередь на каждый запрос. """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._routes: dict[Any, str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            route = self._route(scope)
+            REQUEST_DURATION.observe(duration, scope["method"], route)
+            REQUESTS_TOTAL.inc(scope["method"], route, str(status_code))
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        route = self._routes.get(endpoint)
+        if route is None:
+            routes = {route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")}
+            route = self._routes[endpoint] = routes.get(endpoint, UNMATCHED_ROUTE)
+        return route
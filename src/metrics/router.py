@@ -0,0 +1,48 @@
+import secrets
+from typing import Annotated
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from src.config import config
+from src.metrics.collectors import CallbackGauge
+from src.metrics.middleware import metrics_registry
+from src.websockets.router import ws_chat_manager, ws_events_manager
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+WS_MANAGERS = {"chat": ws_chat_manager, "events": ws_events_manager}
+
+
+def ws_stat(name: str):
+    return lambda: [((manager_name,), getattr(manager.stats, name)) for manager_name, manager in WS_MANAGERS.items()]
+
+
+metrics_registry.register(CallbackGauge(
+    "ws_connections", "Open WebSocket connections.", ("manager",),
+    lambda: [((manager_name,), len(manager.connections)) for manager_name, manager in WS_MANAGERS.items()]))
+metrics_registry.register(CallbackGauge(
+    "ws_reaped_connections_total", "WebSocket connections closed by the heartbeat.", ("manager",),
+    ws_stat("reaped_connections"), kind="counter"))
+metrics_registry.register(CallbackGauge(
+    "ws_slow_consumer_disconnects_total", "WebSocket connections closed as slow consumers.", ("manager",),
+    ws_stat("slow_consumer_disconnects"), kind="counter"))
+metrics_registry.register(CallbackGauge(
+    "ws_sent_frames_total", "Frames sent to WebSocket clients.", ("manager",),
+    ws_stat("sent_frames"), kind="counter"))
+metrics_registry.register(CallbackGauge(
+    "ws_dropped_frames_total", "Frames dropped for full WebSocket send queues.", ("manager",),
+    ws_stat("dropped_frames"), kind="counter"))
+
+
+@router.get("/metrics",
+            summary="Get metrics in Prometheus format",
+            include_in_schema=False)
+async def get_metrics(authorization: Annotated[str | None, Header()] = None):
+    """ Доступен по токену METRICS_TOKEN (Authorization: Bearer ...). Без настроенного токена отключён. """
+    if config.METRICS_TOKEN is None or not config.METRICS_TOKEN.get_secret_value():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    expected = f"Bearer {config.METRICS_TOKEN.get_secret_value()}"
+    if authorization is None or not secrets.compare_digest(authorization.encode(), expected.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
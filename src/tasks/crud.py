@@ -1,45 +1,59 @@
-from sqlalchemy import select
+from typing import Sequence
+from sqlalchemy import select, insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from src.database.pagination import Order, InvalidCursor, decode_cursor
 from src.tasks.models import Task
-from src.auth.models import User
+from src.auth.permissions import OwnedCrudMixin
+from src.database.versions import VersionedCrudMixin
 
 
-class TasksCrud:
+class TasksCrud(OwnedCrudMixin, VersionedCrudMixin):
+    model = Task
+
     def __init__(self, db_session: AsyncSession):
         self.db = db_session
 
-    async def get_task_data(self, task_id: int):
-        """ Возвращает данные загадки.  """
-        query = select(Task).filter(Task.id == task_id).options(selectinload(Task.user))
-        result = await self.db.execute(query)
-        return result.scalars().first()
-
     async def create_task(self, task_data, owner_id):
         """ Создаёт запись загадки в БД.  """
         db_task = Task(**task_data.dict(), owner_id=owner_id)
         self.db.add(db_task)
         return db_task
 
+    async def create_tasks(self, rows: list[dict], owner_id: int) -> list[int]:
+        """ Создаёт пачку загадок одним многострочным INSERT и возвращает их id.  """
+        values = [dict(row, owner_id=owner_id) for row in rows]
+        result = await self.db.execute(insert(Task).values(values).returning(Task.id))
+        return list(result.scalars().all())
+
     async def delete_task(self, task: Task):
         """ Удаляет запись команды из БД.  """
         await self.db.delete(task)
+        self.touch(f"task:{task.id}")
         return task
 
     async def update_task(self, task: Task, update_data: dict):
         """ Обновляет информация о команде. """
         for key, value in update_data.items():
             setattr(task, key, value)
+        self.touch(f"task:{task.id}")
         return task
 
-    async def get_user_data(self, user_id: int) -> User:
-        """ Возвращает данные пользователя вместе с созданными им загадками.  """
-        query = select(User).filter(User.id == user_id).options(selectinload(User.tasks))
-        result = await self.db.execute(query)
-        return result.scalars().first()
-
-    async def commit(self):
-        await self.db.commit()
+    async def get_user_tasks(self, user_id: int, limit: int, cursor: str | None = None, order: Order = "asc",
+                             level: int | None = None) -> Sequence[Task]:
+        """ Возвращает страницу загадок, созданных пользователем, с keyset-пагинацией по id.  """
+        query = select(Task).filter(Task.owner_id == user_id)
+        if level is not None:
+            query = query.filter(Task.level == level)
+        if cursor is not None:
+            try:
+                task_id, = decode_cursor(cursor)
+                task_id = int(task_id)
+            except (ValueError, TypeError):
+                raise InvalidCursor
+            query = query.filter(Task.id > task_id if order == "asc" else Task.id < task_id)
+        query = query.order_by(Task.id.asc() if order == "asc" else Task.id.desc())
+        result = await self.db.execute(query.limit(limit))
+        return result.scalars().all()
 
     async def refresh(self, instance: object):
         await self.db.refresh(instance)
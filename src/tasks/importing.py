@@ -0,0 +1,119 @@
+import codecs
+import json
+from typing import AsyncIterator
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+_WHITESPACE = " \t\r\n"
+# Самый длинный литерал JSON, который разбор Python может встретить недочитанным ("-Infinity")
+_MAX_LITERAL_LENGTH = 9
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+class JsonArrayReader:
+    """ Инкрементальный разбор JSON-массива объектов: отдаёт элементы по мере поступления данных,
+    не дожидаясь конца тела запроса. """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._consumed = 0
+        self._state = "start"
+
+    def feed(self, text: str, final: bool = False) -> list[dict]:
+        """ Добавляет порцию данных и возвращает дочитанные элементы.
+        final означает, что данных больше не будет и недочитанный объект — ошибка. """
+        self._buffer += text
+        items = []
+        pos = 0
+        buffer = self._buffer
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if self._state == "start":
+                if char != "[":
+                    raise ImportFormatError("Expected a JSON array.")
+                self._state = "first"
+                pos += 1
+            elif self._state in ("first", "item"):
+                if char == "]" and self._state == "first":
+                    self._state = "done"
+                    pos += 1
+                    continue
+                if char != "{":
+                    raise ImportFormatError("Array items must be JSON objects.")
+                try:
+                    item, pos = self._decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as error:
+                    if not final and self._is_incomplete(buffer, error):
+                        # Объект ещё не дочитан — ждём следующую порцию данных
+                        break
+                    raise ImportFormatError(f"Invalid JSON at character {self._consumed + error.pos}: {error.msg}.")
+                items.append(item)
+                self._state = "separator"
+            elif self._state == "separator":
+                if char == ",":
+                    self._state = "item"
+                elif char == "]":
+                    self._state = "done"
+                else:
+                    raise ImportFormatError("Expected ',' or ']' after an array item.")
+                pos += 1
+            else:
+                raise ImportFormatError("Unexpected data after the end of the array.")
+        self._buffer = buffer[pos:]
+        self._consumed += pos
+        return items
+
+    @staticmethod
+    def _is_incomplete(buffer: str, error: json.JSONDecodeError) -> bool:
+        """ Может ли ошибка исчезнуть с новыми данными. Недочитанная строка сообщается с позицией
+        её начала, недочитанный литерал — с позицией литерала; остальные ошибки у конца буфера.
+        Ошибка в середине буфера окончательна, и остаток тела не копится и не разбирается заново. """
+        return error.msg.startswith("Unterminated string") or len(buffer) - error.pos <= _MAX_LITERAL_LENGTH
+
+    def close(self):
+        if self._state != "done":
+            raise ImportFormatError("Unexpected end of the JSON array.")
+
+
+async def iter_records(chunks: AsyncIterator[bytes], ndjson: bool) -> AsyncIterator[dict]:
+    """ Разбирает тело запроса в формате JSON-массива или NDJSON и отдаёт записи по одной. """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    if ndjson:
+        tail = ""
+        line_number = 0
+        async for chunk in chunks:
+            lines = (tail + decoder.decode(chunk)).split("\n")
+            tail = lines.pop()
+            for line in lines:
+                line_number += 1
+                if line.strip():
+                    yield _parse_line(line, line_number)
+        tail += decoder.decode(b"", final=True)
+        if tail.strip():
+            yield _parse_line(tail, line_number + 1)
+        return
+    reader = JsonArrayReader()
+    async for chunk in chunks:
+        for item in reader.feed(decoder.decode(chunk)):
+            yield item
+    for item in reader.feed(decoder.decode(b"", final=True), final=True):
+        yield item
+    reader.close()
+
+
+def _parse_line(line: str, line_number: int) -> dict:
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError:
+        raise ImportFormatError(f"Invalid JSON on line {line_number}.")
+    if not isinstance(item, dict):
+        raise ImportFormatError(f"Line {line_number} is not a JSON object.")
+    return item
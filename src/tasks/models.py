@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Integer, String, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from src.database.db import Base
 from src.database.association_tables import AT_GamesTasks
@@ -6,6 +6,9 @@ from src.database.association_tables import AT_GamesTasks
 
 class Task(Base):
     __tablename__ = "Task"
+    __table_args__ = (
+        Index("ix_Task_owner_id_id", "owner_id", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     owner_id: Mapped[int] = mapped_column(ForeignKey("User.id"), nullable=True)
     level: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
@@ -1,14 +1,20 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Path, Body, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Body, status, Query, Response, Request
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.db import get_db_session
-from src.tasks.shemas import TaskCreate, TaskRead, TaskUpdate
+from src.database.routing import get_db_read_session, track_writes
+from src.database.pagination import Order, InvalidCursor, NEXT_CURSOR_HEADER, encode_cursor
+from src.config import config
+from src.tasks.shemas import TaskCreate, TaskRead, TaskUpdate, TaskImportResult
+from src.tasks.importing import NDJSON_CONTENT_TYPES, ImportFormatError, iter_records
 from src.tasks.models import Task as TaskModel
 from src.tasks.crud import TasksCrud
 from src.auth.auth import current_user
+from src.auth.permissions import access_errors
 from src.auth.schemas import UserRead
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(track_writes)])
 
 
 @router.post("/tasks",
@@ -28,6 +34,48 @@ async def create_task(task_data: Annotated[TaskCreate, Body()],
     return db_task
 
 
+@router.post("/tasks:import",
+             summary="Import tasks",
+             response_model=TaskImportResult,
+             responses={
+                 status.HTTP_200_OK: {
+                     "description": "Successful Response"},
+                 status.HTTP_400_BAD_REQUEST: {
+                     "description": "The request body is not a JSON array or NDJSON."},
+                 status.HTTP_422_UNPROCESSABLE_ENTITY: {
+                     "description": "One of the tasks is invalid. Nothing is imported."}
+             })
+async def import_tasks(request: Request,
+                       db: Annotated[AsyncSession, Depends(get_db_session)],
+                       user_request_data: Annotated[UserRead, Depends(current_user)]):
+    """ Импортирует загадки из JSON-массива или NDJSON (Content-Type: application/x-ndjson).
+    Тело читается потоком, записи вставляются пачками по TASK_IMPORT_BATCH_SIZE в одной транзакции. """
+    task_crud = TasksCrud(db)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    records = iter_records(request.stream(), ndjson=content_type in NDJSON_CONTENT_TYPES)
+    ids: list[int] = []
+    batch: list[dict] = []
+    index = 0
+    try:
+        async for record in records:
+            try:
+                batch.append(TaskCreate.parse_obj(record).dict())
+            except ValidationError as error:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                    detail={"index": index, "errors": error.errors()})
+            index += 1
+            if len(batch) >= config.TASK_IMPORT_BATCH_SIZE:
+                ids += await task_crud.create_tasks(batch, owner_id=user_request_data.id)
+                batch = []
+    except (ImportFormatError, UnicodeDecodeError) as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid import body: {error}")
+    if batch:
+        ids += await task_crud.create_tasks(batch, owner_id=user_request_data.id)
+    await task_crud.commit()
+    return TaskImportResult(created=len(ids), ids=ids)
+
+
 @router.get("/tasks/{task_id}",
             summary="Get Task By Id",
             response_model=TaskRead,
@@ -40,16 +88,11 @@ async def create_task(task_data: Annotated[TaskCreate, Body()],
                     "description": "The task was not found."}
             })
 async def get_task(task_id: Annotated[int, Path()],
-                   db: Annotated[AsyncSession, Depends(get_db_session)],
+                   db: Annotated[AsyncSession, Depends(get_db_read_session)],
                    user_request_data: Annotated[UserRead, Depends(current_user)]):
     task_crud = TasksCrud(db)
-    task = await task_crud.get_task_data(task_id)
-    if not task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Task with id={task_id} not found.")
-    if user_request_data.is_superuser is False and task.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the task with id={task_id}")
+    with access_errors("task", task_id):
+        task = await task_crud.get_accessible(task_id, user_request_data)
     return task
 
 
@@ -59,23 +102,38 @@ async def get_task(task_id: Annotated[int, Path()],
             responses={
                 status.HTTP_200_OK: {
                     "description": "Successful Response"},
+                status.HTTP_400_BAD_REQUEST: {
+                    "description": "Invalid cursor."},
                 status.HTTP_403_FORBIDDEN: {
                     "description": "Access rights error."},
                 status.HTTP_404_NOT_FOUND: {
                     "description": "The task or user was not found."}
             })
 async def get_tasks(user_id: Annotated[int, Query()],
-                    db: Annotated[AsyncSession, Depends(get_db_session)],
-                    user_request_data: Annotated[UserRead, Depends(current_user)]):
-    task_crud = TasksCrud(db)
-    ans_user = await task_crud.get_user_data(user_id)
+                    response: Response,
+                    db: Annotated[AsyncSession, Depends(get_db_read_session)],
+                    user_request_data: Annotated[UserRead, Depends(current_user)],
+                    cursor: Annotated[str | None, Query()] = None,
+                    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+                    order: Annotated[Order, Query()] = "asc",
+                    level: Annotated[int | None, Query()] = None):
+    """ Возвращает страницу загадок пользователя, упорядоченных по id. Курсор следующей
+    страницы передаётся в заголовке X-Next-Cursor. """
     if user_request_data.is_superuser is False and user_id != user_request_data.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail=f"You have no rights to this information.")
-    if ans_user is None or len(ans_user.tasks) == 0:
+    task_crud = TasksCrud(db)
+    try:
+        tasks = await task_crud.get_user_tasks(user_id, limit, cursor, order, level)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid cursor.")
+    if cursor is None and len(tasks) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"The user or the user's tasks were not found.")
-    return ans_user.tasks
+    if len(tasks) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(tasks[-1].id)
+    return tasks
 
 
 @router.delete("/tasks/{task_id}",
@@ -93,13 +151,8 @@ async def delete_task(task_id: Annotated[int, Path()],
                       db: Annotated[AsyncSession, Depends(get_db_session)],
                       user_request_data: Annotated[UserRead, Depends(current_user)]):
     task_crud = TasksCrud(db)
-    task = await task_crud.get_task_data(task_id)
-    if not task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Task with id={task_id} not found.")
-    if user_request_data.is_superuser is False and task.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the task with id={task_id}")
+    with access_errors("task", task_id):
+        task = await task_crud.get_accessible(task_id, user_request_data)
     await task_crud.delete_task(task)
     await task_crud.commit()
     return
@@ -121,13 +174,8 @@ async def update_task(task_id: Annotated[int, Path()],
                       user_request_data: Annotated[UserRead, Depends(current_user)],
                       new_task_data: Annotated[TaskUpdate, Body()]):
     task_crud = TasksCrud(db)
-    task: TaskModel = await task_crud.get_task_data(task_id)
-    if not task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Task with id={task_id} not found.")
-    if user_request_data.is_superuser is False and task.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the task with id={task_id}")
+    with access_errors("task", task_id):
+        task: TaskModel = await task_crud.get_accessible(task_id, user_request_data)
     update_data = new_task_data.dict(exclude_unset=True)
     task = await task_crud.update_task(task, update_data)
     await task_crud.commit()
@@ -146,14 +194,9 @@ async def update_task(task_id: Annotated[int, Path()],
                     "description": "The task was not found."}
             })
 async def get_tasks_user(task_id: Annotated[int, Path()],
-                         db: Annotated[AsyncSession, Depends(get_db_session)],
+                         db: Annotated[AsyncSession, Depends(get_db_read_session)],
                          user_request_data: Annotated[UserRead, Depends(current_user)]):
     task_crud = TasksCrud(db)
-    task: TaskModel = await task_crud.get_task_data(task_id)
-    if not task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Task with id={task_id} not found.")
-    if user_request_data.is_superuser is False and task.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the task with id={task_id}")
-    return task.user
+    with access_errors("task", task_id):
+        owners = await task_crud.get_accessible_related(TaskModel.user, task_id, user_request_data)
+    return owners[0] if owners else None
@@ -22,3 +22,8 @@ class TaskRead(TaskBase):
 
 class TaskUpdate(TaskBase):
     pass
+
+
+class TaskImportResult(BaseModel):
+    created: int
+    ids: list[int]
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Integer, String, ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from src.database.db import Base
 from src.database.association_tables import AT_TeamUsers, AT_GamesTeams
@@ -6,6 +6,10 @@ from src.database.association_tables import AT_TeamUsers, AT_GamesTeams
 
 class Team(Base):
     __tablename__ = "Team"
+    __table_args__ = (
+        # Уникальность названия без учёта регистра обеспечивает сама БД
+        Index("ix_Team_lower_name", text("lower(name)"), unique=True),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     owner_id: Mapped[int] = mapped_column(ForeignKey("User.id"), nullable=True)
     name: Mapped[str] = mapped_column(String(length=32), nullable=False)
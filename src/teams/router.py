@@ -1,15 +1,18 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Path, Body, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Body, status, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.db import get_db_session
+from src.database.routing import get_db_read_session, track_writes
+from src.database.response_cache import cached_read
 from src.teams.shemas import TeamCreate, TeamRead, TeamUpdate
 from src.teams.models import Team as TeamModel
 from src.teams.crud import TeamsCrud
 from src.auth.auth import current_user
+from src.auth.permissions import access_errors
 from src.auth.schemas import UserRead
-from src.teams.utils import TeamsUserNotFound
+from src.teams.utils import TeamsUserNotFound, TeamsUserAlreadyAdded, UserNotFound, TeamNameTaken
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(track_writes)])
 
 
 @router.post("/teams",
@@ -25,11 +28,11 @@ async def create_team(team_data: Annotated[TeamCreate, Body()],
                       db: Annotated[AsyncSession, Depends(get_db_session)],
                       user_request_data: Annotated[UserRead, Depends(current_user)]):
     teams_crud = TeamsCrud(db)
-    check = await teams_crud.check_team_name_in_db(team_data.name)
-    if check:
+    try:
+        db_team = await teams_crud.create_team(team_data, owner_id=user_request_data.id)
+    except TeamNameTaken:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail=f"Team with name='{team_data.name}' already created.")
-    db_team = await teams_crud.create_team(team_data, owner_id=user_request_data.id)
     await teams_crud.commit()
     await teams_crud.refresh(db_team)
     return db_team
@@ -47,16 +50,11 @@ async def create_team(team_data: Annotated[TeamCreate, Body()],
                     "description": "The team was not found."}
             })
 async def get_team(team_id: Annotated[int, Path()],
-                   db: Annotated[AsyncSession, Depends(get_db_session)],
+                   db: Annotated[AsyncSession, Depends(get_db_read_session)],
                    user_request_data: Annotated[UserRead, Depends(current_user)]):
     teams_crud = TeamsCrud(db)
-    team = await teams_crud.get_team_data(team_id)
-    if not team:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Team with id={team_id} not found.")
-    if user_request_data.is_superuser is False and team.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the team with id={team_id}")
+    with access_errors("team", team_id):
+        team = await teams_crud.get_accessible(team_id, user_request_data)
     return team
 
 
@@ -72,7 +70,7 @@ async def get_team(team_id: Annotated[int, Path()],
                     "description": "The team or user was not found."}
             })
 async def get_team(user_id: Annotated[int, Query()],
-                   db: Annotated[AsyncSession, Depends(get_db_session)],
+                   db: Annotated[AsyncSession, Depends(get_db_read_session)],
                    user_request_data: Annotated[UserRead, Depends(current_user)]):
     teams_crud = TeamsCrud(db)
     ans_user = await teams_crud.get_user_data(user_id)
@@ -100,13 +98,8 @@ async def delete_team(team_id: Annotated[int, Path()],
                       db: Annotated[AsyncSession, Depends(get_db_session)],
                       user_request_data: Annotated[UserRead, Depends(current_user)]):
     teams_crud = TeamsCrud(db)
-    team = await teams_crud.get_team_data(team_id)
-    if not team:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Team with id={team_id} not found.")
-    if user_request_data.is_superuser is False and team.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the team with id={team_id}")
+    with access_errors("team", team_id):
+        team = await teams_crud.get_accessible(team_id, user_request_data)
     await teams_crud.delete_team(team)
     await teams_crud.commit()
     return
@@ -121,22 +114,23 @@ async def delete_team(team_id: Annotated[int, Path()],
                   status.HTTP_403_FORBIDDEN: {
                       "description": "Access rights error."},
                   status.HTTP_404_NOT_FOUND: {
-                      "description": "The team was not found."}
+                      "description": "The team was not found."},
+                  status.HTTP_409_CONFLICT: {
+                      "description": "A team with an already created name."}
               })
 async def update_team(team_id: Annotated[int, Path()],
                       db: Annotated[AsyncSession, Depends(get_db_session)],
                       user_request_data: Annotated[UserRead, Depends(current_user)],
                       new_team_data: Annotated[TeamUpdate, Body()]):
     teams_crud = TeamsCrud(db)
-    team: TeamModel = await teams_crud.get_team_data(team_id)
-    if not team:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Team with id={team_id} not found.")
-    if user_request_data.is_superuser is False and team.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the team with id={team_id}")
+    with access_errors("team", team_id):
+        team: TeamModel = await teams_crud.get_accessible(team_id, user_request_data)
     update_data = new_team_data.dict(exclude_unset=True)
-    team = await teams_crud.update_team(team, update_data)
+    try:
+        team = await teams_crud.update_team(team, update_data)
+    except TeamNameTaken:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Team with name='{new_team_data.name}' already created.")
     await teams_crud.commit()
     return team
 
@@ -147,23 +141,24 @@ async def update_team(team_id: Annotated[int, Path()],
             responses={
                 status.HTTP_200_OK: {
                     "description": "Successful Response"},
+                status.HTTP_304_NOT_MODIFIED: {
+                    "description": "The users have not changed since the ETag in If-None-Match."},
                 status.HTTP_403_FORBIDDEN: {
                     "description": "Access rights error."},
                 status.HTTP_404_NOT_FOUND: {
                     "description": "The team was not found."}
             })
 async def get_team(team_id: Annotated[int, Path()],
-                   db: Annotated[AsyncSession, Depends(get_db_session)],
+                   request: Request,
+                   db: Annotated[AsyncSession, Depends(get_db_read_session)],
                    user_request_data: Annotated[UserRead, Depends(current_user)]):
     teams_crud = TeamsCrud(db)
-    team = await teams_crud.get_team_data(team_id)
-    if not team:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Team with id={team_id} not found.")
-    if user_request_data.is_superuser is False and team.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the team with id={team_id}")
-    return team.users
+
+    async def load():
+        return await teams_crud.get_owner_and_related(TeamModel.users, team_id, user_request_data)
+
+    return await cached_read(request, f"team_users:{team_id}", user_request_data, "team", team_id,
+                             list[UserRead], load, item_prefix="user")
 
 
 @router.post("/teams/{team_id}/users",
@@ -175,7 +170,7 @@ async def get_team(team_id: Annotated[int, Path()],
                  status.HTTP_403_FORBIDDEN: {
                      "description": "Access rights error."},
                  status.HTTP_404_NOT_FOUND: {
-                     "description": "The team was not found."},
+                     "description": "The team or user was not found."},
                  status.HTTP_409_CONFLICT: {
                      "description": "The user is already in the team."}
              })
@@ -184,21 +179,19 @@ async def add_user_to_team(team_id: Annotated[int, Path()],
                            db: Annotated[AsyncSession, Depends(get_db_session)],
                            user_request_data: Annotated[UserRead, Depends(current_user)]):
     teams_crud = TeamsCrud(db)
-    team: TeamModel = await teams_crud.get_team_data(team_id)
-    if not team:
+    with access_errors("team", team_id):
+        await teams_crud.get_accessible(team_id, user_request_data)
+    try:
+        await teams_crud.add_user_to_team(team_id, user_id)
+    except UserNotFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Team with id={team_id} not found.")
-    if user_request_data.is_superuser is False and team.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the team with id={team_id}")
-    for team_user in team.users:
-        if team_user.id == user_id:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
-                                detail=f"The user with ID={user_id} has already been "
-                                       f"added to the team with ID={team_id}")
-    await teams_crud.add_user_to_team(team, user_id)
+                            detail=f"User with id={user_id} not found.")
+    except TeamsUserAlreadyAdded:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"The user with ID={user_id} has already been "
+                                   f"added to the team with ID={team_id}")
     await teams_crud.commit()
-    return team.users
+    return await teams_crud.get_accessible_related(TeamModel.users, team_id, user_request_data)
 
 
 @router.delete("/teams/{team_id}/users/{user_id}",
@@ -217,15 +210,10 @@ async def remove_user_from_team(team_id: Annotated[int, Path()],
                                 db: Annotated[AsyncSession, Depends(get_db_session)],
                                 user_request_data: Annotated[UserRead, Depends(current_user)]):
     teams_crud = TeamsCrud(db)
-    team: TeamModel = await teams_crud.get_team_data(team_id)
-    if not team:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Team with id={team_id} not found.")
-    if user_request_data.is_superuser is False and team.owner_id != user_request_data.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail=f"You do not have access rights to the team with id={team_id}")
+    with access_errors("team", team_id):
+        await teams_crud.get_accessible(team_id, user_request_data)
     try:
-        await teams_crud.remove_user_from_team(team, user_id)
+        await teams_crud.remove_user_from_team(team_id, user_id)
     except TeamsUserNotFound:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"The user with ID={user_id} was not found in the team with ID={team_id}")
@@ -1,3 +1,15 @@
 
 class TeamsUserNotFound(Exception):
     pass
+
+
+class TeamsUserAlreadyAdded(Exception):
+    pass
+
+
+class UserNotFound(Exception):
+    pass
+
+
+class TeamNameTaken(Exception):
+    pass
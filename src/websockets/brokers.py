@@ -0,0 +1,356 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable
+from urllib.parse import urlparse
+import asyncpg
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+BrokerCallback = Callable[[str], Awaitable[None]]
+ReconnectCallback = Callable[[], None]
+
+# Паузы между попытками восстановить соединение подписки растут от минимальной до максимальной
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30
+# Как часто проверять соединение LISTEN, которое могло оборваться без закрытия сокета
+HEALTH_CHECK_SECONDS = 15
+# Сколько исходящих сообщений держать, пока соединение публикации восстанавливается
+PENDING_PUBLISH_LIMIT = 10000
+
+
+class BrokerError(Exception):
+    pass
+
+
+class BaseBroker:
+    """ Базовый брокер для рассылки сообщений между воркерами. """
+
+    def __init__(self):
+        self._subscribers: dict[str, list[BrokerCallback]] = {}
+        self._inbox: asyncio.Queue[tuple[str, str]] | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._outbox: deque[tuple[str, str]] = deque()
+        self._reconnect_listeners: list[ReconnectCallback] = []
+
+    def add_subscriber(self, channel: str, callback: BrokerCallback):
+        """ Регистрирует обработчик канала. Подписка выполняется при старте брокера. """
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def add_reconnect_listener(self, callback: ReconnectCallback):
+        """ Регистрирует обработчик восстановления подписки. Сообщения, разосланные во время обрыва,
+        потеряны, поэтому обработчик должен сбросить состояние, которое они обновляли. """
+        self._reconnect_listeners.append(callback)
+
+    def _reconnected(self):
+        for callback in self._reconnect_listeners:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Broker reconnect listener failed")
+
+    async def start(self):
+        self._inbox = asyncio.Queue()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    async def publish(self, channel: str, data: str):
+        raise NotImplementedError
+
+    def _hold(self, channel: str, data: str):
+        """ Откладывает исходящее сообщение до восстановления соединения.
+        При переполнении очереди отбрасываются самые старые сообщения. """
+        if len(self._outbox) >= PENDING_PUBLISH_LIMIT:
+            self._outbox.popleft()
+            logger.warning("Broker outbox is full, the oldest pending message was dropped")
+        self._outbox.append((channel, data))
+
+    def _receive(self, channel: str, data: str):
+        """ Ставит входящее сообщение в очередь, сохраняя порядок доставки. """
+        self._inbox.put_nowait((channel, data))
+
+    async def _dispatch_loop(self):
+        while True:
+            channel, data = await self._inbox.get()
+            await self._dispatch(channel, data)
+
+    async def _dispatch(self, channel: str, data: str):
+        for callback in self._subscribers.get(channel, []):
+            try:
+                await callback(data)
+            except Exception:
+                logger.exception("Broker subscriber of channel '%s' failed", channel)
+
+
+class MemoryBroker(BaseBroker):
+    """ Брокер в памяти процесса. Подходит для запуска с одним воркером. """
+
+    async def start(self):
+        pass
+
+    async def publish(self, channel: str, data: str):
+        await self._dispatch(channel, data)
+
+
+class PostgresBroker(BaseBroker):
+    """ Брокер поверх PostgreSQL LISTEN/NOTIFY.
+
+    Если соединение закрылось или не отвечает на проверку, оно открывается заново с нарастающей паузой
+    и подписки восстанавливаются. Публикации на время обрыва откладываются и отправляются после
+    восстановления; уведомления, отправленные другими воркерами во время обрыва, до воркера не доходят. """
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self._conn: asyncpg.Connection | None = None
+        self._lock = asyncio.Lock()
+        self._lost = asyncio.Event()
+        self._watcher: asyncio.Task | None = None
+
+    async def start(self):
+        await super().start()
+        await self._connect()
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        await super().stop()
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await conn.close()
+
+    async def _connect(self):
+        conn = await asyncpg.connect(self.dsn)
+        for channel in self._subscribers:
+            await conn.add_listener(channel, self._on_notify)
+        conn.add_termination_listener(self._on_termination)
+        self._conn = conn
+        self._lost.clear()
+
+    def _on_termination(self, connection: asyncpg.Connection):
+        if connection is self._conn:
+            self._lost.set()
+
+    async def _watch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), timeout=HEALTH_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                try:
+                    async with self._lock:
+                        await asyncio.wait_for(self._conn.execute("SELECT 1"), timeout=HEALTH_CHECK_SECONDS)
+                    continue
+                except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                    pass
+            logger.warning("PostgreSQL broker connection lost, reconnecting")
+            await self._reconnect()
+
+    async def _reconnect(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.terminate()
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                await self._connect()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as error:
+                logger.warning("PostgreSQL broker reconnect failed (%s), retrying in %.1f s", error, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            else:
+                logger.info("PostgreSQL broker reconnected")
+                self._reconnected()
+                async with self._lock:
+                    await self._flush_outbox()
+                return
+
+    async def _flush_outbox(self):
+        """ Отправляет отложенные публикации по порядку. Вызывается под self._lock. """
+        while self._outbox and self._conn is not None:
+            channel, data = self._outbox[0]
+            if not await self._notify(channel, data):
+                return
+            self._outbox.popleft()
+
+    async def _notify(self, channel: str, data: str) -> bool:
+        """ Отправляет NOTIFY. При обрыве соединения возвращает False и запускает переподключение,
+        сообщение, отклонённое сервером, отбрасывается. """
+        try:
+            await self._conn.execute("SELECT pg_notify($1, $2)", channel, data)
+        except (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError) as error:
+            logger.warning("PostgreSQL broker publish failed (%s), message is held until reconnect", error)
+            self._lost.set()
+            return False
+        except asyncpg.PostgresError:
+            logger.exception("PostgreSQL broker rejected a message of channel '%s', it is dropped", channel)
+        return True
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        self._receive(channel, payload)
+
+    async def publish(self, channel: str, data: str):
+        async with self._lock:
+            self._hold(channel, data)
+            await self._flush_outbox()
+
+
+def _encode_command(*args: str) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    """ Читает один ответ в формате RESP. """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Redis connection closed")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest
+    if prefix == b"-":
+        raise BrokerError(rest.decode())
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length == -1:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(rest)
+        if length == -1:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise BrokerError(f"Unexpected RESP reply: {line!r}")
+
+
+class RedisBroker(BaseBroker):
+    """ Брокер поверх Redis Pub/Sub. Работает с любым сервером, поддерживающим протокол RESP.
+
+    Оборванное соединение подписки открывается заново с нарастающей паузой, и подписка повторяется.
+    Публикации, которые не удалось отправить, откладываются и отправляются при следующей успешной
+    публикации или после восстановления подписки. Сообщения, опубликованные другими воркерами
+    во время обрыва, до воркера не доходят. """
+
+    def __init__(self, url: str):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self._pub: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._sub: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._listener: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def _open(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(_encode_command("AUTH", self.password))
+            await writer.drain()
+            await _read_reply(reader)
+        return reader, writer
+
+    async def _subscribe(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await self._open()
+        if self._subscribers:
+            writer.write(_encode_command("SUBSCRIBE", *self._subscribers))
+            await writer.drain()
+            for _ in self._subscribers:
+                await _read_reply(reader)
+        return reader, writer
+
+    async def start(self):
+        await super().start()
+        self._pub = await self._open()
+        self._sub = await self._subscribe()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        await super().stop()
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        for conn in (self._pub, self._sub):
+            if conn is not None:
+                conn[1].close()
+        self._pub = self._sub = None
+
+    async def _listen(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                if self._sub is None:
+                    self._sub = await self._subscribe()
+                    logger.info("Redis broker subscription restored")
+                    self._reconnected()
+                    delay = RECONNECT_MIN_DELAY
+                    async with self._lock:
+                        await self._flush_outbox()
+                reader, _ = self._sub
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and reply[0] == b"message":
+                        self._receive(reply[1].decode(), reply[2].decode())
+            except (OSError, asyncio.IncompleteReadError, BrokerError) as error:
+                logger.warning("Redis broker subscription lost (%s), reconnecting in %.1f s", error, delay)
+                if self._sub is not None:
+                    self._sub[1].close()
+                    self._sub = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def publish(self, channel: str, data: str):
+        async with self._lock:
+            self._hold(channel, data)
+            await self._flush_outbox()
+
+    async def _flush_outbox(self):
+        """ Отправляет отложенные публикации по порядку. Вызывается под self._lock. """
+        while self._outbox:
+            channel, data = self._outbox[0]
+            try:
+                if self._pub is None:
+                    self._pub = await self._open()
+                reader, writer = self._pub
+                writer.write(_encode_command("PUBLISH", channel, data))
+                await writer.drain()
+                await _read_reply(reader)
+            except (OSError, asyncio.IncompleteReadError) as error:
+                logger.warning("Redis broker publish failed (%s), message is held until reconnect", error)
+                if self._pub is not None:
+                    self._pub[1].close()
+                    self._pub = None
+                return
+            except BrokerError:
+                logger.exception("Redis broker rejected a message of channel '%s', it is dropped", channel)
+            self._outbox.popleft()
+
+
+def create_broker() -> BaseBroker:
+    """ Создаёт брокер в соответствии с настройкой WS_BROKER. """
+    if config.WS_BROKER == "memory":
+        return MemoryBroker()
+    if config.WS_BROKER == "postgres":
+        dsn = "postgresql://{user_name}:{user_password}@{host}:{port}/{db_name}".format(
+            user_name=config.POSTGRES_USERNAME,
+            user_password=config.POSTGRES_PASSWORD.get_secret_value(),
+            host=config.POSTGRES_HOST,
+            port=config.POSTGRES_PORT,
+            db_name=config.POSTGRES_DB_NAME
+        )
+        return PostgresBroker(dsn)
+    return RedisBroker(config.REDIS_URL)
+
+
+broker = create_broker()
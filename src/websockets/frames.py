@@ -0,0 +1,60 @@
+import json
+from typing import Any
+import msgpack
+from src.config import config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Подпротоколы полезной нагрузки в порядке предпочтения сервера. Без подпротокола используется JSON.
+# Сжатие permessage-deflate — расширение WebSocket, его согласует ASGI-сервер (uvicorn --ws-per-message-deflate).
+SUBPROTOCOLS = ("msgpack", "json")
+
+
+def encode_frame(payload: dict[str, Any]) -> str:
+    """ Сериализует кадр в компактный JSON.
+    Результат вычисляется один раз и переиспользуется для всех получателей. """
+    if orjson is not None and config.WS_JSON_ENCODER == "orjson":
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS).decode()
+    return json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_frame(data: str) -> dict[str, Any]:
+    if orjson is not None and config.WS_JSON_ENCODER == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def pack_frame(payload: dict[str, Any]) -> bytes:
+    return msgpack.packb(payload)
+
+
+def unpack_frame(data: bytes) -> dict[str, Any]:
+    return msgpack.unpackb(data)
+
+
+def select_subprotocol(offered: list[str]) -> str | None:
+    """ Выбирает первый из предложенных клиентом подпротоколов, который поддерживает сервер. """
+    for subprotocol in offered:
+        if subprotocol in SUBPROTOCOLS:
+            return subprotocol
+    return None
+
+
+class OutgoingFrame:
+    """ Кадр рассылки в JSON и, по требованию, в MessagePack.
+    Каждое представление вычисляется не больше одного раза, сколько бы ни было получателей. """
+    __slots__ = ("text", "_packed")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._packed: bytes | None = None
+
+    def encode(self, protocol: str) -> str | bytes:
+        if protocol != "msgpack":
+            return self.text
+        if self._packed is None:
+            self._packed = pack_frame(decode_frame(self.text))
+        return self._packed
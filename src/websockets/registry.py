@@ -0,0 +1,93 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Iterator
+from fastapi import WebSocket
+from src.config import config
+
+
+@dataclass(eq=False, slots=True)
+class Connection:
+    user_id: int
+    websocket: WebSocket
+    chat_id: int
+    team_id: int | None = None
+    game_id: int | None = None
+    protocol: str = "json"
+    queue: asyncio.Queue[str | bytes] = field(init=False)
+    writer: asyncio.Task | None = field(default=None, init=False)
+    dropped_frames: int = field(default=0, init=False)
+    last_seen: float = field(init=False)
+
+    def __post_init__(self):
+        self.queue = asyncio.Queue(maxsize=config.WS_SEND_QUEUE_SIZE)
+        self.last_seen = time.monotonic()
+
+
+class ConnectionRegistry:
+    """ Соединения, проиндексированные по чату, пользователю, команде и игре.
+
+    Каждый индекс — словарь ключ -> dict[Connection, None]: словарь работает как множество
+    с добавлением и удалением за O(1) и сохраняет порядок подключения для рассылки.
+    Пустые ключи удаляются, чтобы индексы не росли от переподключений. """
+
+    def __init__(self):
+        self._chats: dict[int, dict[Connection, None]] = {}
+        self._users: dict[int, dict[Connection, None]] = {}
+        self._teams: dict[int, dict[Connection, None]] = {}
+        self._games: dict[int, dict[Connection, None]] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Connection]:
+        for connections in self._chats.values():
+            yield from connections
+
+    def __contains__(self, conn: Connection) -> bool:
+        return conn in self._chats.get(conn.chat_id, ())
+
+    def add(self, conn: Connection):
+        if conn in self:
+            return
+        self._chats.setdefault(conn.chat_id, {})[conn] = None
+        self._users.setdefault(conn.user_id, {})[conn] = None
+        if conn.team_id is not None:
+            self._teams.setdefault(conn.team_id, {})[conn] = None
+        if conn.game_id is not None:
+            self._games.setdefault(conn.game_id, {})[conn] = None
+        self._size += 1
+
+    def remove(self, conn: Connection) -> bool:
+        """ Убирает соединение из всех индексов. Возвращает False, если его там уже не было. """
+        if conn not in self:
+            return False
+        self._discard(self._chats, conn.chat_id, conn)
+        self._discard(self._users, conn.user_id, conn)
+        self._discard(self._teams, conn.team_id, conn)
+        self._discard(self._games, conn.game_id, conn)
+        self._size -= 1
+        return True
+
+    # Методы выборки возвращают копию, чтобы рассылка не ломалась, если соединение закроется во время обхода.
+    def by_chat(self, chat_id: int) -> tuple[Connection, ...]:
+        return tuple(self._chats.get(chat_id, ()))
+
+    def by_user(self, user_id: int) -> tuple[Connection, ...]:
+        return tuple(self._users.get(user_id, ()))
+
+    def by_team(self, team_id: int) -> tuple[Connection, ...]:
+        return tuple(self._teams.get(team_id, ()))
+
+    def by_game(self, game_id: int) -> tuple[Connection, ...]:
+        return tuple(self._games.get(game_id, ()))
+
+    @staticmethod
+    def _discard(index: dict[int, dict[Connection, None]], key: int | None, conn: Connection):
+        connections = index.get(key)
+        if connections is None:
+            return
+        connections.pop(conn, None)
+        if not connections:
+            del index[key]
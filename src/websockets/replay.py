@@ -0,0 +1,55 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+
+@dataclass
+class Resume:
+    """ Данные для продолжения потока, присланные клиентом при переподключении. """
+    epoch: str
+    last_seq: int | None = None
+    last_game_seq: int | None = None
+
+
+class StreamLog:
+    """ Номер последнего кадра потока и кольцевой буфер последних кадров вместе с их отправителями. """
+
+    def __init__(self, size: int):
+        self.seq = 0
+        self.frames: deque[tuple[int, int | None, str]] = deque(maxlen=size)
+
+    def append(self, frame: str, sender_id: int | None = None):
+        self.frames.append((self.seq, sender_id, frame))
+
+    def since(self, last_seq: int, skip_sender: int | None = None) -> list[str] | None:
+        """ Кадры после last_seq, кроме отправленных skip_sender, или None,
+        если часть из них уже вытеснена из буфера. """
+        if last_seq > self.seq:
+            return None
+        if last_seq == self.seq:
+            return []
+        if not self.frames or self.frames[0][0] > last_seq + 1:
+            return None
+        return [frame for seq, sender_id, frame in self.frames
+                if seq > last_seq and (skip_sender is None or sender_id != skip_sender)]
+
+
+class ReplayLog:
+    """ Журналы потоков ("chat:1", "game:3") с вытеснением давно не использовавшихся. """
+
+    def __init__(self, max_streams: int, buffer_size: int):
+        self.max_streams = max_streams
+        self.buffer_size = buffer_size
+        self._streams: OrderedDict[str, StreamLog] = OrderedDict()
+
+    def get(self, key: str) -> StreamLog | None:
+        return self._streams.get(key)
+
+    def stream(self, key: str) -> StreamLog:
+        log = self._streams.get(key)
+        if log is None:
+            log = self._streams[key] = StreamLog(self.buffer_size)
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        else:
+            self._streams.move_to_end(key)
+        return log
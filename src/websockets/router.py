@@ -1,17 +1,29 @@
+import logging
 from typing import Annotated
-from fastapi import APIRouter, WebSocket, Depends, status, \
-    WebSocketException, WebSocketDisconnect
+from fastapi import APIRouter, Depends, WebSocket, status, WebSocketException, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from src.database.db import get_db_session
+from pydantic import ValidationError, parse_obj_as
+from src.database.db import AsyncSessionLocal
 from src.config import config
+from src.auth.auth import current_seperuser
 from src.auth.models import User as UserModel
+from src.auth.schemas import UserRead
 from src.chat.crud import ChatCrud
+from src.chat.models import Chat
+from src.chat.shemas import MessageCreate, MessageRead
+from src.chat.writer import message_writer
+from src.websockets.brokers import broker
+from src.websockets.frames import decode_frame, select_subprotocol, unpack_frame
+from src.websockets.replay import Resume
+from src.websockets.shemas import ChatFrame, PongFrame, TypingFrame
 from src.websockets.ws_manager import Connection, WSConnectionManager
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
-ws_chat_manager = WSConnectionManager()
-ws_events_manager = WSConnectionManager()
+ws_chat_manager = WSConnectionManager("ws_chat", broker)
+ws_events_manager = WSConnectionManager("ws_events", broker)
 
 
 async def get_user(token: str, db: AsyncSession) -> UserModel:
@@ -33,49 +45,150 @@ async def get_user(token: str, db: AsyncSession) -> UserModel:
         return user
 
 
+def parse_handshake(data: str | bytes) -> tuple[str, Resume | None]:
+    """ Первый кадр — токен либо объект {"token", "epoch", "last_seq", "last_game_seq"}
+    для продолжения потока после переподключения: JSON в текстовом кадре или MessagePack в бинарном. """
+    if isinstance(data, str) and not data.startswith("{"):
+        return data, None
+    try:
+        handshake = unpack_frame(data) if isinstance(data, bytes) else decode_frame(data)
+        if isinstance(handshake, str):
+            return handshake, None
+        last_seq, last_game_seq = handshake.get("last_seq"), handshake.get("last_game_seq")
+        resume = Resume(epoch=str(handshake.get("epoch", "")),
+                        last_seq=int(last_seq) if last_seq is not None else None,
+                        last_game_seq=int(last_game_seq) if last_game_seq is not None else None)
+        return str(handshake["token"]), resume
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid handshake")
+
+
+async def authenticate(websocket: WebSocket) -> tuple[UserModel, Chat, Resume | None] | None:
+    """ Проверяет токен пользователя и находит активный чат его команды.
+    Сессия БД открывается только на время рукопожатия и возвращается в пул до начала приёма сообщений. """
+    token, resume = parse_handshake(await receive_frame(websocket))
+    async with AsyncSessionLocal() as db:
+        user = await get_user(token, db)
+        if user is None or user.team is None:
+            return None
+        chat_crud = ChatCrud(db)
+        chat = await chat_crud.get_team_active_chat(user.team.id)
+    if chat is None:
+        return None
+    return user, chat, resume
+
+
+async def accept(websocket: WebSocket) -> str:
+    """ Принимает соединение с первым поддерживаемым подпротоколом из предложенных клиентом.
+    Возвращает формат кадров: json (по умолчанию) или msgpack. """
+    subprotocol = select_subprotocol(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    return subprotocol or "json"
+
+
+async def receive_frame(websocket: WebSocket) -> str | bytes:
+    """ Принимает текстовый или бинарный кадр. """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+    return message["text"] if message.get("text") is not None else message["bytes"]
+
+
+async def store_message(message: MessageCreate, user_id: int) -> MessageRead:
+    if config.CHAT_WRITE_BEHIND:
+        return await message_writer.submit(message, user_id=user_id)
+    async with AsyncSessionLocal() as db:
+        return await ChatCrud(db).save_message(message, user_id=user_id)
+
+
+async def receive_chat_frame(connection: Connection, data: str | bytes):
+    """ Обрабатывает входящий кадр /ws/chat от имени пользователя и чата, определённых при рукопожатии.
+    На сообщение и ответ приходит ack с сохранённым сообщением, на кадр с ошибкой — error.
+    Если сообщение не удалось сохранить, приходит error с id кадра, и клиент может повторить отправку. """
+    if data == "pong":
+        return
+    try:
+        frame = parse_obj_as(ChatFrame, unpack_frame(data) if isinstance(data, bytes) else decode_frame(data))
+    except ValidationError as error:
+        ws_chat_manager.send_direct(connection, {"type": "error", "detail": error.errors()})
+        return
+    except ValueError:
+        ws_chat_manager.send_direct(connection, {"type": "error", "detail": "Frame could not be decoded"})
+        return
+    if isinstance(frame, PongFrame):
+        return
+    if isinstance(frame, TypingFrame):
+        await ws_chat_manager.send_transient(connection.chat_id, {"type": "typing", "user_id": connection.user_id})
+        if frame.id is not None:
+            ws_chat_manager.send_direct(connection, {"type": "ack", "id": frame.id})
+        return
+    message = MessageCreate(chat_id=connection.chat_id, content_type=frame.content_type,
+                            text=frame.text, reply_to=getattr(frame, "reply_to", None))
+    try:
+        msg = await store_message(message, connection.user_id)
+    except Exception:
+        logger.exception("Message of user id=%d to chat id=%d was not saved", connection.user_id, connection.chat_id)
+        ws_chat_manager.send_direct(connection, {"type": "error", "id": frame.id,
+                                                 "detail": "Message could not be saved"})
+        return
+    await ws_chat_manager.send_message(msg)
+    ws_chat_manager.send_direct(connection, {"type": "ack", "id": frame.id, "message": msg.dict()})
+
+
 @router.websocket("/ws/chat")
-async def websocket_endpoint(websocket: WebSocket,
-                             db: Annotated[AsyncSession, Depends(get_db_session)]
-                             ):
-    """ Данный веб-сокет служит для  доставки сообщений пользователям. """
-
-    await websocket.accept()
-    token = await websocket.receive_text()
-    user = await get_user(token, db)
-    if user is None:
+async def ws_chat(websocket: WebSocket):
+    """ Данный веб-сокет служит для доставки сообщений пользователям и приёма сообщений от них. """
+
+    protocol = await accept(websocket)
+    auth = await authenticate(websocket)
+    if auth is None:
         await websocket.close(status.WS_1011_INTERNAL_ERROR, "authentication failed")
         return
 
-    chat_crud = ChatCrud(db)
-    chat = await chat_crud.get_team_active_chat(user.team.id)
-    connection = Connection(user_id=user.id, websocket=websocket)
-    await ws_chat_manager.connect(chat.id, connection)
+    user, chat, resume = auth
+    connection = Connection(user_id=user.id, websocket=websocket, chat_id=chat.id, team_id=chat.team_id,
+                            protocol=protocol)
+    await ws_chat_manager.connect(connection, resume)
     try:
         while True:
-            _ = await websocket.receive_text()
+            data = await receive_frame(websocket)
+            ws_chat_manager.touch(connection)
+            await receive_chat_frame(connection, data)
     except WebSocketDisconnect:
-        ws_chat_manager.disconnect(chat.id, connection)
+        pass
+    finally:
+        ws_chat_manager.disconnect(connection)
 
 
 @router.websocket("/ws/events")
-async def websocket_endpoint(websocket: WebSocket,
-                             db: Annotated[AsyncSession, Depends(get_db_session)]
-                             ):
+async def ws_events(websocket: WebSocket):
     """ Данный веб-сокет служит для доставки всех событий пользователям. Является главным. """
 
-    await websocket.accept()
-    token = await websocket.receive_text()
-    user = await get_user(token, db)
-    if user is None:
+    protocol = await accept(websocket)
+    auth = await authenticate(websocket)
+    if auth is None:
         await websocket.close(status.WS_1011_INTERNAL_ERROR, "authentication failed")
         return
 
-    chat_crud = ChatCrud(db)
-    chat = await chat_crud.get_team_active_chat(user.team.id)
-    connection = Connection(user_id=user.id, websocket=websocket)
-    await ws_events_manager.connect(chat.id, connection)
+    user, chat, resume = auth
+    connection = Connection(user_id=user.id, websocket=websocket, chat_id=chat.id,
+                            team_id=chat.team_id, game_id=chat.game_id, protocol=protocol)
+    await ws_events_manager.connect(connection, resume)
     try:
         while True:
-            _ = await websocket.receive_text()
+            await receive_frame(websocket)
+            ws_events_manager.touch(connection)
     except WebSocketDisconnect:
-        ws_events_manager.disconnect(chat.id, connection)
+        pass
+    finally:
+        ws_events_manager.disconnect(connection)
+
+
+@router.get("/ws/stats",
+            summary="Get WebSocket connection statistics",
+            responses={
+                status.HTTP_200_OK: {
+                    "description": "Successful Response"},
+            })
+async def get_ws_stats(user_request_data: Annotated[UserRead, Depends(current_seperuser)]):
+    return {"chat": ws_chat_manager.snapshot(), "events": ws_events_manager.snapshot()}
@@ -0,0 +1,30 @@
+from typing import Annotated, Literal, Union
+from pydantic import BaseModel, Field
+
+
+class InboundFrame(BaseModel):
+    # Идентификатор кадра на стороне клиента, возвращается в подтверждении.
+    id: int | str | None = None
+
+
+class SendMessageFrame(InboundFrame):
+    type: Literal["message"]
+    content_type: str = "text"
+    text: str = Field(min_length=1, max_length=512)
+
+
+class ReplyFrame(SendMessageFrame):
+    type: Literal["reply"]
+    reply_to: int
+
+
+class TypingFrame(InboundFrame):
+    type: Literal["typing"]
+
+
+class PongFrame(InboundFrame):
+    # Ответ на {"type": "ping"}; нужен только для отметки соединения живым.
+    type: Literal["pong"]
+
+
+ChatFrame = Annotated[Union[SendMessageFrame, ReplyFrame, TypingFrame, PongFrame], Field(discriminator="type")]
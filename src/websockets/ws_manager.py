@@ -1,30 +1,220 @@
-import json
-from fastapi import WebSocket
+import asyncio
+import secrets
+import time
+from fastapi import status
+from src.config import config
 from src.chat.shemas import MessageRead
-from dataclasses import dataclass
+from src.websockets.brokers import BaseBroker, MemoryBroker
+from src.websockets.frames import OutgoingFrame, encode_frame, decode_frame, pack_frame
+from src.websockets.registry import Connection, ConnectionRegistry
+from src.websockets.replay import ReplayLog, Resume
+from dataclasses import dataclass, asdict
 
 
 @dataclass
-class Connection:
-    user_id: int
-    websocket: WebSocket
+class WSStats:
+    sent_frames: int = 0
+    dropped_frames: int = 0
+    slow_consumer_disconnects: int = 0
+    reaped_connections: int = 0
 
 
 class WSConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[int, list[Connection]] = {}
+    """ Рассылка кадров подключённым клиентам.
 
-    async def connect(self, chat_id: int, conn: Connection):
-        if chat_id not in self.active_connections.keys():
-            self.active_connections[chat_id] = [conn]
-        else:
-            self.active_connections[chat_id].append(conn)
-        await conn.websocket.send_text("Connected")
+    Каждый кадр, пришедший из брокера, получает номер seq в своём потоке: чата ("chat_id" в кадре)
+    или игры (только "game_id"). Брокер доставляет кадры канала всем воркерам в одном порядке,
+    поэтому номера совпадают на воркерах, запущенных одновременно; перезапуск воркера меняет epoch.
+    Последние кадры потока хранятся в кольцевом буфере, и переподключившийся клиент с тем же epoch
+    получает только пропущенные кадры, а при слишком большом разрыве — кадр resync.
+    Адресные кадры пользователю ("to_user") и команде ("to_team"), а также кратковременные события чата
+    ("transient", например набор текста) не нумеруются и не повторяются.
+
+    Раз в WS_HEARTBEAT_INTERVAL секунд молчащим клиентам отправляется кадр ping. Любой входящий кадр,
+    в том числе ответ pong, отмечает соединение живым; соединения, молчавшие дольше WS_HEARTBEAT_TIMEOUT,
+    закрываются — так из рассылки уходят полуоткрытые TCP-соединения.
+
+    Брокер передаёт кадры в JSON; соединениям с подпротоколом msgpack кадр перекодируется
+    один раз на рассылку и отправляется бинарным. """
+
+    PING_FRAME = OutgoingFrame(encode_frame({"type": "ping"}))
+
+    def __init__(self, channel: str = "ws", broker: BaseBroker | None = None):
+        self.connections = ConnectionRegistry()
+        self.channel = channel
+        self.broker = broker if broker is not None else MemoryBroker()
+        self.broker.add_subscriber(channel, self._on_broker_message)
+        self.stats = WSStats()
+        self.epoch = secrets.token_hex(4)
+        self.replay = ReplayLog(config.WS_REPLAY_MAX_STREAMS, config.WS_REPLAY_BUFFER_SIZE)
+        self._closing: set[asyncio.Task] = set()
+        self._heartbeat: asyncio.Task | None = None
+
+    async def start(self):
+        if config.WS_HEARTBEAT_INTERVAL > 0:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
 
-    def disconnect(self, chat_id: int, conn: Connection):
-        self.active_connections[chat_id].remove(conn)
+    async def connect(self, conn: Connection, resume: Resume | None = None):
+        self.connections.add(conn)
+        conn.writer = asyncio.create_task(self._write_loop(conn))
+        if resume is None:
+            if conn.protocol == "json":
+                self._enqueue(conn, "Connected")
+                return
+            resume = Resume(epoch="")
+        chat_log = self.replay.stream(f"chat:{conn.chat_id}")
+        greeting = {"type": "connected", "epoch": self.epoch, "seq": chat_log.seq}
+        streams = [("chat", chat_log, resume.last_seq)]
+        if conn.game_id is not None:
+            game_log = self.replay.stream(f"game:{conn.game_id}")
+            greeting["game_seq"] = game_log.seq
+            streams.append(("game", game_log, resume.last_game_seq))
+        self.send_direct(conn, greeting)
+        for stream, log, last_seq in streams:
+            if last_seq is None:
+                continue
+            # Как и при живой рассылке, собственные сообщения клиенту не повторяются;
+            # seq в приветствии всё равно сдвигает его last_seq за них.
+            missed = log.since(last_seq, skip_sender=conn.user_id) if resume.epoch == self.epoch else None
+            if missed is None:
+                self.send_direct(conn, {"type": "resync", "stream": stream})
+                continue
+            for frame in missed:
+                self._enqueue(conn, OutgoingFrame(frame).encode(conn.protocol))
+
+    def disconnect(self, conn: Connection):
+        """ Убирает соединение из рассылки. Повторный вызов для того же соединения ничего не делает. """
+        self.connections.remove(conn)
+        if conn.writer is not None:
+            conn.writer.cancel()
+            conn.writer = None
+
+    @staticmethod
+    def touch(conn: Connection):
+        """ Отмечает, что от клиента пришёл кадр. """
+        conn.last_seen = time.monotonic()
+
+    def heartbeat(self, now: float) -> int:
+        """ Закрывает соединения, молчавшие дольше WS_HEARTBEAT_TIMEOUT, а молчащим дольше интервала
+        отправляет ping. Возвращает число закрытых соединений. """
+        reaped = 0
+        for conn in list(self.connections):
+            idle = now - conn.last_seen
+            if idle > config.WS_HEARTBEAT_TIMEOUT:
+                self._close(conn, status.WS_1001_GOING_AWAY, "heartbeat timeout")
+                reaped += 1
+            elif idle >= config.WS_HEARTBEAT_INTERVAL:
+                # Ping не должен вытеснять данные: переполненной очередью займётся политика медленных клиентов.
+                if not conn.queue.full():
+                    conn.queue.put_nowait(self.PING_FRAME.encode(conn.protocol))
+        self.stats.reaped_connections += reaped
+        return reaped
+
+    def snapshot(self) -> dict:
+        """ Возвращает счётчики рассылки и число живых соединений. """
+        result = asdict(self.stats)
+        result["live_connections"] = len(self.connections)
+        return result
 
     async def send_message(self, message: MessageRead):
-        for chat_member_conn in self.active_connections[message.chat_id]:
-            if chat_member_conn.user_id != message.user_id:
-                await chat_member_conn.websocket.send_text(json.dumps(message.dict(), indent=4, sort_keys=True))
+        """ Публикует сообщение через брокер, чтобы его получили участники чата на всех воркерах.
+        Сообщение сериализуется один раз, и этот же кадр уходит каждому получателю. """
+        await self.broker.publish(self.channel, encode_frame(message.dict()))
+
+    async def send_event(self, chat_id: int, event: dict):
+        """ Публикует событие для всех участников чата на всех воркерах. """
+        await self.broker.publish(self.channel, encode_frame({"chat_id": chat_id, **event}))
+
+    async def send_game_event(self, game_id: int, event: dict):
+        """ Публикует событие для всех участников игры на всех воркерах. """
+        await self.broker.publish(self.channel, encode_frame({"game_id": game_id, **event}))
+
+    async def send_transient(self, chat_id: int, event: dict):
+        """ Публикует событие чата, которое не сохраняется для повторной отправки после переподключения. """
+        await self.broker.publish(self.channel, encode_frame({"chat_id": chat_id, "transient": True, **event}))
+
+    def send_direct(self, conn: Connection, event: dict):
+        """ Отправляет кадр одному соединению этого воркера, минуя брокер. """
+        self._enqueue(conn, pack_frame(event) if conn.protocol == "msgpack" else encode_frame(event))
+
+    async def send_to_user(self, user_id: int, event: dict):
+        """ Публикует событие для всех соединений пользователя на всех воркерах. """
+        await self.broker.publish(self.channel, encode_frame({"to_user": user_id, **event}))
+
+    async def send_to_team(self, team_id: int, event: dict):
+        """ Публикует событие для всех соединений участников команды на всех воркерах. """
+        await self.broker.publish(self.channel, encode_frame({"to_team": team_id, **event}))
+
+    async def _on_broker_message(self, frame: str):
+        message = decode_frame(frame)
+        if "to_user" in message:
+            recipients = self.connections.by_user(message["to_user"])
+        elif "to_team" in message:
+            recipients = self.connections.by_team(message["to_team"])
+        elif "chat_id" in message:
+            sender_id = message.get("user_id")
+            if not message.get("transient"):
+                frame = self._sequence(f"chat:{message['chat_id']}", message, sender_id)
+            recipients = [chat_member_conn for chat_member_conn in self.connections.by_chat(message["chat_id"])
+                          if chat_member_conn.user_id != sender_id]
+        else:
+            frame = self._sequence(f"game:{message['game_id']}", message)
+            recipients = self.connections.by_game(message["game_id"])
+        outgoing = OutgoingFrame(frame)
+        for conn in recipients:
+            self._enqueue(conn, outgoing.encode(conn.protocol))
+        # Отдаём управление писателям, чтобы пачка сообщений из брокера не переполняла очереди.
+        await asyncio.sleep(0)
+
+    def _sequence(self, stream: str, message: dict, sender_id: int | None = None) -> str:
+        """ Присваивает кадру следующий номер потока и сохраняет его в буфер для повторной отправки. """
+        log = self.replay.stream(stream)
+        log.seq += 1
+        frame = encode_frame({**message, "seq": log.seq})
+        log.append(frame, sender_id)
+        return frame
+
+    def _enqueue(self, conn: Connection, frame: str | bytes):
+        """ Ставит кадр в очередь соединения, не дожидаясь отправки.
+        Медленный клиент теряет кадры, а после WS_MAX_DROPPED_FRAMES потерь подряд отключается. """
+        try:
+            conn.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.stats.dropped_frames += 1
+            conn.dropped_frames += 1
+            if config.WS_SLOW_CONSUMER_POLICY == "disconnect" \
+                    or conn.dropped_frames >= config.WS_MAX_DROPPED_FRAMES:
+                self.stats.slow_consumer_disconnects += 1
+                self._close(conn, status.WS_1013_TRY_AGAIN_LATER, "slow consumer")
+        else:
+            conn.dropped_frames = 0
+
+    def _close(self, conn: Connection, code: int, reason: str):
+        """ Убирает соединение из рассылки и закрывает сокет в фоне, не дожидаясь ответа клиента. """
+        self.disconnect(conn)
+        task = asyncio.create_task(conn.websocket.close(code, reason))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _write_loop(self, conn: Connection):
+        while True:
+            frame = await conn.queue.get()
+            try:
+                if isinstance(frame, bytes):
+                    await conn.websocket.send_bytes(frame)
+                else:
+                    await conn.websocket.send_text(frame)
+            except Exception:
+                self.disconnect(conn)
+                return
+            self.stats.sent_frames += 1
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(config.WS_HEARTBEAT_INTERVAL)
+            self.heartbeat(time.monotonic())
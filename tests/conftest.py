@@ -1,9 +1,14 @@
 import asyncio
-from typing import AsyncGenerator
+import functools
+from typing import AsyncGenerator, Awaitable, Callable
 import pytest
+from fastapi_users.jwt import generate_jwt
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from src.database import Base, get_db_session
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from src.auth.models import User
+from src.database.query_stats import QueryStats, attach_query_stats, track_queries
+from src.database.db import Base, get_db_session, get_engine_options
+from src.database.routing import get_db_read_session
 from src.config import config
 from src.main import app
 
@@ -14,8 +19,9 @@ SQLALCHEMY_DATABASE_URL = "postgresql+asyncpg://{user_name}:{user_password}@{hos
     port=config.POSTGRES_PORT,
     db_name=config.POSTGRES_DB_NAME_TEST
 )
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, **get_engine_options("test"))
 AsyncSessionLocal = async_sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+attach_query_stats(engine.sync_engine)
 
 
 async def override_get_db():
@@ -24,6 +30,7 @@ async def override_get_db():
 
 
 app.dependency_overrides[get_db_session] = override_get_db
+app.dependency_overrides[get_db_read_session] = override_get_db
 
 
 @pytest.fixture(autouse=True, scope="session")
@@ -46,3 +53,59 @@ def event_loop(request):
 async def ac() -> AsyncGenerator[AsyncClient, None]:
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
+
+
+def auth_headers(user_id: int) -> dict[str, str]:
+    token = generate_jwt({"sub": str(user_id), "aud": "fastapi-users:auth"},
+                         config.SECURITY_KEY.get_secret_value(), 3600)
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def make_user() -> Callable[[AsyncSession, str], Awaitable[tuple[User, dict[str, str]]]]:
+    """ Фабрика пользователей без регистрации через API: добавляет пользователя с почтой <name>@example.com
+    в сессию и возвращает его вместе с заголовками авторизации. Фиксирует изменения вызывающий. """
+
+    async def make(session: AsyncSession, name: str) -> tuple[User, dict[str, str]]:
+        user = User(name=name, surname=name, patronymic=name, email=f"{name}@example.com",
+                    phone_number="89044464811", hashed_password="-")
+        session.add(user)
+        await session.flush()
+        return user, auth_headers(user.id)
+
+    return make
+
+
+class query_budget:
+    """ Ограничивает число SQL-запросов блока или теста; при превышении тест падает со списком запросов.
+
+        with query_budget(3) as stats:
+            ...
+
+        @query_budget(5)
+        async def test_...(ac: AsyncClient):
+            ...
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+
+    def __enter__(self) -> QueryStats:
+        self._tracker = track_queries()
+        self.stats = self._tracker.__enter__()
+        return self.stats
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._tracker.__exit__(exc_type, exc, traceback)
+        if exc_type is None and self.stats.count > self.limit:
+            statements = "\n".join(f"  {number}. {statement}"
+                                   for number, statement in enumerate(self.stats.statements, start=1))
+            raise AssertionError(f"Query budget exceeded: {self.stats.count} > {self.limit}\n{statements}")
+
+    def __call__(self, test):
+        @functools.wraps(test)
+        async def wrapper(*args, **kwargs):
+            with query_budget(self.limit):
+                return await test(*args, **kwargs)
+
+        return wrapper
@@ -0,0 +1,129 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from conftest import AsyncClient, AsyncSessionLocal, auth_headers
+from src.answers.engine import answer_engine, normalize_answer
+from src.answers.leaderboard import Leaderboard
+from src.auth.models import User
+from src.database.association_tables import AT_GamesTasks, AT_GamesTeams
+from src.games.models import Game
+from src.tasks.models import Task
+from src.teams.models import Team
+from src.websockets.brokers import BrokerError
+
+
+@pytest.mark.parametrize("submitted", [
+    "Ёлка у фонтана",
+    "  елка,   У ФОНТАНА! ",
+    "ёлка-у-фонтана",
+])
+def test_answers_are_normalized(submitted: str):
+    assert normalize_answer(submitted) == normalize_answer("елка у фонтана")
+
+
+def test_different_answers_do_not_match():
+    assert normalize_answer("12ДР34") != normalize_answer("12ДР35")
+
+
+def test_leaderboard_ranks_follow_score_and_arrival():
+    leaderboard = Leaderboard([(1, 0), (2, 0), (3, 1)], max_score=3)
+    assert [leaderboard.rank(team_id) for team_id in (3, 1, 2)] == [1, 2, 3]
+    assert leaderboard.set_score(2, 1) == (3, 2)
+    assert leaderboard.set_score(1, 2) == (3, 1)
+    assert leaderboard.standings() == [(1, 1, 2), (2, 3, 1), (3, 2, 1)]
+
+
+async def create_player(session, make_user, name: str) -> tuple[User, Team]:
+    user, _ = await make_user(session, f"{name}_answers")
+    team = Team(name=f"{name}_answers_team", owner_id=None, users=[user])
+    session.add(team)
+    await session.flush()
+    return user, team
+
+
+@pytest.fixture(scope="module")
+async def games(make_user) -> dict[str, int]:
+    """ Две идущие игры с одним заданием и командой игрока, ещё не начавшаяся игра,
+    посторонний пользователь и команда, которая пока не играет. """
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        player, team = await create_player(session, make_user, "player")
+        stranger, _ = await create_player(session, make_user, "stranger")
+        latecomer, late_team = await create_player(session, make_user, "latecomer")
+        task = Task(owner_id=player.id, level=1, mystery_of_place="m", place="p", answer="Ёлка у фонтана")
+        running = Game(name="answers_running", legend="l", owner_id=player.id,
+                       datetime_start=now - timedelta(hours=1), datetime_end=now + timedelta(hours=1))
+        quiet = Game(name="answers_quiet", legend="l", owner_id=player.id,
+                     datetime_start=now - timedelta(hours=1), datetime_end=now + timedelta(hours=1))
+        upcoming = Game(name="answers_upcoming", legend="l", owner_id=player.id,
+                        datetime_start=now + timedelta(days=1), datetime_end=now + timedelta(days=1, hours=1))
+        session.add_all([task, running, quiet, upcoming])
+        await session.flush()
+        for game in (running, quiet, upcoming):
+            await session.execute(insert(AT_GamesTasks).values(game_id=game.id, task_id=task.id))
+            await session.execute(insert(AT_GamesTeams).values(game_id=game.id, team_id=team.id))
+        await session.commit()
+        return {"player": player.id, "stranger": stranger.id, "latecomer": latecomer.id,
+                "late_team": late_team.id, "task": task.id, "running": running.id, "quiet": quiet.id,
+                "upcoming": upcoming.id}
+
+
+@pytest.fixture(autouse=True)
+def engine_session(monkeypatch):
+    monkeypatch.setattr(answer_engine, "session_factory", AsyncSessionLocal)
+
+
+async def submit(ac: AsyncClient, games: dict[str, int], user: str, answer: str, game: str = "running"):
+    return await ac.post(url=f"/games/{games[game]}/answers", headers=auth_headers(games[user]),
+                         json={"task_id": games["task"], "answer": answer})
+
+
+async def test_wrong_correct_and_repeated_answers(ac: AsyncClient, games: dict[str, int]):
+    response = await submit(ac, games, "player", "ёлка у памятника")
+    assert response.status_code == 200
+    assert response.json() == {"task_id": games["task"], "correct": False, "already_solved": False}
+    response = await submit(ac, games, "player", "  ЕЛКА, у фонтана! ")
+    assert response.json() == {"task_id": games["task"], "correct": True, "already_solved": False}
+    response = await submit(ac, games, "player", "ёлка у фонтана")
+    assert response.json() == {"task_id": games["task"], "correct": True, "already_solved": True}
+    response = await ac.get(url=f"/games/{games['running']}/leaderboard", headers=auth_headers(games["player"]))
+    assert [(row["rank"], row["score"]) for row in response.json()] == [(1, 1)]
+
+
+async def test_answer_from_outside_the_game_is_forbidden(ac: AsyncClient, games: dict[str, int]):
+    response = await submit(ac, games, "stranger", "ёлка у фонтана")
+    assert response.status_code == 403
+
+
+async def test_answer_to_missing_game_keeps_no_state(ac: AsyncClient, games: dict[str, int]):
+    response = await ac.post(url="/games/987654/answers", headers=auth_headers(games["player"]),
+                             json={"task_id": games["task"], "answer": "ёлка у фонтана"})
+    assert response.status_code == 404
+    assert 987654 not in answer_engine._locks
+
+
+async def test_correct_answer_is_counted_when_broker_fails(ac: AsyncClient, games: dict[str, int], monkeypatch):
+    async def publish(channel: str, data: str):
+        raise BrokerError("broker is down")
+
+    monkeypatch.setattr(answer_engine.broker, "publish", publish)
+    response = await submit(ac, games, "player", "ёлка у фонтана", game="quiet")
+    assert response.status_code == 200
+    assert response.json() == {"task_id": games["task"], "correct": True, "already_solved": False}
+    response = await submit(ac, games, "player", "ёлка у фонтана", game="quiet")
+    assert response.json()["already_solved"] is True
+
+
+async def test_answer_to_game_that_is_not_running(ac: AsyncClient, games: dict[str, int]):
+    response = await submit(ac, games, "player", "ёлка у фонтана", game="upcoming")
+    assert response.status_code == 409
+
+
+async def test_team_added_during_the_game_can_answer(ac: AsyncClient, games: dict[str, int]):
+    await submit(ac, games, "player", "ёлка у фонтана")
+    response = await ac.post(url=f"/games/{games['running']}/teams", headers=auth_headers(games["player"]),
+                             params={"team_id": games["late_team"]})
+    assert response.status_code == 200
+    response = await submit(ac, games, "latecomer", "ёлка у фонтана")
+    assert response.status_code == 200
+    assert response.json()["correct"] is True
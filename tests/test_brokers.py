@@ -0,0 +1,146 @@
+import asyncio
+from src.websockets import brokers
+from src.websockets.brokers import MemoryBroker, PostgresBroker, RedisBroker, _read_reply, _encode_command
+
+
+async def start_resp_stand_in() -> asyncio.Server:
+    """ Минимальный сервер с поддержкой SUBSCRIBE/PUBLISH протокола Redis. """
+    subscribers: dict[bytes, list[asyncio.StreamWriter]] = {}
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            try:
+                command = await _read_reply(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                for receivers in subscribers.values():
+                    if writer in receivers:
+                        receivers.remove(writer)
+                return
+            name = command[0].upper()
+            if name == b"SUBSCRIBE":
+                for number, channel in enumerate(command[1:], start=1):
+                    subscribers.setdefault(channel, []).append(writer)
+                    writer.write(b"*3\r\n$9\r\nsubscribe\r\n$%d\r\n%s\r\n:%d\r\n" % (len(channel), channel, number))
+            elif name == b"PUBLISH":
+                channel, data = command[1], command[2]
+                receivers = subscribers.get(channel, [])
+                for receiver in receivers:
+                    receiver.write(_encode_command("message", channel.decode(), data.decode()))
+                writer.write(b":%d\r\n" % len(receivers))
+            await writer.drain()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    server.subscribers = subscribers
+    return server
+
+
+async def test_memory_broker():
+    received = []
+
+    async def callback(data: str):
+        received.append(data)
+
+    broker = MemoryBroker()
+    broker.add_subscriber("ws_chat", callback)
+    await broker.start()
+    await broker.publish("ws_chat", "hello")
+    await broker.publish("ws_events", "ignored")
+    await broker.stop()
+    assert received == ["hello"]
+
+
+async def test_redis_broker_fan_out():
+    server = await start_resp_stand_in()
+    port = server.sockets[0].getsockname()[1]
+    received_first, received_second = [], []
+
+    async def callback_first(data: str):
+        received_first.append(data)
+
+    async def callback_second(data: str):
+        received_second.append(data)
+
+    first_worker = RedisBroker(f"redis://127.0.0.1:{port}/0")
+    second_worker = RedisBroker(f"redis://127.0.0.1:{port}/0")
+    first_worker.add_subscriber("ws_chat", callback_first)
+    second_worker.add_subscriber("ws_chat", callback_second)
+    await first_worker.start()
+    await second_worker.start()
+
+    await first_worker.publish("ws_chat", '{"chat_id": 1}')
+    for _ in range(100):
+        if received_first and received_second:
+            break
+        await asyncio.sleep(0.01)
+
+    await first_worker.stop()
+    await second_worker.stop()
+    server.close()
+    assert received_first == ['{"chat_id": 1}']
+    assert received_second == ['{"chat_id": 1}']
+
+
+async def test_redis_broker_resubscribes_after_connection_loss(monkeypatch):
+    monkeypatch.setattr(brokers, "RECONNECT_MIN_DELAY", 0.01)
+    server = await start_resp_stand_in()
+    port = server.sockets[0].getsockname()[1]
+    received = []
+
+    async def callback(data: str):
+        received.append(data)
+
+    worker = RedisBroker(f"redis://127.0.0.1:{port}/0")
+    worker.add_subscriber("ws_chat", callback)
+    await worker.start()
+
+    dropped = list(server.subscribers[b"ws_chat"])
+    for writer in dropped:
+        writer.close()
+    for _ in range(100):
+        if any(writer not in dropped for writer in server.subscribers[b"ws_chat"]):
+            break
+        await asyncio.sleep(0.01)
+
+    await worker.publish("ws_chat", '{"chat_id": 2}')
+    for _ in range(100):
+        if received:
+            break
+        await asyncio.sleep(0.01)
+
+    await worker.stop()
+    server.close()
+    assert received == ['{"chat_id": 2}']
+
+
+class RecordingConnection:
+    """ Соединение asyncpg, которое запоминает отправленные уведомления. """
+
+    def __init__(self):
+        self.notified = []
+
+    async def add_listener(self, channel, callback):
+        pass
+
+    def add_termination_listener(self, callback):
+        pass
+
+    async def execute(self, query: str, *args):
+        self.notified.append(args)
+
+
+async def test_postgres_broker_holds_publishes_until_reconnect(monkeypatch):
+    conn = RecordingConnection()
+
+    async def connect(dsn: str):
+        return conn
+
+    monkeypatch.setattr(brokers.asyncpg, "connect", connect)
+    worker = PostgresBroker("postgresql://broker")
+    assert worker._conn is None
+    await worker.publish("ws_chat", "first")
+    await worker.publish("entity_versions", "game:1")
+    assert conn.notified == []
+
+    await worker._reconnect()
+    await worker.publish("ws_chat", "second")
+    assert conn.notified == [("ws_chat", "first"), ("entity_versions", "game:1"), ("ws_chat", "second")]
@@ -0,0 +1,34 @@
+from pydantic import SecretStr
+from conftest import AsyncClient
+from src.config import config
+from src.metrics.collectors import Histogram
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "/games/{game_id}")
+    assert list(histogram.samples()) == [
+        'latency_seconds_bucket{route="/games/{game_id}",le="0.1"} 2',
+        'latency_seconds_bucket{route="/games/{game_id}",le="1.0"} 3',
+        'latency_seconds_bucket{route="/games/{game_id}",le="+Inf"} 4',
+        'latency_seconds_sum{route="/games/{game_id}"} 3.65',
+        'latency_seconds_count{route="/games/{game_id}"} 4',
+    ]
+
+
+async def test_metrics_endpoint(ac: AsyncClient, monkeypatch):
+    monkeypatch.setattr(config, "METRICS_TOKEN", None)
+    assert (await ac.get("/metrics")).status_code == 404
+
+    monkeypatch.setattr(config, "METRICS_TOKEN", SecretStr("metrics-token"))
+    assert (await ac.get("/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 401
+    await ac.get("/games/123456")
+    await ac.get("/no/such/route")
+    response = await ac.get("/metrics", headers={"Authorization": "Bearer metrics-token"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="GET",route="/games/{game_id}",status="401"}' in response.text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in response.text
+    assert "/games/123456" not in response.text
+    assert 'ws_connections{manager="chat"}' in response.text
@@ -0,0 +1,101 @@
+import pytest
+from datetime import datetime, timedelta
+from conftest import AsyncClient, AsyncSessionLocal
+from src.database.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from src.games.models import Game
+from src.tasks.models import Task
+
+
+@pytest.fixture(scope="module")
+async def owner(make_user) -> dict:
+    """ Пользователь с пятью играми, две из которых начинаются одновременно, и тремя загадками. """
+    start = datetime(2030, 1, 1, 12, 0)
+    async with AsyncSessionLocal() as session:
+        user, headers = await make_user(session, "pager")
+        starts = [start, start + timedelta(hours=1), start + timedelta(hours=1), start + timedelta(hours=2),
+                  start + timedelta(hours=3)]
+        games = [Game(name=f"pager_{number}", legend="l", owner_id=user.id,
+                      datetime_start=datetime_start, datetime_end=datetime_start + timedelta(hours=1))
+                 for number, datetime_start in enumerate(starts)]
+        tasks = [Task(owner_id=user.id, level=1, mystery_of_place="m", place="p", answer=str(number))
+                 for number in range(3)]
+        session.add_all(games + tasks)
+        await session.commit()
+        return {"id": user.id, "headers": headers,
+                "games": sorted(games, key=lambda game: (game.datetime_start, game.id)),
+                "tasks": [task.id for task in tasks]}
+
+
+async def read_pages(ac: AsyncClient, owner: dict, url: str, **params) -> list[list[int]]:
+    """ Проходит по всем страницам списка, следуя заголовку X-Next-Cursor. """
+    pages, cursor = [], None
+    while True:
+        query = {"user_id": owner["id"], **params}
+        if cursor is not None:
+            query["cursor"] = cursor
+        response = await ac.get(url=url, params=query, headers=owner["headers"])
+        assert response.status_code == 200
+        pages.append([item["id"] for item in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+async def test_games_are_paged_through(ac: AsyncClient, owner: dict, order: str):
+    ids = [game.id for game in owner["games"]]
+    if order == "desc":
+        ids.reverse()
+    pages = await read_pages(ac, owner, "/games", limit=2, order=order)
+    assert pages == [ids[0:2], ids[2:4], ids[4:]]
+
+
+async def test_page_boundary_between_games_with_same_start(ac: AsyncClient, owner: dict):
+    # Граница первой страницы проходит между играми с одинаковой датой начала: порядок решает id.
+    ids = [game.id for game in owner["games"]]
+    pages = await read_pages(ac, owner, "/games", limit=2)
+    assert pages[0][-1] == ids[1] and pages[1][0] == ids[2]
+
+
+async def test_cursor_of_last_full_page_returns_empty_page(ac: AsyncClient, owner: dict):
+    last = owner["games"][-1]
+    response = await ac.get(url="/games", headers=owner["headers"],
+                            params={"user_id": owner["id"], "limit": 5})
+    assert response.headers[NEXT_CURSOR_HEADER] == encode_cursor(last.datetime_start, last.id)
+    response = await ac.get(url="/games", headers=owner["headers"],
+                            params={"user_id": owner["id"], "limit": 5,
+                                    "cursor": response.headers[NEXT_CURSOR_HEADER]})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+async def test_tasks_are_paged_through(ac: AsyncClient, owner: dict):
+    pages = await read_pages(ac, owner, "/tasks", limit=2)
+    assert pages == [owner["tasks"][0:2], owner["tasks"][2:]]
+
+
+async def test_empty_date_window_of_available_games(ac: AsyncClient, make_user):
+    async with AsyncSessionLocal() as session:
+        admin, headers = await make_user(session, "pager_admin")
+        admin.is_superuser = True
+        await session.commit()
+    response = await ac.get(url="/games/available", headers=headers,
+                            params={"date_from": "2099-01-01T00:00:00", "date_to": "2099-01-02T00:00:00"})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+@pytest.mark.parametrize("url, cursor", [
+    ("/games", "not a cursor"),
+    ("/games", encode_cursor("2030-01-01T12:00:00")),
+    ("/games", encode_cursor("tomorrow", 1)),
+    ("/games", encode_cursor({"id": 1})),
+    ("/tasks", "not a cursor"),
+    ("/tasks", encode_cursor("first")),
+])
+async def test_invalid_cursor_is_rejected(ac: AsyncClient, owner: dict, url: str, cursor: str):
+    response = await ac.get(url=url, headers=owner["headers"], params={"user_id": owner["id"], "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor."}
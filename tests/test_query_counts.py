@@ -0,0 +1,249 @@
+import pytest
+from sqlalchemy import update
+from conftest import AsyncClient, AsyncSessionLocal, query_budget
+from src.database import versions
+from src.database.query_stats import QUERY_COUNT_HEADER, QueryStatsMiddleware, track_queries
+from src.main import app
+from src.database.response_cache import response_cache
+from src.games.models import Game
+from src.websockets.brokers import BrokerError
+
+ids: dict[str, int] = {}
+tokens: dict[str, str] = {}
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """ Считаем запросы обработчиков, а не попадания в кэш ответов. """
+    response_cache.clear()
+
+
+async def register(ac: AsyncClient, email: str) -> str:
+    response = await ac.post(
+        url="/auth/register",
+        json={"email": email,
+              "password": "12345678",
+              "name": "string",
+              "surname": "string",
+              "patronymic": "string",
+              "phone_number": "89044464811"
+              }
+    )
+    assert response.status_code == 201
+    response = await ac.post(
+        url="/auth/jwt/login",
+        headers={"accept": "application/json",
+                 "Content-Type": "application/x-www-form-urlencoded"},
+        data={"username": email, "password": "12345678"}
+    )
+    token = response.json()["access_token"]
+    # Прогреваем кэш пользователей, чтобы считать только запросы самих обработчиков.
+    await ac.get(url="/users/me", headers={"Authorization": f"Bearer {token}"})
+    return token
+
+
+async def test_prepare_entities(ac: AsyncClient):
+    tokens["owner"] = await register(ac, "owner@example.com")
+    tokens["stranger"] = await register(ac, "stranger@example.com")
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    response = await ac.post(url="/games", headers=headers,
+                             json={"name": "game", "legend": "legend",
+                                   "datetime_start": "2030-01-01T20:00:00+00:00",
+                                   "datetime_end": "2030-01-02T04:00:00+00:00"})
+    ids["game_id"] = response.json()["id"]
+    response = await ac.post(url="/tasks", headers=headers,
+                             json={"level": 1, "mystery_of_place": "m", "place": "p", "answer": "a"})
+    ids["task_id"] = response.json()["id"]
+    response = await ac.post(url="/teams", headers=headers, json={"name": "query_count_team"})
+    ids["team_id"] = response.json()["id"]
+    response = await ac.get(url="/users/me", headers=headers)
+    ids["user_id"] = response.json()["id"]
+    await ac.post(url=f"/games/{ids['game_id']}/tasks", headers=headers, params={"task_id": ids["task_id"]})
+    await ac.post(url=f"/games/{ids['game_id']}/teams", headers=headers, params={"team_id": ids["team_id"]})
+    await ac.post(url=f"/teams/{ids['team_id']}/users", headers=headers, params={"user_id": ids["user_id"]})
+
+
+READ_ENDPOINTS = [
+    "/games/{game_id}",
+    "/games/{game_id}/user",
+    "/games/{game_id}/tasks",
+    "/games/{game_id}/teams",
+    "/tasks/{task_id}",
+    "/tasks/{task_id}/user",
+    "/teams/{team_id}",
+    "/teams/{team_id}/users",
+]
+
+
+@pytest.mark.parametrize("url", READ_ENDPOINTS)
+async def test_read_endpoints_run_one_query(ac: AsyncClient, url: str):
+    with track_queries() as stats:
+        response = await ac.get(url=url.format(**ids), headers={"Authorization": f"Bearer {tokens['owner']}"})
+    assert response.status_code == 200
+    assert stats.count == 1
+
+
+@pytest.mark.parametrize("url", READ_ENDPOINTS)
+async def test_forbidden_read_runs_one_query(ac: AsyncClient, url: str):
+    with track_queries() as stats:
+        response = await ac.get(url=url.format(**ids), headers={"Authorization": f"Bearer {tokens['stranger']}"})
+    assert response.status_code == 403
+    assert stats.count == 1
+
+
+@pytest.mark.parametrize("url", READ_ENDPOINTS)
+async def test_missing_read_runs_one_query(ac: AsyncClient, url: str):
+    missing = {key: 10 ** 9 for key in ids}
+    with track_queries() as stats:
+        response = await ac.get(url=url.format(**missing), headers={"Authorization": f"Bearer {tokens['owner']}"})
+    assert response.status_code == 404
+    assert stats.count == 1
+
+
+@pytest.mark.parametrize("url, body", [
+    ("/games/{game_id}", {"legend": "new legend"}),
+    ("/tasks/{task_id}", {"level": 2, "mystery_of_place": "m", "place": "p", "answer": "b"}),
+    ("/teams/{team_id}", {"win_games": 1}),
+])
+async def test_update_endpoints_run_select_and_update(ac: AsyncClient, url: str, body: dict):
+    with track_queries() as stats:
+        response = await ac.patch(url=url.format(**ids), json=body,
+                                  headers={"Authorization": f"Bearer {tokens['owner']}"})
+    assert response.status_code == 200
+    assert stats.count == 2
+
+
+@pytest.mark.parametrize("collection, param", [
+    ("/games/{game_id}/tasks", "task_id"),
+    ("/games/{game_id}/teams", "team_id"),
+    ("/teams/{team_id}/users", "user_id"),
+])
+async def test_membership_operations_do_not_load_collections(ac: AsyncClient, collection: str, param: str):
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    url = collection.format(**ids)
+    with track_queries() as stats:
+        response = await ac.post(url=url, headers=headers, params={param: ids[param]})
+    assert response.status_code == 409
+    assert stats.count == 3
+    with track_queries() as stats:
+        response = await ac.delete(url=f"{url}/{ids[param]}", headers=headers)
+    assert response.status_code == 200
+    assert stats.count == 2
+    response = await ac.delete(url=f"{url}/{ids[param]}", headers=headers)
+    assert response.status_code == 404
+    response = await ac.post(url=url, headers=headers, params={param: ids[param]})
+    assert response.status_code == 200
+
+
+CACHED_ENDPOINTS = [
+    "/games/{game_id}",
+    "/games/{game_id}/tasks",
+    "/teams/{team_id}/users",
+]
+
+
+@pytest.mark.parametrize("url", CACHED_ENDPOINTS)
+async def test_cached_reads_skip_database(ac: AsyncClient, url: str):
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    response = await ac.get(url=url.format(**ids), headers=headers)
+    etag = response.headers["ETag"]
+    with track_queries() as stats:
+        cached = await ac.get(url=url.format(**ids), headers=headers)
+        not_modified = await ac.get(url=url.format(**ids), headers={**headers, "If-None-Match": etag})
+        forbidden = await ac.get(url=url.format(**ids), headers={"Authorization": f"Bearer {tokens['stranger']}"})
+    assert cached.json() == response.json()
+    assert not_modified.status_code == 304
+    assert forbidden.status_code == 403
+    assert stats.count == 0
+
+
+@pytest.mark.parametrize("url, changed_url, body", [
+    ("/games/{game_id}", "/games/{game_id}", {"legend": "changed legend"}),
+    ("/games/{game_id}/tasks", "/tasks/{task_id}", {"level": 3, "mystery_of_place": "m", "place": "p",
+                                                    "answer": "c"}),
+])
+async def test_changes_invalidate_etag(ac: AsyncClient, url: str, changed_url: str, body: dict):
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    response = await ac.get(url=url.format(**ids), headers=headers)
+    etag = response.headers["ETag"]
+    await ac.patch(url=changed_url.format(**ids), json=body, headers=headers)
+    response = await ac.get(url=url.format(**ids), headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+async def change_legend_elsewhere(legend: str):
+    """ Изменение на другом воркере, рассылка версий которого потерялась. """
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Game).filter(Game.id == ids["game_id"]).values(legend=legend))
+        await session.commit()
+
+
+async def test_broker_reconnect_drops_cached_responses(ac: AsyncClient):
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    response = await ac.get(url=f"/games/{ids['game_id']}", headers=headers)
+    etag = response.headers["ETag"]
+    generation = versions.entity_versions.generation
+    await change_legend_elsewhere("legend after reconnect")
+    versions.broker._reconnected()
+    response = await ac.get(url=f"/games/{ids['game_id']}", headers={**headers, "If-None-Match": etag})
+    assert versions.entity_versions.generation == generation + 1
+    assert response.status_code == 200
+    assert response.json()["legend"] == "legend after reconnect"
+    assert response.headers["ETag"] != etag
+
+
+async def test_cached_responses_expire(ac: AsyncClient, monkeypatch):
+    monkeypatch.setattr(response_cache, "ttl", 0)
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    await ac.get(url=f"/games/{ids['game_id']}", headers=headers)
+    await change_legend_elsewhere("legend after expiry")
+    response = await ac.get(url=f"/games/{ids['game_id']}", headers=headers)
+    assert response.json()["legend"] == "legend after expiry"
+
+
+async def test_committed_change_survives_broker_failure(ac: AsyncClient, monkeypatch):
+    async def publish(channel: str, data: str):
+        raise BrokerError("broker is down")
+
+    monkeypatch.setattr(versions.broker, "publish", publish)
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    response = await ac.patch(url=f"/games/{ids['game_id']}", json={"legend": "saved anyway"}, headers=headers)
+    assert response.status_code == 200
+    response = await ac.get(url=f"/games/{ids['game_id']}", headers=headers)
+    assert response.json()["legend"] == "saved anyway"
+
+
+async def test_duplicate_team_name_is_rejected_by_index(ac: AsyncClient):
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    with track_queries() as stats:
+        response = await ac.post(url="/teams", headers=headers, json={"name": "QUERY_COUNT_TEAM"})
+    assert response.status_code == 409
+    assert stats.count == 1
+
+
+@query_budget(3)
+async def test_team_edit_fits_query_budget(ac: AsyncClient):
+    headers = {"Authorization": f"Bearer {tokens['owner']}"}
+    response = await ac.patch(url=f"/teams/{ids['team_id']}", json={"win_games": 2}, headers=headers)
+    assert response.status_code == 200
+    response = await ac.get(url=f"/teams/{ids['team_id']}", headers=headers)
+    assert response.json()["win_games"] == 2
+
+
+def test_query_budget_reports_statements():
+    with pytest.raises(AssertionError, match="Query budget exceeded: 1 > 0"):
+        with query_budget(0) as stats:
+            stats.count += 1
+            stats.statements.append("SELECT 1")
+
+
+async def test_query_stats_headers():
+    # Если заголовки включены в настройках, middleware уже подключено в приложении, иначе оборачиваем приложение здесь.
+    enabled = any(middleware.cls is QueryStatsMiddleware for middleware in app.user_middleware)
+    async with AsyncClient(app=app if enabled else QueryStatsMiddleware(app), base_url="http://test") as client:
+        response = await client.get(url=f"/teams/{ids['team_id']}",
+                                    headers={"Authorization": f"Bearer {tokens['owner']}"})
+    assert response.status_code == 200
+    assert response.headers[QUERY_COUNT_HEADER] == "1"
+    assert response.headers["Server-Timing"].startswith("db;dur=")
@@ -0,0 +1,87 @@
+import pytest
+from conftest import AsyncClient, AsyncSessionLocal
+from src.tasks.importing import ImportFormatError, iter_records
+
+TASK = '{"level": 1, "mystery_of_place": "m", "place": "p", "answer": "%s"}'
+
+
+async def chunked(data: str, size: int):
+    encoded = data.encode()
+    for start in range(0, len(encoded), size):
+        yield encoded[start:start + size]
+
+
+async def collect(data: str, ndjson: bool, size: int = 7) -> list[dict]:
+    return [record async for record in iter_records(chunked(data, size), ndjson)]
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+async def test_json_array_is_parsed_across_chunks(size: int):
+    body = "[ " + ",\n".join(TASK % f"ответ {number}" for number in range(20)) + " ]"
+    records = await collect(body, ndjson=False, size=size)
+    assert [record["answer"] for record in records] == [f"ответ {number}" for number in range(20)]
+
+
+async def test_ndjson_is_parsed_line_by_line():
+    body = "\n".join(TASK % number for number in range(5)) + "\n\n" + TASK % 5
+    records = await collect(body, ndjson=True)
+    assert [record["answer"] for record in records] == [str(number) for number in range(6)]
+
+
+@pytest.mark.parametrize("body, ndjson", [
+    ('{"level": 1}', False),
+    ('[{"level": 1} {"level": 2}]', False),
+    ('[{"level": 1}', False),
+    ('[{"level": 1,}]', False),
+    ('[{"level": tru}]', False),
+    ('[{"answer": "a', False),
+    ('[1, 2]', False),
+    ('{"level": 1}\nnot json', True),
+])
+async def test_malformed_body_is_rejected(body: str, ndjson: bool):
+    with pytest.raises(ImportFormatError):
+        await collect(body, ndjson)
+
+
+async def test_malformed_item_fails_without_reading_the_rest():
+    read = []
+
+    async def chunks():
+        yield b'[{"level": 1,}, '
+        for number in range(1000):
+            read.append(number)
+            yield (TASK % number + ",").encode()
+
+    with pytest.raises(ImportFormatError, match="character 13"):
+        [record async for record in iter_records(chunks(), ndjson=False)]
+    assert len(read) <= 1
+
+
+@pytest.fixture(scope="module")
+async def headers(make_user) -> dict[str, str]:
+    async with AsyncSessionLocal() as session:
+        _, headers = await make_user(session, "import")
+        await session.commit()
+    return headers
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ("[" + ",".join(TASK % number for number in range(3)) + "]", "application/json"),
+    ("\n".join(TASK % number for number in range(3)), "application/x-ndjson"),
+])
+async def test_import_endpoint_creates_tasks(ac: AsyncClient, headers: dict[str, str], body: str, content_type: str):
+    response = await ac.post(url="/tasks:import", content=body, headers={**headers, "Content-Type": content_type})
+    assert response.status_code == 200
+    assert response.json()["created"] == 3
+    response = await ac.get(url=f"/tasks/{response.json()['ids'][-1]}", headers=headers)
+    assert response.json()["answer"] == "2"
+
+
+@pytest.mark.parametrize("body, status_code", [
+    ('[{"level": 1,}]', 400),
+    ("[" + TASK % "a" + ', {"level": 1}]', 422),
+])
+async def test_import_endpoint_rejects_invalid_body(ac: AsyncClient, headers: dict[str, str], body: str,
+                                                    status_code: int):
+    response = await ac.post(url="/tasks:import", content=body, headers={**headers, "Content-Type": "application/json"})
+    assert response.status_code == status_code
@@ -0,0 +1,249 @@
+import asyncio
+import msgpack
+import pytest
+from datetime import datetime, timedelta
+from fastapi import WebSocketException
+from conftest import AsyncSessionLocal, engine
+from src.config import config
+from src.teams.models import Team
+from src.games.models import Game
+from src.chat.models import Chat, Message
+from src.websockets import router as ws_router
+from src.websockets.brokers import MemoryBroker
+from src.websockets.frames import decode_frame
+from src.websockets.replay import Resume
+from src.websockets.ws_manager import Connection, WSConnectionManager
+
+
+class FakeWebSocket:
+    """ Клиент, который передаёт токен, затем кадры из frames и молчит до закрытия. """
+
+    def __init__(self, token: str | bytes, frames: tuple[str | bytes, ...] = (), subprotocols: tuple[str, ...] = ()):
+        self.token = token
+        self.frames = list(frames)
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol: str | None = None
+        self.sent: list[str | bytes] = []
+        self.connected = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.token_sent = False
+
+    async def accept(self, subprotocol: str | None = None):
+        self.subprotocol = subprotocol
+
+    async def receive(self) -> dict:
+        if not self.token_sent:
+            self.token_sent = True
+            return {"type": "websocket.receive", "bytes" if isinstance(self.token, bytes) else "text": self.token}
+        if self.frames:
+            frame = self.frames.pop(0)
+            return {"type": "websocket.receive", "bytes" if isinstance(frame, bytes) else "text": frame}
+        await self.closed.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def send_text(self, data: str):
+        self.sent.append(data)
+        self.connected.set()
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+        self.connected.set()
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.closed.set()
+
+
+async def create_player(make_user, name: str = "ws") -> str:
+    async with AsyncSessionLocal() as session:
+        user, headers = await make_user(session, f"{name}_player")
+        team = Team(name=f"{name}_team", owner_id=None, users=[user])
+        session.add(team)
+        await session.flush()
+        game = Game(name=f"{name}_game", legend="ws", owner_id=user.id,
+                    datetime_start=datetime.utcnow(), datetime_end=datetime.utcnow() + timedelta(hours=1))
+        session.add(game)
+        await session.flush()
+        session.add(Chat(game_id=game.id, team_id=team.id, is_active=True))
+        await session.commit()
+    return headers["Authorization"].removeprefix("Bearer ")
+
+
+async def test_ws_sockets_do_not_hold_pool_connections(monkeypatch, make_user):
+    monkeypatch.setattr(ws_router, "AsyncSessionLocal", AsyncSessionLocal)
+    token = await create_player(make_user)
+    sockets, endpoints = [], []
+    for batch_size in (1, 10, 50):
+        for _ in range(batch_size):
+            websocket = FakeWebSocket(token)
+            sockets.append(websocket)
+            endpoints.append(asyncio.create_task(ws_router.ws_chat(websocket)))
+        await asyncio.wait_for(asyncio.gather(*(ws.connected.wait() for ws in sockets)), timeout=10)
+        assert engine.pool.checkedout() == 0
+    for websocket in sockets:
+        await websocket.close()
+    await asyncio.gather(*endpoints)
+
+
+async def test_chat_socket_accepts_messages(monkeypatch, make_user):
+    monkeypatch.setattr(ws_router, "AsyncSessionLocal", AsyncSessionLocal)
+    token = await create_player(make_user, "ws_sender")
+    websocket = FakeWebSocket(token, frames=('{"type": "pong"}',
+                                             '{"type": "typing", "id": "t1"}',
+                                             '{"type": "message", "id": 1, "text": "Нашли код"}',
+                                             '{"type": "reply", "id": 2, "text": ""}',
+                                             'not json'))
+    endpoint = asyncio.create_task(ws_router.ws_chat(websocket))
+    for _ in range(100):
+        if len(websocket.sent) >= 5:
+            break
+        await asyncio.sleep(0.01)
+    await websocket.close()
+    await endpoint
+
+    frames = [decode_frame(frame) for frame in websocket.sent[1:]]
+    assert frames[0] == {"type": "ack", "id": "t1"}
+    assert frames[1]["type"] == "ack" and frames[1]["id"] == 1
+    assert frames[1]["message"]["text"] == "Нашли код"
+    assert [frame["type"] for frame in frames[2:]] == ["error", "error"]
+    async with AsyncSessionLocal() as session:
+        message = await session.get(Message, frames[1]["message"]["id"])
+    assert message.text == "Нашли код"
+    assert len(ws_router.ws_chat_manager.connections) == 0
+
+
+async def test_failed_save_is_reported_and_keeps_the_socket(monkeypatch, make_user):
+    monkeypatch.setattr(ws_router, "AsyncSessionLocal", AsyncSessionLocal)
+
+    async def unavailable(message, user_id):
+        raise ConnectionRefusedError("database is unavailable")
+
+    monkeypatch.setattr(ws_router, "store_message", unavailable)
+    token = await create_player(make_user, "ws_retry")
+    websocket = FakeWebSocket(token, frames=('{"type": "message", "id": 7, "text": "Код"}',
+                                             '{"type": "typing", "id": 8}'))
+    endpoint = asyncio.create_task(ws_router.ws_chat(websocket))
+    for _ in range(100):
+        if len(websocket.sent) >= 3:
+            break
+        await asyncio.sleep(0.01)
+    await websocket.close()
+    await endpoint
+    frames = [decode_frame(frame) for frame in websocket.sent[1:]]
+    assert frames[0] == {"type": "error", "id": 7, "detail": "Message could not be saved"}
+    assert frames[1] == {"type": "ack", "id": 8}
+
+
+async def test_reconnect_replays_missed_frames():
+    manager = WSConnectionManager("ws_test", MemoryBroker())
+    first = FakeWebSocket("token")
+    connection = Connection(user_id=1, websocket=first, chat_id=1, game_id=7)
+    await manager.connect(connection, Resume(epoch=""))
+    for number in range(3):
+        await manager.send_event(1, {"type": "test", "number": number})
+    await manager.send_game_event(7, {"type": "test", "number": 100})
+    await asyncio.sleep(0)
+    frames = [decode_frame(frame) for frame in first.sent]
+    assert frames[0] == {"type": "connected", "epoch": manager.epoch, "seq": 0, "game_seq": 0}
+    assert [frame["seq"] for frame in frames[1:]] == [1, 2, 3, 1]
+    manager.disconnect(connection)
+
+    for number in range(3, 5):
+        await manager.send_event(1, {"type": "test", "number": number})
+    # Собственное сообщение, отправленное с другого устройства, не повторяется, как и при живой рассылке
+    await manager.send_event(1, {"type": "test", "number": 5, "user_id": 1})
+    second = FakeWebSocket("token")
+    connection = Connection(user_id=1, websocket=second, chat_id=1, game_id=7)
+    await manager.connect(connection, Resume(epoch=manager.epoch, last_seq=3, last_game_seq=1))
+    await asyncio.sleep(0)
+    frames = [decode_frame(frame) for frame in second.sent]
+    assert frames[0]["seq"] == 6
+    assert [frame["number"] for frame in frames[1:]] == [3, 4]
+    manager.disconnect(connection)
+
+    third = FakeWebSocket("token")
+    connection = Connection(user_id=1, websocket=third, chat_id=1, game_id=7)
+    await manager.connect(connection, Resume(epoch="stale", last_seq=3))
+    await asyncio.sleep(0)
+    assert decode_frame(third.sent[1]) == {"type": "resync", "stream": "chat"}
+    manager.disconnect(connection)
+
+
+async def test_heartbeat_pings_idle_and_reaps_silent_connections():
+    manager = WSConnectionManager("ws_test", MemoryBroker())
+    silent, talking = FakeWebSocket("token"), FakeWebSocket("token")
+    silent_connection = Connection(user_id=1, websocket=silent, chat_id=1)
+    talking_connection = Connection(user_id=2, websocket=talking, chat_id=1)
+    await manager.connect(silent_connection)
+    await manager.connect(talking_connection)
+    started = talking_connection.last_seen = silent_connection.last_seen
+
+    assert manager.heartbeat(started + config.WS_HEARTBEAT_INTERVAL) == 0
+    await asyncio.sleep(0.01)
+    assert silent.sent[-1] == manager.PING_FRAME.text
+    assert talking.sent[-1] == manager.PING_FRAME.text
+
+    talking_connection.last_seen = started + config.WS_HEARTBEAT_TIMEOUT
+    assert manager.heartbeat(started + config.WS_HEARTBEAT_TIMEOUT + 1) == 1
+    await asyncio.sleep(0.01)
+    assert silent.closed.is_set()
+    assert not talking.closed.is_set()
+    assert manager.snapshot()["live_connections"] == 1
+    assert manager.snapshot()["reaped_connections"] == 1
+    manager.disconnect(talking_connection)
+
+
+async def test_targeted_delivery_and_registry_cleanup():
+    manager = WSConnectionManager("ws_test", MemoryBroker())
+    sockets = [FakeWebSocket("token") for _ in range(3)]
+    connections = [Connection(user_id=1, websocket=sockets[0], chat_id=1, team_id=10),
+                   Connection(user_id=2, websocket=sockets[1], chat_id=1, team_id=10),
+                   Connection(user_id=3, websocket=sockets[2], chat_id=2, team_id=20)]
+    for connection in connections:
+        await manager.connect(connection)
+
+    await manager.send_to_user(2, {"type": "direct"})
+    await manager.send_to_team(10, {"type": "team"})
+    await asyncio.sleep(0.01)
+    assert [decode_frame(frame)["type"] for frame in sockets[0].sent[1:]] == ["team"]
+    assert [decode_frame(frame)["type"] for frame in sockets[1].sent[1:]] == ["direct", "team"]
+    assert sockets[2].sent[1:] == []
+
+    for connection in connections:
+        manager.disconnect(connection)
+        manager.disconnect(connection)
+    assert len(manager.connections) == 0
+    assert manager.connections.by_team(10) == ()
+    assert not manager.connections._chats and not manager.connections._users
+
+
+async def test_msgpack_subprotocol():
+    manager = WSConnectionManager("ws_test", MemoryBroker())
+    binary, text = FakeWebSocket("token", subprotocols=("msgpack", "json")), FakeWebSocket("token")
+    assert await ws_router.accept(binary) == "msgpack" and binary.subprotocol == "msgpack"
+    assert await ws_router.accept(text) == "json" and text.subprotocol is None
+    connections = [Connection(user_id=1, websocket=binary, chat_id=1, protocol="msgpack"),
+                   Connection(user_id=2, websocket=text, chat_id=1)]
+    for connection in connections:
+        await manager.connect(connection)
+
+    await manager.send_event(1, {"type": "test", "text": "Код найден"})
+    await asyncio.sleep(0.01)
+    assert msgpack.unpackb(binary.sent[0])["type"] == "connected"
+    assert msgpack.unpackb(binary.sent[-1]) == decode_frame(text.sent[-1])
+    assert msgpack.unpackb(binary.sent[-1])["text"] == "Код найден"
+    for connection in connections:
+        manager.disconnect(connection)
+
+
+async def test_msgpack_handshake_in_binary_frame(monkeypatch, make_user):
+    monkeypatch.setattr(ws_router, "AsyncSessionLocal", AsyncSessionLocal)
+    token = await create_player(make_user, "ws_msgpack")
+    websocket = FakeWebSocket(msgpack.packb({"token": token}), subprotocols=("msgpack",))
+    endpoint = asyncio.create_task(ws_router.ws_chat(websocket))
+    await asyncio.wait_for(websocket.connected.wait(), timeout=10)
+    await websocket.close()
+    await endpoint
+    assert msgpack.unpackb(websocket.sent[0])["type"] == "connected"
+    for handshake in (b"\xc1", msgpack.packb([token]), msgpack.packb({"epoch": "e"})):
+        with pytest.raises(WebSocketException):
+            ws_router.parse_handshake(handshake)
@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from conftest import AsyncSessionLocal
+from src.answers.writer import ProgressWriter
+from src.chat.shemas import MessageCreate
+from src.chat.utils import ChatNotFound
+from src.chat.writer import MessageWriter
+from src.database.batch_writer import BufferFull
+
+
+async def test_message_to_missing_chat_is_rejected_before_queueing():
+    writer = MessageWriter(AsyncSessionLocal, flush_interval_ms=50, batch_size=10, id_block_size=10)
+    with pytest.raises(ChatNotFound):
+        await writer.submit(MessageCreate(chat_id=10 ** 9, content_type="text", text="hello"), user_id=1)
+    assert writer._buffer == []
+
+
+class FlakyInsert:
+    """ Подменяет запись в БД: сначала БД недоступна, затем отвергает строки с id из rejected. """
+
+    def __init__(self, rejected: set[int]):
+        self.rejected = rejected
+        self.available = False
+        self.saved: list[int] = []
+
+    async def __call__(self, rows: list[dict]):
+        if not self.available:
+            raise OperationalError("INSERT", {}, ConnectionResetError())
+        if any(row["id"] in self.rejected for row in rows):
+            raise IntegrityError("INSERT", {}, Exception("foreign key violation"))
+        self.saved.extend(row["id"] for row in rows)
+
+
+@pytest.mark.parametrize("writer", [
+    MessageWriter(AsyncSessionLocal, flush_interval_ms=50, batch_size=2, id_block_size=10),
+    ProgressWriter(AsyncSessionLocal, flush_interval_ms=50, batch_size=2),
+])
+async def test_outage_keeps_rows_and_only_rejected_rows_are_dropped(writer, monkeypatch):
+    insert = FlakyInsert(rejected={2})
+    monkeypatch.setattr(writer, "_insert", insert)
+    for row_id in range(1, 6):
+        writer.enqueue({"id": row_id, "game_id": 1})
+    with pytest.raises(OperationalError):
+        await writer.flush()
+    assert [row["id"] for row in writer._buffer] == [1, 2, 3, 4, 5]
+    insert.available = True
+    await writer.flush()
+    assert insert.saved == [1, 3, 4, 5]
+    assert writer._buffer == []
+
+
+async def test_full_buffer_rejects_new_rows(monkeypatch):
+    writer = MessageWriter(AsyncSessionLocal, flush_interval_ms=50, batch_size=2, id_block_size=10, max_buffered=3)
+    insert = FlakyInsert(rejected=set())
+    monkeypatch.setattr(writer, "_insert", insert)
+    for row_id in range(1, 4):
+        writer.enqueue({"id": row_id})
+    with pytest.raises(OperationalError):
+        await writer.flush()
+    with pytest.raises(BufferFull):
+        writer.enqueue({"id": 4})
+    insert.available = True
+    await writer.flush()
+    writer.enqueue({"id": 4})
+    assert [row["id"] for row in writer._buffer] == [4]